@@ -12,6 +12,7 @@
 #include <stdint.h>
 #include <stdbool.h>
 #include <math.h>
+#include <stddef.h>
 
 // MAIN BUFFER SIZE //
 #if (SAMPLE_RATE * DATA_WINDOW) % 2 == 0
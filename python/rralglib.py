@@ -1,10 +1,174 @@
 import numpy as np
 import math
+import time
+import threading
+from collections import deque
+import rralglib_metrics
 
 ### The main rralglib equivalent python library ###
 
+### Globally selected computational backend ("python", "c" or "jit")
+backend = "python"
+backends = ["python", "c", "jit"]
+
+### Select the backend used when a call does not specify one
+def set_backend(name):
+    global backend
+    if name not in backends:
+        print(str(name) + " backend is not a valid option.")
+        return False
+    backend = name
+    return True
+
+### Return the backend module for name (or the global backend), or None if the pure Python path should be used
+def get_backend(name=None):
+    if name is None:
+        name = backend
+
+    if name == "c":
+        import rralglib_c
+        if rralglib_c.load() is not None:
+            return rralglib_c
+    elif name == "jit":
+        import rralglib_jit
+        if rralglib_jit.available():
+            return rralglib_jit
+
+    return None
+
+### Per-stage profiling ###
+### Detectors report named stage timings to the active profiler; with none active a stage costs one global lookup
+profiler = None
+
+class StageProfiler:
+    """
+    Aggregates stage timings and sizes into histograms with power of two microsecond buckets
+    """
+    def __init__(self, callbacks=None):
+        self.callbacks = list(callbacks) if callbacks is not None else []
+        self.reset()
+
+    def reset(self):
+        self.stats = {}
+
+    ### Callbacks are called as callback(stage, elapsed, size) for every recorded stage
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def record(self, stage, elapsed, size=0):
+        stat = self.stats.get(stage)
+        if stat is None:
+            stat = {"count": 0, "total": 0.0, "min": elapsed, "max": elapsed, "size": 0, "buckets": {}}
+            self.stats[stage] = stat
+
+        stat["count"] += 1
+        stat["total"] += elapsed
+        stat["size"] += size
+        if elapsed < stat["min"]:
+            stat["min"] = elapsed
+        if elapsed > stat["max"]:
+            stat["max"] = elapsed
+
+        ### Bucket b holds durations up to 2**b microseconds
+        bucket = max(0, math.ceil(math.log2(elapsed * 1e6))) if elapsed > 0 else 0
+        stat["buckets"][bucket] = stat["buckets"].get(bucket, 0) + 1
+
+        for callback in self.callbacks:
+            callback(stage, elapsed, size)
+
+    ### Upper bound in seconds of the bucket holding the q-th percentile of a stage
+    def percentile(self, stage, q):
+        stat = self.stats[stage]
+        rank = q / 100 * stat["count"]
+        seen = 0
+        for bucket in sorted(stat["buckets"]):
+            seen += stat["buckets"][bucket]
+            if seen >= rank:
+                return min(2**bucket * 1e-6, stat["max"])
+        return stat["max"]
+
+    ### Per-stage summary in seconds and samples
+    def summary(self):
+        summary = {}
+        for stage, stat in self.stats.items():
+            summary[stage] = {
+                "count": stat["count"],
+                "total_s": stat["total"],
+                "mean_s": stat["total"] / stat["count"],
+                "min_s": stat["min"],
+                "max_s": stat["max"],
+                "p50_s": self.percentile(stage, 50),
+                "p99_s": self.percentile(stage, 99),
+                "mean_size": stat["size"] / stat["count"],
+                "buckets_us": {str(2**b): n for b, n in sorted(stat["buckets"].items())},
+            }
+        return summary
+
+    ### Text dump of all stages sorted by total time, with one histogram row per bucket
+    def dump(self, file=None, histograms=True):
+        lines = []
+        for stage, stat in sorted(self.stats.items(), key=lambda item: -item[1]["total"]):
+            lines.append("{:<24} {:>8} calls {:>12.3f} ms total {:>10.3f} ms mean {:>10.3f} ms max {:>10.0f} samples".format(
+                stage, stat["count"], stat["total"]*1000, stat["total"]/stat["count"]*1000, stat["max"]*1000, stat["size"]/stat["count"]))
+            if histograms:
+                for bucket, n in sorted(stat["buckets"].items()):
+                    lines.append("    <= {:>10} us {:>8} {}".format(2**bucket, n, "#" * max(1, round(40 * n / stat["count"]))))
+        text = "\n".join(lines)
+
+        if file is not None:
+            with open(file, "w") as out:
+                out.write(text + "\n")
+        return text
+
+    ### Used as a context manager the profiler is active inside the with block
+    def __enter__(self):
+        global profiler
+        self.previous = profiler
+        profiler = self
+        return self
+
+    def __exit__(self, *exc):
+        global profiler
+        profiler = self.previous
+        return False
+
+### Activate a profiler (or a new one) until disable_profiling is called
+def enable_profiling(stage_profiler=None):
+    global profiler
+    if stage_profiler is None:
+        stage_profiler = StageProfiler()
+    profiler = stage_profiler
+    return profiler
+
+def disable_profiling():
+    global profiler
+    profiler = None
+
+### Start and end of a stage; stage_start returns None when profiling is disabled
+def stage_start():
+    if profiler is None:
+        return None
+    return time.perf_counter()
+
+def stage_end(stage, start, size=0):
+    if start is not None and profiler is not None:
+        profiler.record(stage, time.perf_counter() - start, size)
+
 ### Wrapper function for data validation and simpler algorithm calls
-def run_algorithm(data, fs, algorithm="default", args=None):
+def run_algorithm(data, fs, algorithm="default", args=None, backend=None):
+
+    if not rralglib_metrics.enabled:
+        return dispatch_algorithm(data, fs, algorithm, args, backend)
+
+    ### Count the call, its samples and latency; -1 returns are counted as failures
+    t = time.perf_counter()
+    rr, peaks = dispatch_algorithm(data, fs, algorithm, args, backend)
+    rralglib_metrics.registry.observe(algorithm, len(data), time.perf_counter() - t, failed=(rr == -1))
+
+    return rr, peaks
+
+### Validate the input and call the algorithm on the selected backend
+def dispatch_algorithm(data, fs, algorithm="default", args=None, backend=None):
     
     if len(data) <= 0:
         print("data array cannot be empty")
@@ -14,21 +178,28 @@ def run_algorithm(data, fs, algorithm="default", args=None):
         print("sample rate cannot be 0")
         return -1, []
     
+    ### Use a compiled implementation if one is selected and available, otherwise fall back to Python
+    module = get_backend(backend)
+    if module is not None and algorithm in module.algorithms:
+        try:
+            return module.algorithms[algorithm](data=data, fs=fs, args=args)
+        except Exception as e:
+            print("error: "+str(e))
+            if rralglib_metrics.enabled:
+                rralglib_metrics.registry.error(algorithm)
+            return -1, []
+
+    entry = algorithm_registry.get(algorithm)
+    if entry is None:
+        print(str(algorithm) + " algorithm is not a valid option.")
+        return -1, []
+
     try:
-        if algorithm == "default":
-            rr, peaks = find_peaks(data=data, fs=fs, args=args)
-        elif algorithm == "find_peaks":
-            rr, peaks = find_peaks(data=data, fs=fs, args=args)
-        elif algorithm == "cwt":
-            rr, peaks = cwt_peaks(data=data, fs=fs, args=args)
-        elif algorithm == "cwt_oa":
-            rr, peaks = cwt_peaks_oa(data=data, fs=fs, args=args)
-        elif algorithm == "srmac":
-            rr, peaks = srmac(data=data, fs=fs, args=args)
-        elif algorithm == "terma":
-            rr, peaks = terma(data=data, fs=fs, args=args)
+        rr, peaks = entry["function"](data=data, fs=fs, args=args)
     except Exception as e:
         print("error: "+str(e))
+        if rralglib_metrics.enabled:
+            rralglib_metrics.registry.error(algorithm)
         return -1, []
 
     return rr, peaks
@@ -83,13 +254,17 @@ def find_rr_dist(peaks, fs):
     return rr
 
 ### Function for applying a digital biquad iir filter to a signal
-def sos_filt(signal, sos):
+def sos_filt(signal, sos, backend=None):
     
     signal = np.atleast_1d(signal)
 
     if len(signal) < 3:
         return signal
 
+    module = get_backend(backend)
+    if module is not None and "sos_filt" in module.kernels:
+        return module.kernels["sos_filt"](signal, sos)
+
     ### TODO: initial state needs to be calulated to get rid of the huge transient
     y = np.copy(signal).astype(np.float64)
     for b0, b1, b2, a0, a1, a2 in sos:
@@ -347,23 +522,8 @@ def local_maxima(data):
 
     return maxima
 
-### Optimized version of the find_peaks algorithm
-def find_peaks(data, fs, window_size=None, prominence=None, heval_ratio=None, width=None, proximity=None, args=None):
-    """
-    Optimized version of the find_peaks algorithm for peak detection
-    """
-    data = np.atleast_1d(data)
-
-    if len(data) < 1:
-        return 0, []
-    
-    if fs <= 0:
-        return 0, []
-
-    if window_size is None:
-        window_size = len(data)
-
-    ### Parameters
+### Resolve find_peaks parameters into (prominence, heval_ratio, width, proximity) with width and proximity in samples
+def find_peaks_params(fs, prominence=None, heval_ratio=None, width=None, proximity=None, args=None):
     if args is None:
         if prominence is None:
             peaks_prom_min = 0.6
@@ -391,14 +551,22 @@ def find_peaks(data, fs, window_size=None, prominence=None, heval_ratio=None, wi
         peaks_width_min = args[2]*fs if args[2] > -1 else 0.3*fs
         peaks_proximity = args[4]*fs if args[4] > -1 else 1.0*fs
 
+    return peaks_prom_min, peaks_heval_ratio, peaks_width_min, peaks_proximity
+
+### Find the local maxima of data that pass the prominence, width and proximity criteria of find_peaks
+def select_peaks(data, peaks_prom_min, peaks_heval_ratio, peaks_width_min, peaks_proximity):
+
     ### Find peaks
+    t = stage_start()
     peaks = local_maxima(data)
+    stage_end("find_peaks.local_maxima", t, len(data))
 
     ### Return if no peaks found
     if len(peaks) == 0:
-        return 0, []
+        return []
     
     ### Deal with plateaus
+    t = stage_start()
     for peak in range(len(peaks)):
         if peak == -1:
             continue
@@ -411,8 +579,10 @@ def find_peaks(data, fs, window_size=None, prominence=None, heval_ratio=None, wi
             next += 1
 
     peaks = [peak for peak in peaks if peak != -1]
+    stage_end("find_peaks.plateaus", t, len(peaks))
 
     ### Remove peaks based on their topographic prominence
+    t = stage_start()
     marked = []
     for i, peak in enumerate(peaks):
         neighbour = 0
@@ -469,8 +639,10 @@ def find_peaks(data, fs, window_size=None, prominence=None, heval_ratio=None, wi
 
     ### Remove all marked peaks
     peaks = [peak for i, peak in enumerate(peaks) if i not in marked]
+    stage_end("find_peaks.prominence", t, len(data))
     
     ### Remove peaks that are too close to eachother
+    t = stage_start()
     marked = []
     for i in range(len(peaks)):
         if peaks[i] == -1:
@@ -488,17 +660,14 @@ def find_peaks(data, fs, window_size=None, prominence=None, heval_ratio=None, wi
                     break
     
     peaks = [peak for i, peak in enumerate(peaks) if i not in marked]
+    stage_end("find_peaks.proximity", t, len(peaks))
 
-    ### Calculate RR
-    # rr = find_rr(peaks, fs, window_size)
-    rr = find_rr_dist(peaks, fs)
-
-    return rr, peaks
+    return peaks
 
-### Inline SRMAC algorithm ### source: https://arxiv.org/abs/2312.10013
-def srmac(data, fs, window_size=None, coef_fast=None, coef_slow=None, coef_cross=None, threshold=None, width=None, margin=None, args=None): 
+### Optimized version of the find_peaks algorithm
+def find_peaks(data, fs, window_size=None, prominence=None, heval_ratio=None, width=None, proximity=None, args=None):
     """
-    SRMAC algorithm for peak detection
+    Optimized version of the find_peaks algorithm for peak detection
     """
     data = np.atleast_1d(data)
 
@@ -507,27 +676,35 @@ def srmac(data, fs, window_size=None, coef_fast=None, coef_slow=None, coef_cross
     
     if fs <= 0:
         return 0, []
-    
+
     if window_size is None:
         window_size = len(data)
 
-    ### Coefficients can be converted from one sampling rate frequency to another using the formula a2 = 1 - (1 - a1)^(f1/f2)
     ### Parameters
+    peaks_prom_min, peaks_heval_ratio, peaks_width_min, peaks_proximity = find_peaks_params(fs, prominence=prominence, heval_ratio=heval_ratio, width=width, proximity=proximity, args=args)
+
+    ### Find peaks
+    peaks = select_peaks(data, peaks_prom_min, peaks_heval_ratio, peaks_width_min, peaks_proximity)
+
+    ### Calculate RR
+    # rr = find_rr(peaks, fs, window_size)
+    rr = find_rr_dist(peaks, fs)
+
+    return rr, peaks
+
+### Resolve SRMAC parameters into (coef_fast, coef_slow, coef_cross, th, width, margin); returns None if any coefficient is invalid
+def srmac_params(fs, coef_fast=None, coef_slow=None, coef_cross=None, threshold=None, width=None, margin=None, args=None):
+
+    ### Coefficients can be converted from one sampling rate frequency to another using the formula a2 = 1 - (1 - a1)^(f1/f2)
     if args is None:
         if coef_fast is None:
             coef_fast = 0.9
-        else:
-            coef_fast = coef_fast
-        
+
         if coef_slow is None:
             coef_slow = 0.3
-        else:
-            coef_slow = coef_slow
-        
+
         if coef_cross is None:
             coef_cross = 0.2
-        else:
-            coef_cross = coef_cross
 
         if threshold is None:
             th = 0.005
@@ -542,7 +719,7 @@ def srmac(data, fs, window_size=None, coef_fast=None, coef_slow=None, coef_cross
         if margin is None:
             margin =  0
         else:
-            margin = int(margin * fs)         
+            margin = int(margin * fs)
     else:
         coef_fast = args[0] if args[0] != -1 else 0.9
         coef_slow = args[1] if args[1] != -1 else 0.3
@@ -553,41 +730,41 @@ def srmac(data, fs, window_size=None, coef_fast=None, coef_slow=None, coef_cross
 
     ### Reject invalid coefficients
     if coef_fast < 0 or coef_fast > 1:
-        return 0, []
-    
+        return None
+
     if coef_slow < 0 or coef_slow > 1:
-        return 0, []
-    
+        return None
+
     if coef_cross < 0 or coef_cross > 1:
-        return 0, []
+        return None
+
+    return coef_fast, coef_slow, coef_cross, th, width, margin
+
+### SRMAC filtering routine; writes into out if given so repeated calls can reuse one buffer
+def srmac_filter(data, coef_fast, coef_slow, coef_cross, out=None):
+    t = stage_start()
+
+    if out is None:
+        out = np.zeros(len(data))
 
-    ### Process the data array according to the SRMAC filtering routine
-    prevdata = data[0]
     prevfast = data[0]
     prevslow = data[0]
     prevcross = 0
 
-    newdata = np.zeros(len(data))
-
     for i, curr in enumerate(data):
         prevfast = curr * coef_fast + prevfast * (1-coef_fast)
         prevslow = curr * coef_slow + prevslow * (1-coef_slow)
         prevcross = (prevfast-prevslow) * coef_cross + prevcross * (1-coef_cross)
-        newdata[i] = prevcross
+        out[i] = prevcross
 
-    ### Find peaks using zero crossing
-    peak_count, peaks = zero_crossing(newdata, rawdata=data, width=width, fs=fs, margin=margin, th=th)
+    stage_end("srmac.ewma", t, len(data))
 
-    ### Calculate RR
-    # rr = find_rr(peaks, fs, window_size)
-    rr = find_rr_dist(peaks, fs)
+    return out
 
-    return rr, peaks
-
-### Corrected version of the TERMA algorithm ### Previous memory and performance optimizations are now quite redundant and need to be rethought
-def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_coef=None, width=None, margin=None, args=None):
+### Inline SRMAC algorithm ### source: https://arxiv.org/abs/2312.10013
+def srmac(data, fs, window_size=None, coef_fast=None, coef_slow=None, coef_cross=None, threshold=None, width=None, margin=None, args=None): 
     """
-    TERMA algorithm for peak detection
+    SRMAC algorithm for peak detection
     """
     data = np.atleast_1d(data)
 
@@ -601,6 +778,27 @@ def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_co
         window_size = len(data)
 
     ### Parameters
+    params = srmac_params(fs, coef_fast=coef_fast, coef_slow=coef_slow, coef_cross=coef_cross, threshold=threshold, width=width, margin=margin, args=args)
+    if params is None:
+        return 0, []
+    coef_fast, coef_slow, coef_cross, th, width, margin = params
+
+    ### Process the data array according to the SRMAC filtering routine
+    newdata = srmac_filter(data, coef_fast, coef_slow, coef_cross)
+
+    ### Find peaks using zero crossing
+    t = stage_start()
+    peak_count, peaks = zero_crossing(newdata, rawdata=data, width=width, fs=fs, margin=margin, th=th)
+    stage_end("srmac.zero_crossing", t, len(data))
+
+    ### Calculate RR
+    # rr = find_rr(peaks, fs, window_size)
+    rr = find_rr_dist(peaks, fs)
+
+    return rr, peaks
+
+### Resolve TERMA parameters into (w1, w2, b, width, margin) with windows in samples; returns None if a window is empty
+def terma_params(fs, window_event=None, window_cycle=None, b_coef=None, width=None, margin=None, args=None):
     if args is None:
         if window_event is None:
             w1 = int(1 * fs)
@@ -633,17 +831,21 @@ def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_co
         width = int(args[3]*fs) if args[3] != -1 else int(0.7*fs)
         margin = int(args[4]*fs) if args[4] != -1 else int(1.0*fs)
 
-    ### Reject invalid coefficients
+    ### Reject invalid window sizes
     if w1 == 0 or w2 == 0:
-        return 0, []
+        return None
 
-    ### Clone input buffer so the input data remains unchanged
-    data_ = np.array(data)
-    data_event = np.array(data)
-    data_cycle = np.array(data)
+    return w1, w2, b, width, margin
+
+### TERMA moving average filtering applied to data_ in place; circular buffers can be passed in to be reused between calls
+def terma_filter(data_, w1, w2, b, circBuf_event=None, circBuf_cycle=None):
+    t = stage_start()
+
+    if circBuf_event is None:
+        circBuf_event = np.zeros(w1)
+    if circBuf_cycle is None:
+        circBuf_cycle = np.zeros(w2)
 
-    circBuf_event = np.zeros(w1)
-    circBuf_cycle = np.zeros(w2)
     wptr_ev = 0
     wptr_cy = 0
 
@@ -655,12 +857,8 @@ def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_co
     cy_oldest = 0
     cy_newest = 0
 
-    # Check if circular buffers are larger than input data
-    if len(circBuf_cycle) > len(data_) or len(circBuf_event) > len(data):
-        return 0, []
-
     # Starting state of event circular buffer
-    for i in range(len(circBuf_event)):
+    for i in range(w1):
         if i < int(w1/2):
             circBuf_event[i] = 0
         else:
@@ -668,7 +866,7 @@ def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_co
             ev_sum += circBuf_event[i]
         
     # Starting state of cycle circular buffer
-    for i in range(len(circBuf_cycle)):
+    for i in range(w2):
         if i < int(w2/2):
             circBuf_cycle[i] = 0
         else:
@@ -683,9 +881,7 @@ def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_co
         cycle = cy_sum/w2
 
         # Calculate new data value
-        data_event[i] = event
-        data_cycle[i] = cycle + b * z
-        data_[i] = data_event[i] - data_cycle[i]
+        data_[i] = event - (cycle + b * z)
 
         # Update event buffer data
         if i+int(w1/2) >= len(data_):
@@ -717,8 +913,44 @@ def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_co
         ev_sum = ev_sum - ev_oldest + ev_newest
         cy_sum = cy_sum - cy_oldest + cy_newest
 
+    stage_end("terma.filter", t, len(data_))
+
+    return data_
+
+### Corrected version of the TERMA algorithm ### Previous memory and performance optimizations are now quite redundant and need to be rethought
+def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_coef=None, width=None, margin=None, args=None):
+    """
+    TERMA algorithm for peak detection
+    """
+    data = np.atleast_1d(data)
+
+    if len(data) < 1:
+        return 0, []
+    
+    if fs <= 0:
+        return 0, []
+    
+    if window_size is None:
+        window_size = len(data)
+
+    ### Parameters
+    params = terma_params(fs, window_event=window_event, window_cycle=window_cycle, b_coef=b_coef, width=width, margin=margin, args=args)
+    if params is None:
+        return 0, []
+    w1, w2, b, width, margin = params
+
+    # Check if circular buffers are larger than input data
+    if w2 > len(data) or w1 > len(data):
+        return 0, []
+
+    ### Clone input buffer so the input data remains unchanged
+    data_ = np.array(data)
+    terma_filter(data_, w1, w2, b)
+
     ### Find peaks using zero crossing
+    t = stage_start()
     peak_count, peaks = zero_crossing(data=data_, rawdata=data, width=w1, fs=fs, margin=margin, th=0.0)
+    stage_end("terma.zero_crossing", t, len(data))
 
     ### Calculate RR
     # rr = find_rr(peaks, fs, window_size)
@@ -762,8 +994,10 @@ def count_orig(data, fs, window_size=None, max_troughs=None, percentile=None, th
         th_coef = float(args[2]) if args[2] != -1 else 0.2
 
     ### Find local maxima
+    t = stage_start()
     peaks = local_maxima(data)
     troughs = local_maxima(-data)
+    stage_end("count_orig.extrema", t, len(data))
 
     if len(peaks) == 0 or len(troughs) == 0:
         return 0, []
@@ -777,6 +1011,7 @@ def count_orig(data, fs, window_size=None, max_troughs=None, percentile=None, th
     troughs = [trough for trough in troughs if data[trough] < 0]
 
     ### Find valid respiratory cycles
+    t = stage_start()
     cycles = []
     cycle_durations = []
     for i in range(len(peaks)-1):
@@ -788,6 +1023,7 @@ def count_orig(data, fs, window_size=None, max_troughs=None, percentile=None, th
         if cycle_troughs <= max_troughs and cycle_troughs > 0:
             cycles.append(peaks[i])
             cycle_durations.append(peaks[i+1]-peaks[i])
+    stage_end("count_orig.cycles", t, len(peaks))
 
     ### Find RR
     mean_duration = np.mean(cycle_durations)
@@ -828,8 +1064,10 @@ def count_adv(data, fs, window_size=None, percentile=None, th_coef=None, args=No
         th_coef = float(args[2]) if args[2] != -1 else 0.8
 
     ### Find local maxima
+    t = stage_start()
     peaks = local_maxima(data)
     troughs = local_maxima(-data)
+    stage_end("count_adv.extrema", t, len(data))
 
     ### Define threshold
     extrema = peaks[:]
@@ -844,6 +1082,7 @@ def count_adv(data, fs, window_size=None, percentile=None, th_coef=None, args=No
     th = th_coef * q3
 
     ### Eliminate pairs of extrema if the difference in amplitude between them is smaller than the threshold
+    t = stage_start()
     eliminating = 1
     while eliminating:
         if len(extrema) < 3:
@@ -858,6 +1097,7 @@ def count_adv(data, fs, window_size=None, percentile=None, th_coef=None, args=No
         else:
             min_amp_pair_idx = min_amp_diff_idx + 1
             extrema = [e for i, e in enumerate(extrema) if i != min_amp_diff_idx and i != min_amp_pair_idx]
+    stage_end("count_adv.elimination", t, len(amps))
 
     if len(extrema) < 3:
         return 0, []
@@ -1031,23 +1271,8 @@ def padn(x, n):
         xp[i] = x[i]
     return xp
 
-### Custom CWT peaks implementation ### Reference: https://pywavelets.readthedocs.io/en/latest/ref/cwt.html#
-def cwt_peaks(data, fs, window_size=None, resolution=None, threshold=None, width=None, margin=None, min_freq=None, max_freq=None, kernel_size=None, args=None):
-    """
-    CWT algorithm for peak detection
-    """
-    data = np.atleast_1d(data)
-
-    if len(data) < 1:
-        return 0, []
-
-    if fs <= 0:
-        return 0, []
-
-    if window_size is None:
-        window_size = len(data)
-
-    ### Parameters
+### Resolve CWT parameters into (res, th, width, margin, f_min, f_max, wavelet_length) with width and margin in samples
+def cwt_params(fs, resolution=None, threshold=None, width=None, margin=None, min_freq=None, max_freq=None, kernel_size=None, args=None, default_threshold=0.1):
     if args is None:
         if resolution is None:
             res = 15
@@ -1055,7 +1280,7 @@ def cwt_peaks(data, fs, window_size=None, resolution=None, threshold=None, width
             res = int(resolution)
         
         if threshold is None:
-            th = 0.1
+            th = default_threshold
         else:
             th = float(threshold)
 
@@ -1078,56 +1303,87 @@ def cwt_peaks(data, fs, window_size=None, resolution=None, threshold=None, width
             f_max = 0.73
         else:
             f_max = max_freq
-
-        if kernel_size is None:
-            wavelet_length = 2
-        else:
-            wavelet_length = kernel_size
     else:
         res = int(args[0]) if args[0] != -1 else 15
-        th = args[1] if args[1] != -1 else 0.1
+        th = args[1] if args[1] != -1 else default_threshold
         width = int(args[2]*fs) if args[2] != -1 else int(0.5*fs)
         margin = int(args[3]*fs) if args[3] != -1 else int(1.0*fs)
         f_min = args[4] if args[4] != -1 else 0.02
         f_max = args[5] if args[5] != -1 else 0.73
+
+    if kernel_size is None:
+        wavelet_length = 2
+    else:
         wavelet_length = kernel_size
 
-    res = 5
-    centfreq = 0.25 ### https://scispace.com/pdf/qrs-complex-detection-using-combination-of-mexican-hat-30mk07j6d6.pdf
+    return res, th, width, margin, f_min, f_max, wavelet_length
 
-    ### Calculate appropriate CWT scales
-    scales = centfreq/(np.linspace(start=f_min, stop=f_max, num=res)/fs)
-    
-    ### Base array for the wavelet kernels
-    w_t = np.arange(start=-(wavelet_length/2)*fs, stop=(wavelet_length/2)*fs)
+### CWT scales for res frequencies between f_min and f_max
+def cwt_scales(fs, f_min, f_max, res):
+    centfreq = 0.25 ### https://scispace.com/pdf/qrs-complex-detection-using-combination-of-mexican-hat-30mk07j6d6.pdf
+    return centfreq/(np.linspace(start=f_min, stop=f_max, num=res)/fs)
 
-    ### Pad the input data with zeroes up to len(data) == nearest power of 2
-    data_len = len(data)
-    kern_len = len(w_t)
+### Kernel length and FFT size for convolving data_len samples with a wavelet of wavelet_length seconds
+def cwt_size(fs, data_len, wavelet_length):
+    kern_len = len(np.arange(start=-(wavelet_length/2)*fs, stop=(wavelet_length/2)*fs))
     size = data_len+kern_len-1
 
+    ### Pad up to the nearest power of 2
     p = math.log2(size)
     if p % 1 != 0.0:
         p = int(p)+1
 
-    size = 2**p
+    return kern_len, 2**p
 
-    data = padn(data, size)
-    
-    ### For each scale create a discretized and scaled version of the wavelet and perform convolution on the signal
-    out = []
-    for i, scale in enumerate(scales):
-        kernel = []
-        for i in range(len(w_t)):
-            kernel.append(wavelet(w_t[i], 0, scale, "gaus2"))
+### Kernel length and FFT size of the overlap-add windows
+def cwt_oa_size(fs, wavelet_length):
+    kernel_len = wavelet_length * fs
+    conv_size = (kernel_len * 2) - 1
+
+    p = math.log2(conv_size)
+    if p % 1 != 0.0:
+        p = int(p)+1
+
+    return kernel_len, 2**p
 
-        ### Pad the kernel with zeroes to match len(data)
-        kernel = padn(kernel, size)
+### Spectra of the discretized and scaled wavelet kernels, zero padded to size
+def cwt_kernel_spectra(fs, scales, wavelet_length, kernel_len, size):
 
-        ### Convolve
-        out.append(ifft(fft(data)*fft(kernel))[int(kern_len/2):data_len+int(kern_len/2)+1]) #
+    t = stage_start()
+
+    ### Base array for the wavelet kernels
+    wavelet_t = np.arange(start=-(wavelet_length/2)*fs, stop=(wavelet_length/2)*fs)
+
+    spectra = []
+    for scale in scales:
+        kernel = np.zeros(kernel_len)
+        for i in range(kernel_len):
+            kernel[i] = wavelet(wavelet_t[i], 0, scale, "gaus2")
+
+        ### Pad the kernel with zeroes to match the convolution size
+        spectra.append(fft(padn(kernel, size)))
+
+    stage_end("cwt.kernel_build", t, size)
+
+    return spectra
+
+### FFT convolution of data with each kernel spectrum, averaged across scales
+def cwt_average(data, spectra, kern_len, size):
+    data_len = len(data)
+    res = len(spectra)
+
+    ### Pad the input data with zeroes up to the convolution size
+    t = stage_start()
+    data_fft = fft(padn(data, size))
+
+    ### Convolve
+    out = []
+    for spectrum in spectra:
+        out.append(ifft(data_fft*spectrum)[int(kern_len/2):data_len+int(kern_len/2)+1])
+    stage_end("cwt.fft", t, size)
 
     ### Average across scales
+    t = stage_start()
     data_avg = []
     for i in range(len(out[0])):
         val = 0
@@ -1137,11 +1393,95 @@ def cwt_peaks(data, fs, window_size=None, resolution=None, threshold=None, width
 
         val = val/res
         data_avg.append(val)
+    stage_end("cwt.avg", t, data_len)
+
+    return data_avg
+
+### Overlap-add FFT convolution of data with each kernel spectrum, averaged across scales
+def cwt_oa_average(data, spectra, fs, kernel_len, conv_size):
+    signal_len = len(data)
+    res = len(spectra)
+
+    ### Divide signal into equal parts
+    t = stage_start()
+    window_start = 0
+    window_spectra = []
+    while window_start < signal_len:
+        temp = np.zeros(kernel_len)
+        for i in range(kernel_len):
+            if window_start + i < signal_len:
+                temp[i] = data[window_start + i]
+            else:
+                temp[i] = 0
+
+        ### Pad the window with zeroes for FFT convolution
+        window_spectra.append(fft(padn(temp, conv_size)))
+            
+        ### Move window forward
+        window_start += kernel_len
+
+    ### For each kernel perform overlap-add FFT convolution over all signal windows
+    scalogram = []
+    for spectrum in spectra:
+        convolved_signal = np.zeros(kernel_len*len(window_spectra) + int(1.5 * kernel_len) + 1)
+        for i, window_spectrum in enumerate(window_spectra):
+            convolved_window = ifft(window_spectrum*spectrum)[:kernel_len*2]
+            for j in range(len(convolved_window)):
+                convolved_signal[i * kernel_len + j] += convolved_window[j].real
+
+        ### Slicing performed to remove phase shift
+        scalogram.append(convolved_signal[int(kernel_len/2):int(-kernel_len/2)-fs-1])
+    stage_end("cwt_oa.fft", t, signal_len)
+
+    ### Average across scales
+    t = stage_start()
+    data_avg = np.zeros(signal_len)
+    for i in range(signal_len):
+        val = 0
+        for scale in range(res):
+            val += scalogram[scale][i]
+
+        val = val/res
+        data_avg[i] = val
+    stage_end("cwt_oa.avg", t, signal_len)
+
+    return data_avg
+
+### Custom CWT peaks implementation ### Reference: https://pywavelets.readthedocs.io/en/latest/ref/cwt.html#
+def cwt_peaks(data, fs, window_size=None, resolution=None, threshold=None, width=None, margin=None, min_freq=None, max_freq=None, kernel_size=None, args=None):
+    """
+    CWT algorithm for peak detection
+    """
+    data = np.atleast_1d(data)
+
+    if len(data) < 1:
+        return 0, []
+
+    if fs <= 0:
+        return 0, []
+
+    if window_size is None:
+        window_size = len(data)
+
+    ### Parameters
+    res, th, width, margin, f_min, f_max, wavelet_length = cwt_params(fs, resolution=resolution, threshold=threshold, width=width, margin=margin, min_freq=min_freq, max_freq=max_freq, kernel_size=kernel_size, args=args, default_threshold=0.1)
 
-    # return data_avg
+    res = 5
+
+    ### Calculate appropriate CWT scales
+    scales = cwt_scales(fs, f_min, f_max, res)
+
+    ### For each scale create a discretized and scaled version of the wavelet, padded to the convolution size
+    kern_len, size = cwt_size(fs, len(data), wavelet_length)
+    spectra = cwt_kernel_spectra(fs, scales, wavelet_length, kern_len, size)
+
+    ### Convolve and average across scales
+    data_avg = cwt_average(data, spectra, kern_len, size)
 
     ### Find breaths
+    t = stage_start()
     peak_count, peaks = zero_crossing(data_avg, width=width, fs=fs, margin=margin, th=th)
+    stage_end("cwt.zero_crossing", t, len(data_avg))
 
     ### Calculate RR
     # rr = find_rr(peaks, fs, window_size)
@@ -1166,130 +1506,372 @@ def cwt_peaks_oa(data, fs, window_size=None, resolution=None, threshold=None, wi
         window_size = len(data)
 
     ### Parameters
-    if args is None:
-        if resolution is None:
-            res = 15
-        else:
-            res = int(resolution)
-        
-        if threshold is None:
-            th = 0.0
-        else:
-            th = float(threshold)
+    res, th, width, margin, f_min, f_max, wavelet_length = cwt_params(fs, resolution=resolution, threshold=threshold, width=width, margin=margin, min_freq=min_freq, max_freq=max_freq, kernel_size=kernel_size, args=args, default_threshold=0.0)
 
-        if width is None:
-            width = int(0.5 * fs)
-        else:
-            width = int(width * fs)
+    ### Calculate appropriate CWT scales
+    scales = cwt_scales(fs, f_min, f_max, res)
 
-        if margin is None:
-            margin =  0
-        else:
-            margin = int(margin * fs)
+    ### Calculate the size of overlap-add FFT windows and create a scaled version of the wavelet for each scale
+    kernel_len, conv_size = cwt_oa_size(fs, wavelet_length)
+    spectra = cwt_kernel_spectra(fs, scales, wavelet_length, kernel_len, conv_size)
 
-        if min_freq is None:
-            f_min = 0.02
-        else:
-            f_min = min_freq
+    ### Overlap-add convolution and average across scales
+    data_avg = cwt_oa_average(data, spectra, fs, kernel_len, conv_size)
 
-        if max_freq is None:
-            f_max = 0.73
-        else:
-            f_max = max_freq
+    ### Find breaths
+    t = stage_start()
+    peak_count, peaks = zero_crossing(data_avg, width=width, fs=fs, margin=margin, th=th)
+    stage_end("cwt_oa.zero_crossing", t, len(data_avg))
 
-        if kernel_size is None:
-            wavelet_length = 2
-        else:
-            wavelet_length = kernel_size
-    else:
-        res = int(args[0]) if args[0] != -1 else 15
-        th = args[1] if args[1] != -1 else 0.0
-        width = int(args[2]*fs) if args[2] != -1 else int(0.5*fs)
-        margin = int(args[3]*fs) if args[3] != -1 else int(1.0*fs)
-        f_min = args[4] if args[4] != -1 else 0.02
-        f_max = args[5] if args[5] != -1 else 0.73
-        if kernel_size is None:
-            wavelet_length = 2
-        else:
-            wavelet_length = kernel_size
+    ### Calculate RR
+    # rr = find_rr(peaks, fs, window_size)
+    rr = find_rr_dist(peaks, fs)
 
-    centfreq = 0.25 ### https://scispace.com/pdf/qrs-complex-detection-using-combination-of-mexican-hat-30mk07j6d6.pdf
+    return rr, peaks
 
-    ### Calculate appropriate CWT scales
-    scales = centfreq/(np.linspace(start=f_min, stop=f_max, num=res)/fs)
-    
-    ### Base array for the wavelet kernels
-    wavelet_t = np.arange(start=-(wavelet_length/2)*fs, stop=(wavelet_length/2)*fs)
+### Precompiled parameter plans ###
+### A plan resolves the parameters of one algorithm for one sample rate once and keeps its scratch buffers between calls
 
-    ### Calculate the size of overlap-add FFT windows
-    signal_len = len(data)
-    kernel_len = wavelet_length * fs
-    conv_size = (kernel_len * 2) - 1
+### Scratch arena of the calling thread; a thread that sets thread_scratch.buffers to a dict shares those buffers between
+### every plan it runs, so a pool thread serving many channels keeps one set of buffers instead of one per plan
+thread_scratch = threading.local()
 
-    p = math.log2(conv_size)
-    if p % 1 != 0.0:
-        p = int(p)+1
+class AlgorithmPlan:
+    """
+    Callable plan that runs an algorithm with fixed parameters at a fixed sample rate
+    """
+    def __init__(self, function, fs, args=None, **params):
+        self.function = function
+        self.fs = fs
+        self.args = args
+        self.params = params
+        self.valid = fs > 0
+        self.buffers = {}
+
+    ### Run the algorithm on a data window and return (rr, peaks)
+    def __call__(self, data):
+        data = np.atleast_1d(data)
+
+        if len(data) < 1 or not self.valid:
+            return 0, []
+
+        return self.run(data)
+
+    def run(self, data):
+        return self.function(data=data, fs=self.fs, args=self.args, **self.params)
+
+    ### Scratch array of n elements that is reused between calls
+    def scratch(self, name, n):
+        buffers = getattr(thread_scratch, "buffers", None)
+        if buffers is None:
+            buffers = self.buffers
+
+        buffer = buffers.get(name)
+        if buffer is None or len(buffer) < n:
+            buffer = np.zeros(n)
+            buffers[name] = buffer
+        return buffer[:n]
+
+class SrmacPlan(AlgorithmPlan):
+    def __init__(self, fs, args=None, **params):
+        AlgorithmPlan.__init__(self, srmac, fs, args=args, **params)
+
+        resolved = srmac_params(fs, args=args, **params) if self.valid else None
+        if resolved is None:
+            self.valid = False
+            return
+        self.coef_fast, self.coef_slow, self.coef_cross, self.th, self.width, self.margin = resolved
+
+    def run(self, data):
+        newdata = srmac_filter(data, self.coef_fast, self.coef_slow, self.coef_cross, out=self.scratch("srmac", len(data)))
+        t = stage_start()
+        peak_count, peaks = zero_crossing(newdata, rawdata=data, width=self.width, fs=self.fs, margin=self.margin, th=self.th)
+        stage_end("srmac.zero_crossing", t, len(data))
+        return find_rr_dist(peaks, self.fs), peaks
+
+class TermaPlan(AlgorithmPlan):
+    def __init__(self, fs, args=None, **params):
+        AlgorithmPlan.__init__(self, terma, fs, args=args, **params)
+
+        resolved = terma_params(fs, args=args, **params) if self.valid else None
+        if resolved is None:
+            self.valid = False
+            return
+        self.w1, self.w2, self.b, self.width, self.margin = resolved
+
+        self.circBuf_event = np.zeros(self.w1)
+        self.circBuf_cycle = np.zeros(self.w2)
+
+    def run(self, data):
+        if self.w2 > len(data) or self.w1 > len(data):
+            return 0, []
+
+        data_ = self.scratch("terma", len(data))
+        data_[:] = data
+        terma_filter(data_, self.w1, self.w2, self.b, self.circBuf_event, self.circBuf_cycle)
+
+        t = stage_start()
+        peak_count, peaks = zero_crossing(data=data_, rawdata=data, width=self.w1, fs=self.fs, margin=self.margin, th=0.0)
+        stage_end("terma.zero_crossing", t, len(data))
+        return find_rr_dist(peaks, self.fs), peaks
+
+class FindPeaksPlan(AlgorithmPlan):
+    def __init__(self, fs, args=None, **params):
+        AlgorithmPlan.__init__(self, find_peaks, fs, args=args, **params)
+        self.prominence, self.heval_ratio, self.width, self.proximity = find_peaks_params(fs, args=args, **params)
+
+    def run(self, data):
+        peaks = select_peaks(data, self.prominence, self.heval_ratio, self.width, self.proximity)
+        return find_rr_dist(peaks, self.fs), peaks
+
+### The kernel spectra depend on the padded window length, so they are cached per FFT size
+class CwtPlan(AlgorithmPlan):
+    def __init__(self, fs, args=None, **params):
+        AlgorithmPlan.__init__(self, cwt_peaks, fs, args=args, **params)
+
+        res, self.th, self.width, self.margin, f_min, f_max, self.wavelet_length = cwt_params(fs, args=args, default_threshold=0.1, **params)
+        self.scales = cwt_scales(fs, f_min, f_max, 5)
+        self.spectra = {}
+
+    def run(self, data):
+        kern_len, size = cwt_size(self.fs, len(data), self.wavelet_length)
+        if size not in self.spectra:
+            self.spectra[size] = cwt_kernel_spectra(self.fs, self.scales, self.wavelet_length, kern_len, size)
+
+        data_avg = cwt_average(data, self.spectra[size], kern_len, size)
+
+        t = stage_start()
+        peak_count, peaks = zero_crossing(data_avg, width=self.width, fs=self.fs, margin=self.margin, th=self.th)
+        stage_end("cwt.zero_crossing", t, len(data_avg))
+        return find_rr_dist(peaks, self.fs), peaks
+
+class CwtOaPlan(AlgorithmPlan):
+    def __init__(self, fs, args=None, **params):
+        AlgorithmPlan.__init__(self, cwt_peaks_oa, fs, args=args, **params)
+
+        res, self.th, self.width, self.margin, f_min, f_max, wavelet_length = cwt_params(fs, args=args, default_threshold=0.0, **params)
+        scales = cwt_scales(fs, f_min, f_max, res)
+        self.kernel_len, self.conv_size = cwt_oa_size(fs, wavelet_length)
+        self.spectra = cwt_kernel_spectra(fs, scales, wavelet_length, self.kernel_len, self.conv_size)
+
+    def run(self, data):
+        data_avg = cwt_oa_average(data, self.spectra, self.fs, self.kernel_len, self.conv_size)
+
+        t = stage_start()
+        peak_count, peaks = zero_crossing(data_avg, width=self.width, fs=self.fs, margin=self.margin, th=self.th)
+        stage_end("cwt_oa.zero_crossing", t, len(data_avg))
+        return find_rr_dist(peaks, self.fs), peaks
+
+### Algorithm registry ###
+### Each entry holds the peak detection function, its keyword parameters mapped to the type their values are converted to,
+### and a plan factory called as plan(fs, args=None, **params)
+algorithm_registry = {}
+
+def register_algorithm(name, function, params, plan=None):
+    if plan is None:
+        def plan(fs, args=None, **kwargs):
+            return AlgorithmPlan(function, fs, args=args, **kwargs)
+
+    algorithm_registry[name] = {"function": function, "params": params, "plan": plan}
+
+### Validate and convert the parameters of a registered algorithm once and return a callable plan; returns None if they are invalid
+def make_plan(algorithm, fs, args=None, backend=None, **params):
+    entry = algorithm_registry.get(algorithm)
+    if entry is None:
+        print(str(algorithm) + " algorithm is not a valid option.")
+        return None
 
-    conv_size = 2**p
+    if fs <= 0:
+        print("sample rate cannot be 0")
+        return None
+
+    ### Check parameter names and convert values to their declared types
+    converted = {}
+    for name, value in params.items():
+        if name not in entry["params"]:
+            print(str(name) + " is not a valid parameter for " + algorithm)
+            return None
+        if value is None:
+            continue
+        try:
+            converted[name] = entry["params"][name](value)
+        except (TypeError, ValueError):
+            print("invalid value for " + algorithm + " parameter " + str(name))
+            return None
 
-    ### Divide signal into equal parts
-    window_start = 0
-    signal_windows = []
-    while window_start < signal_len:
-        temp = np.zeros(kernel_len)
-        for i in range(kernel_len):
-            if window_start + i < signal_len:
-                temp[i] = data[window_start + i]
+    try:
+        ### Compiled implementations do their own parameter handling, so they are wrapped as they are
+        module = get_backend(backend)
+        if module is not None and algorithm in module.algorithms:
+            plan = AlgorithmPlan(module.algorithms[algorithm], fs, args=args, **converted)
+        else:
+            plan = entry["plan"](fs, args=args, **converted)
+    except Exception as e:
+        print("error: "+str(e))
+        return None
+
+    if not plan.valid:
+        print("invalid parameters for " + algorithm)
+        return None
+
+    return plan
+
+srmac_spec = {"coef_fast": float, "coef_slow": float, "coef_cross": float, "threshold": float, "width": float, "margin": float}
+terma_spec = {"window_event": float, "window_cycle": float, "b_coef": float, "width": float, "margin": float}
+find_peaks_spec = {"prominence": float, "heval_ratio": float, "width": float, "proximity": float}
+cwt_spec = {"resolution": int, "threshold": float, "width": float, "margin": float, "min_freq": float, "max_freq": float, "kernel_size": int}
+
+register_algorithm("default", find_peaks, find_peaks_spec, FindPeaksPlan)
+register_algorithm("find_peaks", find_peaks, find_peaks_spec, FindPeaksPlan)
+register_algorithm("cwt", cwt_peaks, cwt_spec, CwtPlan)
+register_algorithm("cwt_oa", cwt_peaks_oa, cwt_spec, CwtOaPlan)
+register_algorithm("srmac", srmac, srmac_spec, SrmacPlan)
+register_algorithm("terma", terma, terma_spec, TermaPlan)
+register_algorithm("count_orig", count_orig, {"max_troughs": int, "percentile": int, "th_coef": float})
+register_algorithm("count_adv", count_adv, {"percentile": int, "th_coef": float})
+
+### Default look-back in seconds that non-causal algorithms need around each hop
+sliding_lookback = {
+    "default": 10,
+    "find_peaks": 10,
+    "cwt": 10,
+    "cwt_oa": 10,
+    "terma": 10,
+    "count_orig": 10,
+    "count_adv": 10,
+}
+
+### Incremental sliding-window RR estimator that reuses the breaths found in previous hops
+class SlidingRREstimator:
+    """
+    Sliding-window RR estimator whose per-hop cost scales with the hop size instead of the window size
+    """
+    def __init__(self, fs, window_size, algorithm="srmac", lookback=None, args=None, **params):
+        self.fs = fs
+        self.window_len = int(window_size * fs)
+        self.algorithm = algorithm
+        self.args = args
+        self.params = params
+
+        if lookback is None:
+            lookback = sliding_lookback.get(algorithm, 10)
+        self.lookback = int(lookback * fs)
+
+        ### Parameters are resolved once for all hops; SRMAC runs its own incremental loop on the resolved coefficients
+        self.plan = make_plan(algorithm, fs, args=args, backend="python" if algorithm == "srmac" else None, **params)
+
+        self.reset()
+
+    ### Forget all processed samples and detected breaths
+    def reset(self):
+        self.total = 0
+        self.breaths = deque()
+        self.interval_sum = 0
+        self.committed = 0
+        self.history = np.zeros(0)
+
+        ### SRMAC filter and zero-crossing run state
+        self.prevfast = None
+        self.prevslow = None
+        self.prevcross = 0.0
+        self.positive, self.delta = 0, 0
+        self.maximum = 0.0
+
+    ### Process the next block of samples and return the RR and breath indices relative to the current window
+    def update(self, samples):
+        samples = np.atleast_1d(samples).astype(np.float64)
+
+        if len(samples) > 0:
+            if self.algorithm == "srmac":
+                self.update_srmac(samples)
             else:
-                temp[i] = 0
-
-        ### Pad the window with zeroes for FFT convolution
-        signal_windows.append(padn(temp, conv_size))
-            
-        ### Move window forward
-        window_start += kernel_len
-
-    signal_windows = np.array(signal_windows)
-
-    ### For each scale create a scaled version of the wavelet
-    kernels = []
-    for i, scale in enumerate(scales):
-        kernel = np.zeros(kernel_len)
-        for i in range(kernel_len):
-            kernel[i] = wavelet(wavelet_t[i], 0, scale, "gaus2") # * (1/math.sqrt(scale))
-
-        ### Pad the kernel with zeroes for FFT convolution
-        kernels.append(padn(kernel, conv_size))
+                self.update_generic(samples)
+            self.total += len(samples)
+
+        ### Drop breaths that have left the window
+        start = self.window_start()
+        while len(self.breaths) > 0 and self.breaths[0] < start:
+            self.pop_breath()
+
+        return self.rr(), [b - start for b in self.breaths]
+
+    ### Absolute index of the first sample in the current window
+    def window_start(self):
+        return max(0, self.total - self.window_len)
+
+    ### RR over the breaths in the current window; equivalent to find_rr_dist
+    def rr(self):
+        if len(self.breaths) <= 1 or self.interval_sum <= 0:
+            return 0
+        return (60*self.fs) * (len(self.breaths)-1) / self.interval_sum
+
+    def push_breath(self, index):
+        if len(self.breaths) > 0:
+            self.interval_sum += index - self.breaths[-1]
+        self.breaths.append(index)
+
+    def pop_breath(self):
+        first = self.breaths.popleft()
+        if len(self.breaths) > 0:
+            self.interval_sum -= self.breaths[0] - first
+
+    ### SRMAC is causal, so filter and zero-crossing state simply carry over between hops
+    def update_srmac(self, samples):
+        if self.plan is None:
+            return
+        plan = self.plan
+        coef_fast, coef_slow, coef_cross, th, width = plan.coef_fast, plan.coef_slow, plan.coef_cross, plan.th, plan.width
+        if width < 1:
+            width = 1
+
+        if self.prevfast is None:
+            self.prevfast = samples[0]
+            self.prevslow = samples[0]
+            self.maximum = th
+
+        prevfast, prevslow, prevcross = self.prevfast, self.prevslow, self.prevcross
+        positive, delta, maximum = self.positive, self.delta, self.maximum
+
+        for i, curr in enumerate(samples):
+            prevfast = curr * coef_fast + prevfast * (1-coef_fast)
+            prevslow = curr * coef_slow + prevslow * (1-coef_slow)
+            prevcross = (prevfast-prevslow) * coef_cross + prevcross * (1-coef_cross)
+
+            ### Same run logic as zero_crossing with the raw data used for the maxima
+            if prevcross > th:
+                positive += 1
+                delta += 1
+                if curr > maximum:
+                    maximum = curr
+                    delta = 0
+            else:
+                delta += 1
+                if positive >= width:
+                    self.push_breath(self.total + i - delta)
+                positive, delta = 0, 0
+                maximum = th
 
-    kernels = np.array(kernels)
+        self.prevfast, self.prevslow, self.prevcross = prevfast, prevslow, prevcross
+        self.positive, self.delta, self.maximum = positive, delta, maximum
 
-    ### For each kernel perform overlap-add FFT convolution over all signal windows
-    scalogram = []
-    for kernel in kernels:
-        convolved_signal = np.zeros(kernel_len*len(signal_windows) + int(1.5 * kernel_len) + 1)
-        for i, window in enumerate(signal_windows):
-            convolved_window = ifft(fft(window)*fft(kernel))[:kernel_len*2]
-            for j in range(len(convolved_window)):
-                convolved_signal[i * kernel_len + j] += convolved_window[j].real
+    ### Non-causal algorithms rerun on the new samples plus the look-back and only commit breaths with context on both sides
+    def update_generic(self, samples):
+        segment = np.concatenate((self.history, samples))
+        segment_start = self.total - len(self.history)
+        end = self.total + len(samples)
+        guard = self.lookback // 2
 
-        ### Slicing performed to remove phase shift
-        scalogram.append(convolved_signal[int(kernel_len/2):int(-kernel_len/2)-fs-1])
-
-    ### Average across scales
-    data_avg = np.zeros(signal_len)
-    for i in range(signal_len):
-        val = 0
-        for scale in range(res):
-            val += scalogram[scale][i]
+        self.history = segment[-self.lookback:] if self.lookback > 0 else np.zeros(0)
 
-        val = val/res
-        data_avg[i] = val
+        if self.plan is None:
+            return
 
-    ### Find breaths
-    peak_count, peaks = zero_crossing(data_avg, width=width, fs=fs, margin=margin, th=th)
+        rr, peaks = self.plan(segment)
 
-    ### Calculate RR
-    # rr = find_rr(peaks, fs, window_size)
-    rr = find_rr_dist(peaks, fs)
+        for peak in peaks:
+            index = segment_start + int(peak)
+            if index >= self.committed and index < end - guard:
+                if len(self.breaths) == 0 or index > self.breaths[-1]:
+                    self.push_breath(index)
 
-    return rr, peaks
+        self.committed = max(self.committed, end - guard)
@@ -0,0 +1,320 @@
+import os, sys, glob, json, time, argparse, warnings, itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import rralglib
+import rralglib_io
+
+### Headless batch runner for rralglib ###
+### Runs an algorithm over every window of every recording in a set of files, directories or globs in a process pool
+### and streams one row per window to a CSV file per recording; each recording is read in chunks, so memory use is
+### bounded by the window length and the number of workers, not by the recording length or the number of files
+### Output is written under a temporary name and renamed when the recording is done, and the settings it was made with are
+### stored next to it, so an interrupted run is resumed by running it again: recordings whose output already exists with
+### the same settings are skipped
+
+WINDOW_SIZE = 20
+HOP_SIZE = 1
+RECORDING_PATTERNS = ["*.csv", "*.rrbin", "*.rrd"]
+COLUMNS = ["start", "time", "rr", "sqi", "breaths"]
+SQI_FUNCTIONS = {"full": rralglib.sqi_full, "lite": rralglib.sqi_lite, "none": None}
+SETTINGS_SUFFIX = ".json"
+
+### Whether path lies inside directory
+def is_within(path, directory):
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+### Output of an earlier run: it has a settings file, or it is named like an output of algorithm
+def is_output(path, algorithm=None):
+    if os.path.exists(path + SETTINGS_SUFFIX):
+        return True
+    return algorithm is not None and path.endswith("." + algorithm + ".csv")
+
+### Expand files, directories and glob patterns into a sorted list of recordings
+def find_recordings(inputs, patterns=None, output=None, algorithm=None):
+    """
+    Outputs of earlier runs are never returned, and neither are files in the output directory unless their directory
+    was given as an input itself, or binary caches whose source recording is found too
+    """
+    if patterns is None:
+        patterns = RECORDING_PATTERNS
+
+    found = set()
+    directories = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            directories.add(os.path.abspath(item))
+            for pattern in patterns:
+                found.update(glob.glob(os.path.join(item, pattern)))
+        elif os.path.isfile(item):
+            found.add(item)
+        else:
+            found.update(path for path in glob.glob(item) if os.path.isfile(path))
+
+    ### A binary cache written by rralglib_io.open_recording holds the same samples as its source
+    sources = set(os.path.abspath(path) for path in found)
+
+    recordings = []
+    for path in found:
+        if is_output(path, algorithm):
+            continue
+        if path.endswith(rralglib_io.CACHE_SUFFIX) and os.path.abspath(path[:-len(rralglib_io.CACHE_SUFFIX)]) in sources:
+            continue
+        if output is not None and is_within(path, output) and os.path.dirname(os.path.abspath(path)) not in directories:
+            continue
+        recordings.append(path)
+
+    return sorted(recordings)
+
+### Common directory of a set of recordings; outputs mirror the recordings' paths below it
+def recording_root(recordings):
+    if len(recordings) == 0:
+        return None
+    return os.path.commonpath([os.path.dirname(os.path.abspath(recording)) for recording in recordings])
+
+### Output file of a recording; with root, the path relative to root is kept so recordings with the same name don't collide
+def output_path(recording, output, algorithm, root=None):
+    name = os.path.basename(recording)
+    if root is not None:
+        relative = os.path.relpath(os.path.abspath(recording), root)
+        if not relative.startswith(os.pardir):
+            name = relative
+    return os.path.join(output, name + "." + algorithm + ".csv")
+
+### Everything that changes the rows of an output, stored next to it
+def batch_settings(algorithm="default", params=None, window_size=WINDOW_SIZE, hop_size=HOP_SIZE, sqi="lite", fs=None, key_data=None, key_time=None, delimiter=None):
+    return {
+        "algorithm": algorithm,
+        "params": {str(key): str(value) for key, value in sorted((params or {}).items())},
+        "window": float(window_size),
+        "hop": float(hop_size),
+        "sqi": sqi,
+        "fs": None if fs is None else float(fs),
+        "columns": [repr(key_data), repr(key_time), repr(delimiter)],
+    }
+
+def read_settings(output_file):
+    try:
+        with open(output_file + SETTINGS_SUFFIX) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def write_settings(output_file, settings):
+    temp = output_file + SETTINGS_SUFFIX + ".part"
+    with open(temp, "w") as file:
+        json.dump(settings, file, indent=1)
+    os.replace(temp, output_file + SETTINGS_SUFFIX)
+
+### An output is complete if it exists and was made with the same settings
+def is_complete(output_file, settings):
+    return os.path.exists(output_file) and read_settings(output_file) == settings
+
+### Sample rate from the time stamps of the first chunk
+def chunk_fs(time):
+    if len(time) < 2:
+        return 0
+    fs = 1 / np.median(np.diff(time))
+    return int(round(fs)) if abs(fs - round(fs)) < 1e-6 else fs
+
+### Every full window of a streamed recording as (start, time, window); only the current window and one chunk are kept
+def stream_windows(chunks, window_len, hop_len):
+    buffer, buffer_time = np.zeros(0), np.zeros(0)
+    buffer_start = 0
+    next_start = 0
+
+    for start, data, time in chunks:
+        buffer = np.concatenate((buffer, data))
+        buffer_time = np.concatenate((buffer_time, time))
+
+        while next_start + window_len <= buffer_start + len(buffer):
+            offset = next_start - buffer_start
+            yield next_start, buffer_time[offset], buffer[offset:offset+window_len]
+            next_start += hop_len
+
+        ### Drop samples no later window needs
+        drop = min(next_start - buffer_start, len(buffer))
+        buffer, buffer_time = buffer[drop:], buffer_time[drop:]
+        buffer_start += drop
+
+### Analyze one recording and write its rows; returns a summary dict; module level so worker processes can unpickle it
+def process_recording(recording, output_file, algorithm="default", params=None, window_size=WINDOW_SIZE, hop_size=HOP_SIZE, sqi="lite", fs=None, key_data=None, key_time=None, delimiter=None):
+    summary = {"recording": recording, "output": output_file, "windows": 0, "failures": 0, "rr_mean": 0, "elapsed_s": 0, "error": None}
+
+    ### A recording that can't be read fails on its own without stopping the batch
+    try:
+        summary = analyze_recording(summary, algorithm, params, window_size, hop_size, sqi, fs, key_data, key_time, delimiter)
+        if summary["error"] is None:
+            write_settings(output_file, batch_settings(algorithm, params, window_size, hop_size, sqi, fs, key_data, key_time, delimiter))
+        return summary
+    except Exception as e:
+        summary["error"] = type(e).__name__ + ": " + str(e)
+        if os.path.exists(output_file + ".part"):
+            os.remove(output_file + ".part")
+        return summary
+
+def analyze_recording(summary, algorithm, params, window_size, hop_size, sqi, fs, key_data, key_time, delimiter):
+    t0 = time.perf_counter()
+    recording, output_file = summary["recording"], summary["output"]
+
+    chunks = rralglib_io.stream_recording(recording, key_data=key_data, key_time=key_time, delimiter=delimiter)
+    first = next(chunks, None)
+    if first is None:
+        summary["error"] = "empty recording"
+        return summary
+
+    if fs is None:
+        fs = chunk_fs(first[2])
+    if not fs:
+        summary["error"] = "unknown sample rate"
+        return summary
+
+    plan = rralglib.make_plan(algorithm, fs, **(params or {}))
+    if plan is None:
+        summary["error"] = "invalid algorithm or parameters"
+        return summary
+
+    sqi_function = SQI_FUNCTIONS[sqi]
+    window_len = int(window_size * fs)
+    hop_len = max(1, int(hop_size * fs))
+    rr_sum = 0
+    if window_len < 1:
+        summary["error"] = "window is shorter than one sample"
+        return summary
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    temp = output_file + ".part"
+    with open(temp, "w") as file, warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        file.write(",".join(COLUMNS) + "\n")
+
+        for start, start_time, window in stream_windows(itertools.chain([first], chunks), window_len, hop_len):
+            window = rralglib.z_norm(window)
+            try:
+                rr, peaks = plan(window)
+            except Exception:
+                rr, peaks = -1, []
+
+            if rr == -1:
+                summary["failures"] += 1
+                quality = 0
+            else:
+                rr_sum += rr
+                quality = sqi_function(peaks, window) if sqi_function is not None else 0
+
+            file.write(str(start) + "," + repr(float(start_time)) + "," + repr(float(rr)) + "," + repr(float(quality)) + "," + str(len(peaks)) + "\n")
+            summary["windows"] += 1
+
+    os.replace(temp, output_file)
+
+    valid = summary["windows"] - summary["failures"]
+    summary["rr_mean"] = rr_sum / valid if valid > 0 else 0
+    summary["elapsed_s"] = time.perf_counter() - t0
+    return summary
+
+### Run a batch; returns the list of summaries of the recordings processed in this run
+def run_batch(recordings, output, algorithm="default", params=None, window_size=WINDOW_SIZE, hop_size=HOP_SIZE, sqi="lite", fs=None, workers=None, force=False, verbose=True, **read_args):
+    """
+    Process recordings in a process pool with at most two pending recordings per worker; workers=0 runs in this process
+    """
+    os.makedirs(output, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    jobs = []
+    root = recording_root(recordings)
+    settings = batch_settings(algorithm, params, window_size, hop_size, sqi, fs, **read_args)
+    for recording in recordings:
+        output_file = output_path(recording, output, algorithm, root)
+        if is_complete(output_file, settings) and not force:
+            if verbose:
+                print("skip " + os.path.basename(recording) + " (done)")
+            continue
+        jobs.append((recording, output_file))
+
+    summaries = []
+    arguments = (algorithm, params, window_size, hop_size, sqi, fs)
+
+    def report(summary):
+        summaries.append(summary)
+        if not verbose:
+            return
+        name = os.path.basename(summary["recording"])
+        progress = "[" + str(len(summaries)) + "/" + str(len(jobs)) + "] "
+        if summary["error"] is not None:
+            print(progress + name + ": " + summary["error"])
+        else:
+            print(progress + name + ": " + str(summary["windows"]) + " windows, " + str(summary["failures"]) + " failed, mean RR " + str(round(summary["rr_mean"], 2)) + ", " + str(round(summary["elapsed_s"], 2)) + " s")
+
+    if workers == 0:
+        for recording, output_file in jobs:
+            report(process_recording(recording, output_file, *arguments, **read_args))
+        return summaries
+
+    ### Recordings are submitted as workers free up, so pending work stays bounded however many files there are
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        jobs_left = iter(jobs)
+        while True:
+            for recording, output_file in itertools.islice(jobs_left, 2 * workers - len(pending)):
+                pending[pool.submit(process_recording, recording, output_file, *arguments, **read_args)] = recording
+            if len(pending) == 0:
+                break
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                recording = pending.pop(future)
+                try:
+                    report(future.result())
+                except Exception as e:
+                    ### The worker process itself died
+                    report({"recording": recording, "windows": 0, "failures": 0, "rr_mean": 0, "elapsed_s": 0, "error": str(e)})
+
+    return summaries
+
+### Parse key=value parameter overrides
+def parse_params(items):
+    params = {}
+    for item in items or []:
+        if "=" not in item:
+            print("Parameter " + item + " is not of the form key=value")
+            return None
+        key, value = item.split("=", 1)
+        params[key.strip()] = value.strip()
+    return params
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an rralglib algorithm over directories of recordings")
+    parser.add_argument("inputs", nargs="+", help="recordings, directories or glob patterns")
+    parser.add_argument("--output", required=True, help="directory for the per-recording CSV files")
+    parser.add_argument("--algorithm", default="default", help="algorithm name")
+    parser.add_argument("--param", action="append", help="algorithm parameter as key=value, repeatable")
+    parser.add_argument("--window", type=float, default=WINDOW_SIZE, help="window size in seconds")
+    parser.add_argument("--hop", type=float, default=HOP_SIZE, help="hop size in seconds")
+    parser.add_argument("--sqi", choices=list(SQI_FUNCTIONS.keys()), default="lite", help="signal quality index per window")
+    parser.add_argument("--fs", type=float, help="sample rate (default: from the time column)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core, 0 runs in this process)")
+    parser.add_argument("--force", action="store_true", help="reprocess recordings whose output already exists")
+    args = parser.parse_args(argv)
+
+    params = parse_params(args.param)
+    if params is None:
+        return 2
+    if args.window <= 0 or args.hop <= 0:
+        print("Window and hop sizes must be positive")
+        return 2
+    if rralglib.make_plan(args.algorithm, args.fs or 64, **params) is None:
+        print("Invalid algorithm or parameters")
+        return 2
+
+    recordings = find_recordings(args.inputs, output=args.output, algorithm=args.algorithm)
+    if len(recordings) == 0:
+        print("No recordings found")
+        return 1
+
+    summaries = run_batch(recordings, args.output, args.algorithm, params, args.window, args.hop, args.sqi, args.fs, args.workers, args.force)
+
+    return 1 if any(summary["error"] is not None for summary in summaries) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
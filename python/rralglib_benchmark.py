@@ -0,0 +1,495 @@
+import os, gc, time, math, json, argparse, platform, warnings, tracemalloc
+import numpy as np
+import rralglib
+import rralglib_io
+import rralglib_parallel
+
+### Benchmark suite for the rralglib detectors ###
+### Replays recordings window by window the same way the visualizer does and reports throughput and latency as JSON
+
+### Visualizer defaults
+WINDOW_SIZE = 20
+HOP_SIZE = 1
+
+### Bundled recordings
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+recordings = [
+    os.path.join(root_dir, "321_square_Dec12_Gen2.csv"),
+    os.path.join(root_dir, "321_square_Dec12_Neulog.csv"),
+]
+
+### Nearest-rank percentile of a list of latencies
+def percentile(values, q):
+    if len(values) == 0:
+        return 0
+    values = sorted(values)
+    rank = int(math.ceil(q / 100 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+### Replay data through one algorithm with a sliding window and return a result record
+def benchmark_algorithm(data, fs, algorithm, window_size=WINDOW_SIZE, hop_size=HOP_SIZE, backend=None, plan=False, max_windows=None):
+    window_len = int(window_size * fs)
+    hop_len = max(1, int(hop_size * fs))
+
+    starts = list(range(0, len(data) - window_len + 1, hop_len))
+    if max_windows is not None:
+        starts = starts[:max_windows]
+
+    if plan:
+        runner = rralglib.make_plan(algorithm, fs, backend=backend)
+        if runner is None:
+            return None
+    else:
+        def runner(window):
+            return rralglib.run_algorithm(window, fs, algorithm=algorithm, backend=backend)
+
+    ### Untimed first window so one-off costs (imports, JIT loading, plan caches) are not counted
+    if len(starts) > 0:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            runner(rralglib.z_norm(data[starts[0]:starts[0]+window_len]))
+
+    latencies = []
+    failures = 0
+    empty = 0
+    with warnings.catch_warnings():
+        ### Windows without breaths make some detectors average empty arrays; that is counted, not printed
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        t0 = time.perf_counter()
+        for start in starts:
+            t = time.perf_counter()
+            rr, peaks = runner(rralglib.z_norm(data[start:start+window_len]))
+            latencies.append(time.perf_counter() - t)
+            if rr == -1:
+                failures += 1
+            elif len(peaks) == 0:
+                empty += 1
+        elapsed = time.perf_counter() - t0
+
+    windows = len(starts)
+    return {
+        "algorithm": algorithm,
+        "backend": backend if backend is not None else rralglib.backend,
+        "plan": plan,
+        "fs": fs,
+        "window_size": window_size,
+        "hop_size": hop_size,
+        "windows": windows,
+        "failures": failures,
+        "empty_windows": empty,
+        "elapsed_s": elapsed,
+        "windows_per_s": windows / elapsed if elapsed > 0 else 0,
+        "samples_per_s": windows * window_len / elapsed if elapsed > 0 else 0,
+        "realtime_factor": windows * hop_len / fs / elapsed if elapsed > 0 else 0,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+### Environment description stored with every report so results from different machines are not mixed up
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "system": platform.system(),
+        "cpu_count": os.cpu_count(),
+    }
+
+### Throughput suite: every recording through every algorithm
+def run_throughput(paths=None, algorithms=None, backend=None, plan=False, window_size=WINDOW_SIZE, hop_size=HOP_SIZE, max_windows=None, memory=False, verbose=True):
+    if paths is None:
+        paths = recordings
+    if algorithms is None:
+        algorithms = list(rralglib.algorithm_registry.keys())
+
+    results = []
+    stages = []
+    for path in paths:
+        data, fs = rralglib_io.read_recording(path)
+        if fs <= 0:
+            print("Couldn't determine the sample rate of "+str(path))
+            continue
+
+        ### Memory is measured on the first window of the recording
+        window = rralglib.z_norm(data[:int(window_size * fs)])
+
+        for algorithm in algorithms:
+            result = benchmark_algorithm(data, fs, algorithm, window_size=window_size, hop_size=hop_size, backend=backend, plan=plan, max_windows=max_windows)
+            if result is None:
+                continue
+            result["recording"] = os.path.basename(path)
+            if memory:
+                result.update(memory_algorithm(window, fs, algorithm, backend=backend, plan=plan))
+            results.append(result)
+            if verbose:
+                print_result(result)
+
+        if memory:
+            for result in memory_stages(window, fs):
+                result["recording"] = os.path.basename(path)
+                stages.append(result)
+                if verbose:
+                    print_memory(result)
+
+    report = {"suite": "throughput", "environment": environment(), "results": results}
+    if memory:
+        report["stages"] = stages
+    return report
+
+def print_result(result):
+    line = "{:<28} {:<10} {:>7} win/s {:>10} samples/s  p50 {:>9.3f} ms  p99 {:>9.3f} ms".format(
+        result["recording"], result["algorithm"], round(result["windows_per_s"], 1), round(result["samples_per_s"]),
+        result["latency_p50_ms"], result["latency_p99_ms"])
+    if "peak_bytes" in result:
+        line += "  peak {:>9} B ({:.1f}x window) {:>6} blocks".format(result["peak_bytes"], result["peak_ratio"], result["blocks"])
+    print(line)
+
+def print_memory(result):
+    print("{:<28} {:<18} peak {:>9} B ({:.1f}x window) {:>6} blocks".format(result["recording"], result["stage"], result["peak_bytes"], result["peak_ratio"], result["blocks"]))
+
+### Compare two reports and return the speedup of report over baseline per (recording, algorithm)
+def compare(report, baseline):
+    key = lambda r: (r.get("recording"), r["algorithm"], r["backend"], r["plan"])
+    base = {key(r): r for r in baseline["results"]}
+
+    speedups = {}
+    for result in report["results"]:
+        old = base.get(key(result))
+        if old is None or old["windows_per_s"] <= 0:
+            continue
+        speedups["/".join(str(k) for k in key(result))] = result["windows_per_s"] / old["windows_per_s"]
+
+    return speedups
+
+### Compare two reports with memory results and return the peak memory of report relative to baseline
+def compare_memory(report, baseline):
+    key = lambda r: (r.get("recording"), r.get("algorithm", r.get("stage")), r.get("backend"), r.get("plan"))
+    base = {key(r): r for r in baseline["results"] + baseline.get("stages", []) if "peak_bytes" in r}
+
+    ratios = {}
+    for result in report["results"] + report.get("stages", []):
+        old = base.get(key(result))
+        if old is None or "peak_bytes" not in result or old["peak_bytes"] <= 0:
+            continue
+        ratios["/".join(str(k) for k in key(result))] = result["peak_bytes"] / old["peak_bytes"]
+
+    return ratios
+
+### Memory benchmarks ###
+### tracemalloc sees numpy buffers as well as Python objects; it exposes the peak but no allocation counter,
+### so the block count is the number of traced blocks a call leaves allocated (e.g. its result and any caches)
+
+### Peak and retained traced memory of one call, relative to the memory traced before it
+def measure_memory(function):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        result = function()
+
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del result
+
+    return {"peak_bytes": peak - base, "retained_bytes": current - base, "blocks": blocks}
+
+### Memory of one algorithm on a window of data; the ratio is the peak over the size of the window itself
+def memory_algorithm(window, fs, algorithm, backend=None, plan=False):
+    if plan:
+        runner = rralglib.make_plan(algorithm, fs, backend=backend)
+        if runner is None:
+            return None
+        ### First call outside the measurement so plan caches count as setup, not per-window cost
+        runner(window)
+    else:
+        runner = lambda x: rralglib.run_algorithm(x, fs, algorithm=algorithm, backend=backend)
+
+    result = measure_memory(lambda: runner(window))
+    result["peak_ratio"] = result["peak_bytes"] / window.nbytes if window.nbytes > 0 else 0
+    return result
+
+### Memory of every stage in stage_functions on a window of data
+def memory_stages(window, fs):
+    results = []
+    for stage, (function, expected) in stage_functions(fs).items():
+        result = measure_memory(lambda: function(window))
+        result["stage"] = stage
+        result["peak_ratio"] = result["peak_bytes"] / window.nbytes if window.nbytes > 0 else 0
+        results.append(result)
+    return results
+
+### Scaling benchmarks ###
+### Sweep window length, sample rate, CWT resolution and worker count and fit an empirical complexity exponent t ~ n^k
+
+### Sweep defaults
+SCALING_WINDOWS = [5, 10, 20, 60, 120, 300, 600]
+SCALING_RATES = [20, 32, 64, 128, 256, 512]
+SCALING_RESOLUTIONS = [5, 10, 15, 20, 30]
+SCALING_FS = 64
+
+### Expected exponent per algorithm; find_peaks and the count methods compare every peak with its neighbours, cwt is n log n
+expected_exponent = {
+    "default": 2,
+    "find_peaks": 2,
+    "cwt": 1,
+    "cwt_oa": 1,
+    "srmac": 1,
+    "terma": 1,
+    "count_orig": 2,
+    "count_adv": 2,
+}
+
+### Exponent slack before a fit is flagged; covers the log n of the FFT stages and timer noise
+EXPONENT_TOLERANCE = 0.3
+
+### Individual stages timed on their own, with the algorithm stage parameters at their defaults
+def stage_functions(fs):
+    wavelet_length = 2
+    scales = rralglib.cwt_scales(fs, 0.02, 0.73, 5)
+    kernel_len, conv_size = rralglib.cwt_oa_size(fs, wavelet_length)
+    oa_spectra = rralglib.cwt_kernel_spectra(fs, scales, wavelet_length, kernel_len, conv_size)
+
+    def cwt_kernel_build(data):
+        kern_len, size = rralglib.cwt_size(fs, len(data), wavelet_length)
+        return rralglib.cwt_kernel_spectra(fs, scales, wavelet_length, kern_len, size)
+
+    def cwt_convolve(data):
+        kern_len, size = rralglib.cwt_size(fs, len(data), wavelet_length)
+        spectra = [np.ones(size, dtype=complex)] * len(scales)
+        return rralglib.cwt_average(data, spectra, kern_len, size)
+
+    return {
+        "srmac.filter": (lambda data: rralglib.srmac_filter(data, 0.9, 0.3, 0.2), 1),
+        "terma.filter": (lambda data: rralglib.terma_filter(np.array(data), fs, 3*fs, 0.5), 1),
+        "zero_crossing": (lambda data: rralglib.zero_crossing(data, width=int(0.5*fs), margin=0), 1),
+        "find_peaks.select": (lambda data: rralglib.select_peaks(data, 0.6, 0.8, 0.3*fs, fs), 2),
+        "cwt.kernel_build": (cwt_kernel_build, 1),
+        "cwt.convolve": (cwt_convolve, 1),
+        "cwt_oa.convolve": (lambda data: rralglib.cwt_oa_average(data, oa_spectra, fs, kernel_len, conv_size), 1),
+    }
+
+### Best time of repeated calls, repeating until min_time has been spent or max_repeat calls were made
+def time_call(function, min_time=0.05, max_repeat=20):
+    best = None
+    spent = 0
+    repeat = 0
+    while repeat < max_repeat and (repeat == 0 or spent < min_time):
+        t = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - t
+        spent += elapsed
+        repeat += 1
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+### Least squares slope of log(time) over log(n); None with fewer than three usable points
+def fit_exponent(sizes, times):
+    points = [(n, t) for n, t in zip(sizes, times) if n > 0 and t is not None and t > 0]
+    if len(points) < 3:
+        return None
+    x = np.log([n for n, t in points])
+    y = np.log([t for n, t in points])
+    return float(np.polyfit(x, y, 1)[0])
+
+### Deterministic synthetic respiration signal: 15 breaths per minute plus noise
+def synthetic_signal(n, fs, seed=0):
+    t = np.arange(n) / fs
+    return np.sin(2*np.pi*0.25*t) + 0.2*np.random.default_rng(seed).normal(size=n)
+
+### Real signal of n samples at fs, resampled from a recording and repeated if it is too short
+def real_signal(data, data_fs, n, fs):
+    if fs != data_fs:
+        t = np.arange(len(data)) / data_fs
+        data = np.interp(np.arange(0, t[-1], 1/fs), t, data)
+    return np.resize(data, n)
+
+### Time fn over a list of (label, n, data) points; stops once a single call exceeds budget seconds
+def sweep(function, points, budget):
+    results = []
+    for label, n, data in points:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            elapsed = time_call(lambda: function(data))
+        results.append({"x": label, "samples": n, "time_s": elapsed})
+        if elapsed > budget:
+            break
+    return results
+
+### Fit and flag a sweep against its expected exponent
+def fit_sweep(record, expected):
+    exponent = fit_exponent([p["samples"] for p in record["points"]], [p["time_s"] for p in record["points"]])
+    record["exponent"] = exponent
+    record["expected"] = expected
+    record["flagged"] = exponent is not None and expected is not None and exponent > expected + EXPONENT_TOLERANCE
+    return record
+
+### Aggregate windows per second with the recording in shared memory and the windows split across a process pool
+def benchmark_workers(data, fs, algorithm, workers, window_size=WINDOW_SIZE, hop_size=HOP_SIZE, max_windows=None):
+    window_len = int(window_size * fs)
+    hop_len = max(1, int(hop_size * fs))
+    starts = list(range(0, len(data) - window_len + 1, hop_len))
+    if max_windows is not None:
+        starts = starts[:max_windows]
+    windows = [(start, window_len) for start in starts]
+
+    with rralglib_parallel.SharedMemoryExecutor(data, fs, algorithm, workers=workers, batch=max(1, -(-len(windows) // (4 * workers)))) as executor:
+        ### Start every worker before timing
+        executor.run([(0, window_len)] * workers * 2)
+
+        t0 = time.perf_counter()
+        executor.run(windows)
+        elapsed = time.perf_counter() - t0
+
+    return {"workers": workers, "windows": len(windows), "elapsed_s": elapsed, "windows_per_s": len(windows) / elapsed if elapsed > 0 else 0}
+
+### Scaling suite
+def run_scaling(path=None, algorithms=None, windows=None, rates=None, resolutions=None, workers=None, budget=2.0, max_windows=None, verbose=True):
+    if path is None:
+        path = recordings[0]
+    if algorithms is None:
+        algorithms = list(rralglib.algorithm_registry.keys())
+    if windows is None:
+        windows = SCALING_WINDOWS
+    if rates is None:
+        rates = SCALING_RATES
+    if resolutions is None:
+        resolutions = SCALING_RESOLUTIONS
+    if workers is None:
+        workers = [1]
+        while workers[-1] * 2 <= max(2, os.cpu_count() or 1):
+            workers.append(workers[-1] * 2)
+
+    data, data_fs = rralglib_io.read_recording(path)
+    fs = SCALING_FS
+    signals = {
+        "synthetic": lambda n, fs: synthetic_signal(n, fs),
+        "real": lambda n, fs: real_signal(data, data_fs, n, fs),
+    }
+
+    report = {"suite": "scaling", "environment": environment(), "recording": os.path.basename(path),
+              "window": [], "sample_rate": [], "resolution": [], "stages": [], "workers": []}
+
+    for signal_name, make_signal in signals.items():
+        ### Window length at a fixed sample rate
+        points = [(seconds, int(seconds*fs), rralglib.z_norm(make_signal(int(seconds*fs), fs))) for seconds in windows]
+        for algorithm in algorithms:
+            function = lambda x, algorithm=algorithm: rralglib.run_algorithm(x, fs, algorithm=algorithm)
+            record = fit_sweep({"algorithm": algorithm, "signal": signal_name, "fs": fs, "points": sweep(function, points, budget)}, expected_exponent.get(algorithm))
+            report["window"].append(record)
+            print_fit("window", record, verbose)
+
+        ### Individual stages over the same windows
+        for stage, (function, expected) in stage_functions(fs).items():
+            record = fit_sweep({"stage": stage, "signal": signal_name, "fs": fs, "points": sweep(function, points, budget)}, expected)
+            report["stages"].append(record)
+            print_fit("stage", record, verbose)
+
+        ### Sample rate at the default window size
+        for algorithm in algorithms:
+            points = [(rate, WINDOW_SIZE*rate, rralglib.z_norm(make_signal(WINDOW_SIZE*rate, rate))) for rate in rates]
+            records = []
+            for label, n, x in points:
+                function = lambda x, rate=label, algorithm=algorithm: rralglib.run_algorithm(x, rate, algorithm=algorithm)
+                records += sweep(function, [(label, n, x)], budget)
+                if records[-1]["time_s"] > budget:
+                    break
+            record = fit_sweep({"algorithm": algorithm, "signal": signal_name, "window_size": WINDOW_SIZE, "points": records}, expected_exponent.get(algorithm))
+            report["sample_rate"].append(record)
+            print_fit("rate", record, verbose)
+
+        ### CWT resolution (number of scales); cwt_peaks always uses 5 scales, so only the overlap-add version is swept
+        x = rralglib.z_norm(make_signal(WINDOW_SIZE*fs, fs))
+        records = []
+        for res in resolutions:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                elapsed = time_call(lambda: rralglib.cwt_peaks_oa(x, fs, resolution=res))
+            records.append({"x": res, "samples": res, "time_s": elapsed})
+        record = fit_sweep({"algorithm": "cwt_oa", "signal": signal_name, "fs": fs, "points": records}, 1)
+        report["resolution"].append(record)
+        print_fit("resolution", record, verbose)
+
+    ### Worker count on the real recording
+    for algorithm in algorithms:
+        records = [benchmark_workers(data, data_fs, algorithm, n, max_windows=max_windows) for n in workers]
+        base = records[0]["windows_per_s"]
+        for record in records:
+            record["efficiency"] = record["windows_per_s"] / (base * record["workers"]) if base > 0 else 0
+        report["workers"].append({"algorithm": algorithm, "points": records})
+        if verbose:
+            print("{:<10} {:<18} ".format("workers", algorithm) + "  ".join("{}: {:.1f} win/s ({:.0%})".format(r["workers"], r["windows_per_s"], r["efficiency"]) for r in records))
+
+    return report
+
+def print_fit(sweep_name, record, verbose):
+    if not verbose:
+        return
+    name = record.get("algorithm", record.get("stage"))
+    exponent = "n/a" if record["exponent"] is None else "{:.2f}".format(record["exponent"])
+    print("{:<10} {:<18} {:<9} exponent {:>5} (expected {}){}".format(sweep_name, name, record["signal"], exponent, record["expected"], "  FLAGGED" if record["flagged"] else ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="rralglib benchmark suite")
+    parser.add_argument("recordings", nargs="*", help="recordings to replay (default: bundled recordings)")
+    parser.add_argument("--algorithms", help="comma separated algorithm names (default: all registered)")
+    parser.add_argument("--backend", choices=rralglib.backends, help="computational backend")
+    parser.add_argument("--plan", action="store_true", help="run through precompiled parameter plans")
+    parser.add_argument("--window", type=float, default=WINDOW_SIZE, help="window size in seconds")
+    parser.add_argument("--hop", type=float, default=HOP_SIZE, help="hop size in seconds")
+    parser.add_argument("--max-windows", type=int, help="limit the number of windows per recording")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--profile", action="store_true", help="collect per-stage timing histograms during the throughput suite")
+    parser.add_argument("--memory", action="store_true", help="also measure tracemalloc peaks per algorithm and per stage")
+    parser.add_argument("--scaling", action="store_true", help="run the scaling sweeps instead of the throughput suite")
+    parser.add_argument("--workers", help="comma separated worker counts for the scaling suite")
+    parser.add_argument("--budget", type=float, default=2.0, help="stop a scaling sweep once a single call takes longer than this many seconds")
+    args = parser.parse_args(argv)
+
+    algorithms = args.algorithms.split(",") if args.algorithms else None
+
+    if args.scaling:
+        workers = [int(n) for n in args.workers.split(",")] if args.workers else None
+        report = run_scaling(path=args.recordings[0] if args.recordings else None, algorithms=algorithms, workers=workers, budget=args.budget, max_windows=args.max_windows)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+        return report
+
+    if args.profile:
+        profiler = rralglib.enable_profiling()
+
+    report = run_throughput(paths=args.recordings or None, algorithms=algorithms, backend=args.backend, plan=args.plan,
+                            window_size=args.window, hop_size=args.hop, max_windows=args.max_windows, memory=args.memory)
+
+    if args.profile:
+        rralglib.disable_profiling()
+        report["profile"] = profiler.summary()
+        print(profiler.dump())
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        for name, speedup in compare(report, baseline).items():
+            print("{:<60} {:6.2f}x".format(name, speedup))
+        for name, ratio in compare_memory(report, baseline).items():
+            print("{:<60} {:6.2f}x peak memory".format(name, ratio))
+
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import sys, os, subprocess
+import ctypes
+import numpy as np
+import rralglib
+
+### Optional compiled backend built from the bundled C library ###
+### Build once with "python rralglib_c.py"; if the shared library is missing rralglib falls back to the Python implementations
+
+### Fixed point position, must match FIXED_POINT in c/rralglib_config.h
+FIXED_POINT = 16
+
+### Largest buffer the C functions can index (uint16_t lengths); find_peaks uses the top index bit as a flag
+MAX_LEN = 65535
+MAX_LEN_FIND_PEAKS = 32767
+
+c_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "c")
+
+### Platform specific default library path next to this module
+def library_path():
+    if "RRALGLIB_C_LIB" in os.environ:
+        return os.environ["RRALGLIB_C_LIB"]
+    if sys.platform == "win32":
+        name = "rralglib.dll"
+    elif sys.platform == "darwin":
+        name = "librralglib.dylib"
+    else:
+        name = "librralglib.so"
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+### Compile the C sources into a shared library
+def build(output=None, cc=None):
+    if output is None:
+        output = library_path()
+    if cc is None:
+        cc = os.environ.get("CC", "cc")
+
+    cmd = [cc, "-O2", "-shared", "-fPIC", "-I", c_dir, "-o", output, os.path.join(c_dir, "rralglib.c"), "-lm"]
+    subprocess.run(cmd, check=True)
+
+    return output
+
+### ctypes mirrors of the C structs
+class ParamsSrmac(ctypes.Structure):
+    _fields_ = [("coefFast", ctypes.c_int32), ("coefSlow", ctypes.c_int32), ("coefCross", ctypes.c_int32)]
+
+class StateSrmac(ctypes.Structure):
+    _fields_ = [("prevFast", ctypes.c_int64), ("prevSlow", ctypes.c_int64), ("prevCross", ctypes.c_int64)]
+
+class ParamsFindpeaks(ctypes.Structure):
+    _fields_ = [("pkProm", ctypes.c_int32), ("pkHeval", ctypes.c_int32), ("pkWidth", ctypes.c_int32), ("pkProxim", ctypes.c_int32), ("pkOrder", ctypes.c_int32)]
+
+i32p = ctypes.POINTER(ctypes.c_int32)
+u16p = ctypes.POINTER(ctypes.c_uint16)
+
+lib = None
+lib_failed = False
+
+### Load the shared library once; returns None if it has not been built
+def load(path=None):
+    global lib, lib_failed
+    if lib is not None:
+        return lib
+    if lib_failed and path is None:
+        return None
+
+    if path is None:
+        path = library_path()
+
+    if not os.path.exists(path):
+        lib_failed = True
+        return None
+
+    try:
+        handle = ctypes.CDLL(path)
+    except OSError as e:
+        print("could not load " + path + ": " + str(e))
+        lib_failed = True
+        return None
+
+    handle.rral_srmac.argtypes = [i32p, ctypes.c_uint16, ParamsSrmac, ctypes.POINTER(StateSrmac)]
+    handle.rral_srmac.restype = ctypes.c_int32
+    handle.rral_zero_crossing.argtypes = [i32p, ctypes.c_uint16, u16p, ctypes.c_uint16, ctypes.c_int32, ctypes.c_int32]
+    handle.rral_zero_crossing.restype = ctypes.c_int32
+    handle.rral_zero_crossing_raw.argtypes = [i32p, i32p, ctypes.c_uint16, u16p, ctypes.c_uint16, ctypes.c_int32, ctypes.c_int32]
+    handle.rral_zero_crossing_raw.restype = ctypes.c_int32
+    handle.rral_find_peaks.argtypes = [i32p, ctypes.c_uint16, u16p, ctypes.c_uint16, ctypes.POINTER(ParamsFindpeaks)]
+    handle.rral_find_peaks.restype = ctypes.c_int32
+    handle.rral_sosfilt.argtypes = [i32p, ctypes.c_uint16, i32p, ctypes.c_int32, i32p, i32p]
+    handle.rral_sosfilt.restype = ctypes.c_int32
+    handle.rral_get_sqi_full.argtypes = [i32p, ctypes.c_uint16, u16p, ctypes.c_uint16]
+    handle.rral_get_sqi_full.restype = ctypes.c_int32
+    handle.rral_get_sqi_lite.argtypes = [i32p, ctypes.c_uint16, u16p, ctypes.c_uint16, ctypes.c_int32, ctypes.c_int32]
+    handle.rral_get_sqi_lite.restype = ctypes.c_int32
+
+    lib = handle
+    return lib
+
+def available():
+    return load() is not None
+
+### Conversions between floating point and the library fixed point format
+def to_fixed(x):
+    x = np.asarray(x)
+    if x.dtype == np.int32:
+        return np.ascontiguousarray(x)
+    return np.ascontiguousarray(np.round(x * (1 << FIXED_POINT)), dtype=np.int32)
+
+def fixed(x):
+    return int(round(float(x) * (1 << FIXED_POINT)))
+
+def from_fixed(x):
+    return np.asarray(x, dtype=np.float64) / (1 << FIXED_POINT)
+
+### Whether values fit into the fixed point range without overflowing
+def fits_fixed(x):
+    return len(x) == 0 or np.max(np.abs(x)) < (1 << (31 - FIXED_POINT))
+
+def ptr32(x):
+    return x.ctypes.data_as(i32p)
+
+def ptr16(x):
+    return x.ctypes.data_as(u16p)
+
+### Zero-crossing with an optional margin, same semantics as rralglib.zero_crossing
+def zero_crossing(data, width, fs=None, th=0, rawdata=None, margin=None):
+    data = np.atleast_1d(data)
+
+    if margin is None:
+        margin = 0
+
+    if len(data) < 1 or len(data) < margin*2:
+        return 0, []
+
+    if len(data) > MAX_LEN or load() is None:
+        return rralglib.zero_crossing(data, width, fs=fs, th=th, rawdata=rawdata, margin=margin)
+
+    data_q = to_fixed(data)
+    raw_q = None if rawdata is None else to_fixed(np.atleast_1d(rawdata))
+
+    return zero_crossing_fixed(data_q, raw_q, width, fixed(th), margin)
+
+### Zero-crossing on fixed point buffers; slices are views so nothing is copied
+def zero_crossing_fixed(data_q, raw_q, width, th_q, margin):
+    if width < 1:
+        width = 1
+
+    data_q = data_q[margin:len(data_q)-margin]
+    peaks = np.zeros(len(data_q)//2 + 1, dtype=np.uint16)
+
+    if raw_q is None:
+        count = lib.rral_zero_crossing(ptr32(data_q), len(data_q), ptr16(peaks), len(peaks), int(width), th_q)
+    else:
+        raw_q = raw_q[margin:margin+len(data_q)]
+        count = lib.rral_zero_crossing_raw(ptr32(data_q), ptr32(raw_q), len(data_q), ptr16(peaks), len(peaks), int(width), th_q)
+
+    if count < 0:
+        return 0, []
+
+    return count, [int(p) + margin for p in peaks[:count]]
+
+### SRMAC using the fixed point C implementation
+def srmac(data, fs, window_size=None, coef_fast=None, coef_slow=None, coef_cross=None, threshold=None, width=None, margin=None, args=None):
+    """
+    SRMAC algorithm for peak detection using the C backend
+    """
+    data = np.atleast_1d(data)
+
+    if len(data) < 1:
+        return 0, []
+
+    if fs <= 0:
+        return 0, []
+
+    ### Fall back to Python for inputs the C library cannot represent
+    if len(data) > MAX_LEN or not fits_fixed(data) or load() is None:
+        return rralglib.srmac(data, fs, window_size=window_size, coef_fast=coef_fast, coef_slow=coef_slow, coef_cross=coef_cross, threshold=threshold, width=width, margin=margin, args=args)
+
+    params = rralglib.srmac_params(fs, coef_fast=coef_fast, coef_slow=coef_slow, coef_cross=coef_cross, threshold=threshold, width=width, margin=margin, args=args)
+    if params is None:
+        return 0, []
+    coef_fast, coef_slow, coef_cross, th, width, margin = params
+
+    raw_q = to_fixed(data)
+    data_q = np.array(raw_q)
+
+    ### The Python implementation starts the averages at the first sample
+    state = StateSrmac(int(raw_q[0]), int(raw_q[0]), 0)
+    lib.rral_srmac(ptr32(data_q), len(data_q), ParamsSrmac(fixed(coef_fast), fixed(coef_slow), fixed(coef_cross)), ctypes.byref(state))
+
+    if len(data_q) < margin*2:
+        return 0, []
+    peak_count, peaks = zero_crossing_fixed(data_q, raw_q, width, fixed(th), margin)
+
+    return rralglib.find_rr_dist(peaks, fs), peaks
+
+### find_peaks using the fixed point C implementation
+def find_peaks(data, fs, window_size=None, prominence=None, heval_ratio=None, width=None, proximity=None, args=None):
+    """
+    Optimized version of the find_peaks algorithm using the C backend
+    """
+    data = np.atleast_1d(data)
+
+    if len(data) < 1:
+        return 0, []
+
+    if fs <= 0:
+        return 0, []
+
+    if len(data) > MAX_LEN_FIND_PEAKS or not fits_fixed(data) or load() is None:
+        return rralglib.find_peaks(data, fs, window_size=window_size, prominence=prominence, heval_ratio=heval_ratio, width=width, proximity=proximity, args=args)
+
+    prom, heval, width_min, proxim = rralglib.find_peaks_params(fs, prominence=prominence, heval_ratio=heval_ratio, width=width, proximity=proximity, args=args)
+    params = ParamsFindpeaks(fixed(prom), fixed(heval), fixed(width_min), int(np.ceil(proxim)), 0)
+
+    data_q = to_fixed(data)
+    peaks = np.zeros(min(len(data)//2 + 2, MAX_LEN), dtype=np.uint16)
+
+    count = lib.rral_find_peaks(ptr32(data_q), len(data_q), ptr16(peaks), len(peaks), ctypes.byref(params))
+    if count <= 0:
+        return 0, []
+
+    peaks = [int(p) for p in peaks[:count]]
+
+    return rralglib.find_rr_dist(peaks, fs), peaks
+
+### Biquad filter using the fixed point C implementation
+### Coefficients are quantized to FIXED_POINT bits, so very low cutoffs relative to fs lose precision; prefer rralglib.sos_filt for those
+def sos_filt(signal, sos):
+    signal = np.atleast_1d(signal)
+
+    if len(signal) < 3:
+        return signal
+
+    if len(signal) > MAX_LEN or not fits_fixed(signal) or load() is None:
+        return rralglib.sos_filt(signal, sos)
+
+    sos_q = to_fixed(np.array(sos, dtype=np.float64).ravel())
+    sections = len(sos_q) // 6
+
+    ### Start from the first sample as the Python implementation does
+    data_q = to_fixed(signal)
+    x = np.full(3*sections, data_q[0], dtype=np.int32)
+    y = np.zeros(3*sections, dtype=np.int32)
+
+    lib.rral_sosfilt(ptr32(data_q), len(data_q), ptr32(sos_q), sections, ptr32(x), ptr32(y))
+
+    return from_fixed(data_q)
+
+### SQI methods using the fixed point C implementation
+def sqi_full(peaks, raw_signal, max_interval=None):
+    peaks = np.atleast_1d(peaks)
+    raw_signal = np.atleast_1d(raw_signal)
+
+    if len(peaks) < 2 or len(raw_signal) < 1:
+        return 0
+
+    if len(raw_signal) > MAX_LEN or not fits_fixed(raw_signal) or max_interval is not None or load() is None:
+        return rralglib.sqi_full(peaks, raw_signal, max_interval=max_interval)
+
+    data_q = to_fixed(raw_signal)
+    peaks_c = np.ascontiguousarray(peaks, dtype=np.uint16)
+
+    ret = lib.rral_get_sqi_full(ptr32(data_q), len(data_q), ptr16(peaks_c), len(peaks_c))
+    if ret == -1:
+        return 0
+
+    return float(from_fixed(ret))
+
+def sqi_lite(peaks, raw_signal, max_interval=None):
+    peaks = np.atleast_1d(peaks)
+    raw_signal = np.atleast_1d(raw_signal)
+
+    if len(peaks) < 2 or len(raw_signal) < 1:
+        return 0
+
+    if len(raw_signal) > MAX_LEN or not fits_fixed(raw_signal) or max_interval is not None or load() is None:
+        return rralglib.sqi_lite(peaks, raw_signal, max_interval=max_interval)
+
+    data_q = to_fixed(raw_signal)
+    peaks_c = np.ascontiguousarray(peaks, dtype=np.uint16)
+
+    ret = lib.rral_get_sqi_lite(ptr32(data_q), len(data_q), ptr16(peaks_c), len(peaks_c), 0, 0)
+    if ret == -1:
+        return 0
+
+    return float(from_fixed(ret))
+
+### Algorithms run_algorithm can dispatch to this backend; anything else falls back to Python
+### "default" and "find_peaks" are left out: the C detector (local maxima and prominence removal in c/rralglib.c) selects
+### different peaks than select_peaks on real recordings, so it is only reachable under its own name
+algorithms = {
+    "find_peaks_c": find_peaks,
+    "srmac": srmac,
+}
+
+### Registered so the C detector can be selected by name on any backend; it falls back to Python if the library is missing
+rralglib.register_algorithm("find_peaks_c", find_peaks, rralglib.find_peaks_spec)
+
+### Lower level kernels rralglib functions can dispatch to; sos_filt is left out because Q16 coefficients are too coarse for typical respiration filters
+kernels = {}
+
+### Build the shared library
+if __name__ == "__main__":
+    print("built " + build(sys.argv[1] if len(sys.argv) > 1 else None))
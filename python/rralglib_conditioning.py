@@ -0,0 +1,216 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy.signal import butter, bessel, cheby1, ellip, sosfilt
+
+### Signal conditioning cache for the visualizer ###
+### Filtered versions of a recording keyed by (filter type, order, cutoffs, fs), evicted least recently used first once
+### a memory budget is exceeded; a new version filters the visible region right away and the rest in a background thread
+
+### Memory budget of a cache in bytes
+CONDITIONING_BUDGET = 256 * 1024 * 1024
+
+### Samples filtered per background step; the exact pass holds the signal lock for one step at a time
+CONDITIONING_BLOCK = 1 << 16
+
+### Samples per preview block, and the warm-up before a preview in periods of the lowest cutoff
+PREVIEW_BLOCK = 1024
+PREVIEW_PERIODS = 5
+
+### Band-pass as high-pass sections followed by low-pass sections, same designs as the visualizer
+def design_filter(filter_type, order, lpf, hpf, fs):
+    nyquist = fs * 0.5
+    if filter_type == "butter":
+        low = butter(order, lpf / nyquist, analog=False, btype="low", output="sos")
+        high = butter(order, hpf / nyquist, analog=False, btype="high", output="sos")
+    elif filter_type == "ellip":
+        low = ellip(order, 0.1, 20, lpf / nyquist, analog=False, btype="low", output="sos")
+        high = ellip(order, 0.1, 20, hpf / nyquist, analog=False, btype="high", output="sos")
+    elif filter_type == "cheby1":
+        low = cheby1(order, 0.1, lpf / nyquist, analog=False, btype="low", output="sos")
+        high = cheby1(order, 0.1, hpf / nyquist, analog=False, btype="high", output="sos")
+    elif filter_type == "bessel":
+        low = bessel(order, lpf / nyquist, analog=False, btype="low", output="sos")
+        high = bessel(order, hpf / nyquist, analog=False, btype="high", output="sos")
+    else:
+        print(str(filter_type) + " is not a valid filter type.")
+        return None
+    return np.vstack((high, low))
+
+### Filter state equivalent to the start of rralglib.sos_filt: the first sample passes through every section unchanged
+### and becomes both past inputs with zero past outputs; in transposed direct form that is z = ((b1+b2)*x0, b2*x0)
+def initial_state(sos, x0):
+    return np.column_stack(((sos[:, 1] + sos[:, 2]) * x0, sos[:, 2] * x0))
+
+### Filter a block from the start state of rralglib.sos_filt; returns the filtered block and the state after it
+def filter_start(sos, x):
+    y = np.empty(len(x))
+    if len(x) == 0:
+        return y, None
+    y[0] = x[0]
+    y[1:], state = sosfilt(sos, x[1:], zi=initial_state(sos, x[0]))
+    return y, state
+
+class ConditionedSignal:
+    """
+    Mean-removed and filtered recording; data fills in from the start with exact values, while regions requested
+    through ensure() get a warmed-up preview first; exact values always win over preview values
+    """
+    def __init__(self, raw, sos, fs, lowest_cutoff):
+        self.raw = np.asarray(raw, dtype=np.float64)
+        self.sos = sos
+        self.offset = np.mean(self.raw) if len(self.raw) > 0 else 0.0
+        self.warmup = int(PREVIEW_PERIODS * fs / lowest_cutoff)
+
+        self.data = np.zeros(len(self.raw))
+        self.nbytes = self.data.nbytes
+        self.ready = np.zeros(-(-len(self.raw) // PREVIEW_BLOCK), dtype=bool)
+
+        ### Length of the exact prefix and the filter state at its end
+        self.filled = 0
+        self.state = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def done(self):
+        return self.filled >= len(self.data)
+
+    ### Extend the exact prefix by up to block samples; returns False once the whole signal is exact
+    def fill_step(self, block=CONDITIONING_BLOCK):
+        with self.lock:
+            start = self.filled
+            stop = min(start + block, len(self.data))
+            if start >= stop:
+                return False
+
+            x = self.raw[start:stop] - self.offset
+            if self.state is None:
+                y, state = filter_start(self.sos, x)
+            else:
+                y, state = sosfilt(self.sos, x, zi=self.state)
+
+            self.data[start:stop] = y
+            self.state = state
+            self.filled = stop
+            self.ready[start // PREVIEW_BLOCK:-(-stop // PREVIEW_BLOCK)] = True
+
+        return stop < len(self.data)
+
+    ### Filter the whole signal in this thread
+    def fill(self):
+        while self.fill_step():
+            pass
+        return self
+
+    ### Make data[start:stop] usable: exact if filled, otherwise a preview filtered from warmup samples before start
+    def ensure(self, start, stop):
+        start, stop = max(0, int(start)), min(len(self.data), int(stop))
+        if start >= stop:
+            return
+
+        first, last = start // PREVIEW_BLOCK, -(-stop // PREVIEW_BLOCK)
+        if self.ready[first:last].all():
+            return
+
+        start, stop = first * PREVIEW_BLOCK, min(last * PREVIEW_BLOCK, len(self.data))
+        begin = max(0, start - self.warmup)
+        y, _ = filter_start(self.sos, self.raw[begin:stop] - self.offset)
+
+        with self.lock:
+            ### Never overwrite the exact prefix with preview values
+            start = max(start, self.filled)
+            if start < stop:
+                self.data[start:stop] = y[start - begin:]
+            self.ready[first:last] = True
+
+class ConditioningCache:
+    """
+    LRU cache of ConditionedSignal objects bounded by a memory budget; signals are filled by one background thread
+    """
+    def __init__(self, budget=CONDITIONING_BUDGET, background=True):
+        self.budget = budget
+        self.background = background
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.designs = {}
+
+        self.queue = []
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    ### Conditioned version of raw for these filter settings; raw is assumed to be the same recording for the cache's lifetime
+    def get(self, raw, fs, filter_type="butter", order=3, lpf=0.8, hpf=0.05):
+        key = (filter_type, order, lpf, hpf, fs)
+
+        signal = self.entries.get(key)
+        if signal is not None:
+            self.entries.move_to_end(key)
+            return signal
+
+        if key not in self.designs:
+            self.designs[key] = design_filter(filter_type, order, lpf, hpf, fs)
+        sos = self.designs[key]
+        if sos is None:
+            return None
+
+        signal = ConditionedSignal(raw, sos, fs, min(lpf, hpf))
+        self.entries[key] = signal
+        self.nbytes += signal.nbytes
+        self.evict()
+
+        if self.background:
+            self.schedule(signal)
+        else:
+            signal.fill()
+
+        return signal
+
+    ### Drop least recently used signals until the budget is met; the most recent one always stays
+    def evict(self):
+        while self.nbytes > self.budget and len(self.entries) > 1:
+            _, signal = self.entries.popitem(last=False)
+            self.nbytes -= signal.nbytes
+            with self.condition:
+                if signal in self.queue:
+                    self.queue.remove(signal)
+
+    def clear(self):
+        with self.condition:
+            self.queue = []
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.designs = {}
+
+    ### Queue a signal for the background thread; the newest signal is filled first
+    def schedule(self, signal):
+        with self.condition:
+            self.queue.insert(0, signal)
+            self.condition.notify()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while len(self.queue) == 0:
+                    self.condition.wait()
+                signal = self.queue[0]
+
+            if not signal.fill_step():
+                with self.condition:
+                    if signal in self.queue:
+                        self.queue.remove(signal)
+
+    ### Block until the background thread has filled every queued signal
+    def wait(self):
+        while True:
+            with self.condition:
+                if len(self.queue) == 0:
+                    return
+            threading.Event().wait(0.001)
@@ -0,0 +1,736 @@
+import io, os, struct, zlib, itertools
+import numpy as np
+
+### Recording readers for rralglib ###
+### Numeric text is parsed in bulk by NumPy's C parser instead of line by line in Python
+
+### Rows per block in the chunked reader
+CHUNK_ROWS = 65536
+
+### Split the first line of a file and tell whether it is a header (any field that is not a number)
+def read_header(filepath, delimiter=","):
+    with open(filepath, "r", encoding="utf-8-sig") as file:
+        line = file.readline()
+
+    fields = [field.strip() for field in line.rstrip("\r\n").split(delimiter)]
+
+    for field in fields:
+        try:
+            float(field)
+        except ValueError:
+            return fields, True
+
+    return fields, False
+
+### Resolve column keys given as indices or header names into indices; returns None if a name is unknown
+def column_indices(columns, names):
+    indices = []
+    for column in columns:
+        if isinstance(column, str):
+            if column not in names:
+                print(column + " is not a column of this file")
+                return None
+            indices.append(names.index(column))
+        else:
+            indices.append(int(column))
+    return indices
+
+### Read numeric columns of a delimited text file
+def read_csv(filepath, columns=None, delimiter=",", dtype=np.float64):
+    """
+    Read numeric columns by index or header name into NumPy arrays; returns a list with one array per column
+    """
+    if delimiter is None:
+        delimiter = ","
+
+    names, header = read_header(filepath, delimiter)
+
+    if columns is None:
+        columns = list(range(len(names)))
+
+    indices = column_indices(columns, names if header else [])
+    if indices is None:
+        return None
+
+    try:
+        table = np.loadtxt(filepath, delimiter=delimiter, skiprows=1 if header else 0, usecols=indices, dtype=dtype, ndmin=2, encoding="utf-8-sig")
+    except ValueError:
+        ### Missing or malformed values: parse what can be parsed and drop incomplete rows, like the line by line reader did
+        table = np.genfromtxt(filepath, delimiter=delimiter, skip_header=1 if header else 0, usecols=indices, dtype=dtype, invalid_raise=False, encoding="utf-8-sig")
+        table = np.atleast_2d(table).reshape(-1, len(indices))
+        table = table[~np.isnan(table).any(axis=1)]
+
+    return [np.ascontiguousarray(table[:, i]) for i in range(len(indices))]
+
+### Read a file in blocks of chunk_rows rows; yields a list with one array per column for each block
+def read_csv_chunks(filepath, columns=None, delimiter=",", chunk_rows=CHUNK_ROWS, dtype=np.float64):
+    if delimiter is None:
+        delimiter = ","
+
+    names, header = read_header(filepath, delimiter)
+
+    if columns is None:
+        columns = list(range(len(names)))
+
+    indices = column_indices(columns, names if header else [])
+    if indices is None:
+        return
+
+    with open(filepath, "r", encoding="utf-8-sig") as file:
+        if header:
+            file.readline()
+
+        while True:
+            lines = list(itertools.islice(file, chunk_rows))
+            if len(lines) == 0:
+                break
+
+            try:
+                table = np.loadtxt(lines, delimiter=delimiter, usecols=indices, dtype=dtype, ndmin=2)
+            except ValueError:
+                table = np.genfromtxt(lines, delimiter=delimiter, usecols=indices, dtype=dtype, invalid_raise=False)
+                table = np.atleast_2d(table).reshape(-1, len(indices))
+                table = table[~np.isnan(table).any(axis=1)]
+
+            yield [np.ascontiguousarray(table[:, i]) for i in range(len(indices))]
+
+### Read the data and time columns of a recording; same keys and return order as the visualizer readers
+def read_file_csv(filepath, key_data=None, key_time=None, delimiter=None):
+    if key_data is None:
+        key_data = 1
+
+    if key_time is None:
+        key_time = 0
+
+    columns = read_csv(filepath, columns=[key_data, key_time], delimiter=delimiter)
+    if columns is None:
+        return None
+
+    data_raw, time_raw = columns
+
+    return data_raw, time_raw
+
+### Neulog exports ###
+### A single '\r' separated line: ',Experiment name:,...' 'Duration:,5 0' 'Rate:,20 per second' 'Sensors:,...' 'Range:,...' 'Units:,...'
+### 'Time', then one "'H:M:S;value" token per sample, then a blank token and a 'sys info:[...' trailer
+
+NEULOG_MAGIC = b"Experiment name:"
+
+### Check whether a file is a Neulog export from its first bytes
+def is_neulog(filepath):
+    with open(filepath, "rb") as file:
+        head = file.read(256)
+    return NEULOG_MAGIC in head.split(b"\r")[0]
+
+### Parse the metadata fields before the 'Time' token into a dict; the rate is converted to samples per second
+def parse_neulog_header(tokens):
+    header = {}
+    keys = {"Experiment name": "experiment", "Duration": "duration", "Rate": "rate", "Sensors": "sensor", "Range": "range", "Units": "units"}
+
+    for token in tokens:
+        fields = token.strip(",").split(":,", 1)
+        if len(fields) != 2 or fields[0] not in keys:
+            continue
+        header[keys[fields[0]]] = fields[1].strip()
+
+    ### 'Rate:,20 per second' or 'Rate:,2 per minute'
+    if "rate" in header:
+        words = header["rate"].split()
+        try:
+            rate = float(words[0])
+            if len(words) > 2 and words[2].startswith("minute"):
+                rate /= 60
+            elif len(words) > 2 and words[2].startswith("hour"):
+                rate /= 3600
+            header["rate"] = rate
+        except (ValueError, IndexError):
+            header["rate"] = None
+
+    return header
+
+### Read only the metadata header of a Neulog export
+def read_neulog_header(filepath):
+    with open(filepath, "rb") as file:
+        head = file.read(4096)
+
+    head = head.decode("utf-8-sig", errors="replace")
+    end = head.find("\rTime\r")
+    if end == -1:
+        return {}
+
+    return parse_neulog_header(head[:end].split("\r"))
+
+### Vectorized Neulog reader
+def read_neulog(filepath, return_time=False):
+    """
+    Read a Neulog export; returns (data, fs), or (data, fs, time) if return_time is set
+    """
+    with open(filepath, "rb") as file:
+        raw = file.read()
+
+    ### Locate the sample tokens between the 'Time' token and the blank token before the trailer
+    start = raw.find(b"\rTime\r")
+    if start == -1:
+        print("No Neulog data section found in " + str(filepath))
+        return (np.zeros(0), 0, np.zeros(0)) if return_time else (np.zeros(0), 0)
+
+    header = parse_neulog_header(raw[:start].decode("utf-8-sig", errors="replace").split("\r"))
+
+    start += len(b"\rTime\r")
+    end = raw.find(b"\r\r", start)
+    if end == -1:
+        end = len(raw)
+
+    ### "'H:M:S;value" tokens become "H,M,S,value" rows, converted by NumPy's C parser in one pass
+    body = raw[start:end].translate(bytes.maketrans(b":;\r", b",,\n"), b"'")
+    table = np.loadtxt(io.BytesIO(body), delimiter=",", ndmin=2)
+
+    if table.shape[0] == 0:
+        return (np.zeros(0), 0, np.zeros(0)) if return_time else (np.zeros(0), 0)
+
+    ### The first token carries a sign ('-0:0:0.0'), which only applies to the hour field
+    time = np.abs(table[:, 0]) * 3600.0 + table[:, 1] * 60.0 + table[:, 2]
+    data = np.ascontiguousarray(table[:, 3])
+
+    ### Prefer the declared rate; fall back to the time stamps
+    fs = header.get("rate")
+    if not fs and len(time) > 1:
+        fs = 1 / np.median(np.diff(time))
+    if fs:
+        fs = int(round(fs)) if abs(fs - round(fs)) < 1e-6 else fs
+    else:
+        fs = 0
+
+    if return_time:
+        return data, fs, time
+    return data, fs
+
+### Read any supported recording and return (data, fs); the CSV sample rate comes from the time column
+def read_recording(filepath, key_data=None, key_time=None, delimiter=None):
+    if is_neulog(filepath):
+        return read_neulog(filepath)
+
+    loaded = read_file_csv(filepath, key_data=key_data, key_time=key_time, delimiter=delimiter)
+    if loaded is None:
+        return np.zeros(0), 0
+    data, time = loaded
+
+    if len(time) < 2:
+        return data, 0
+
+    fs = 1 / np.median(np.diff(time))
+    fs = int(round(fs)) if abs(fs - round(fs)) < 1e-6 else fs
+
+    return data, fs
+
+### Binary recording cache ###
+### A 64 byte header followed by contiguous little-endian float64 time and data arrays
+### Written once after the first parse of a text recording and memory-mapped on later opens, so windows are zero-copy slices
+### Header: magic, version, sample count, fs, source size and mtime (ns), CRC32 of the column and delimiter selection the
+### arrays were parsed with, CRC32 of the arrays and CRC32 of the header itself
+
+CACHE_MAGIC = b"RRALGBIN"
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".rrbin"
+CACHE_HEADER = struct.Struct("<8sIqdqqIII")
+CACHE_HEADER_SIZE = 64
+
+### Memory-mapped recording
+class Recording:
+    """
+    Recording backed by NumPy arrays or read-only memory maps; slicing reads only the touched pages
+    """
+    def __init__(self, data, time, fs, filepath=None):
+        self.data = data
+        self.time = time
+        self.fs = fs
+        self.filepath = filepath
+
+    def __len__(self):
+        return len(self.data)
+
+    ### Samples [start, stop) as zero-copy views of data and time
+    def window(self, start, stop):
+        return self.data[start:stop], self.time[start:stop]
+
+    ### Samples covering [t_start, t_end) seconds, located by binary search on the time array
+    def window_time(self, t_start, t_end):
+        start = int(np.searchsorted(self.time, t_start, side="left"))
+        stop = int(np.searchsorted(self.time, t_end, side="left"))
+        return self.window(start, stop)
+
+### Default cache location next to the source file
+def cache_path(filepath):
+    return str(filepath) + CACHE_SUFFIX
+
+### Size and modification time of the source file, stored in the cache header
+def source_stamp(filepath):
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+### Key of the columns and delimiter a text recording was parsed with; a cache parsed with another selection is stale
+def selection_key(key_data=None, key_time=None, delimiter=None):
+    return zlib.crc32(repr((key_data, key_time, delimiter)).encode("utf-8"))
+
+### Write data and time to a binary cache file; replaced atomically
+def write_binary(filepath, data, time, fs, source=None, selection=0):
+    data = np.ascontiguousarray(data, dtype="<f8")
+    time = np.ascontiguousarray(time, dtype="<f8")
+    if len(data) != len(time):
+        print("Data and time must have the same length")
+        return False
+
+    size, mtime = source_stamp(source) if source is not None else (0, 0)
+    checksum = zlib.crc32(time.data, zlib.crc32(data.data))
+
+    fields = (CACHE_MAGIC, CACHE_VERSION, len(data), float(fs), size, mtime, selection, checksum)
+    header = CACHE_HEADER.pack(*fields, 0)
+    header = CACHE_HEADER.pack(*fields, zlib.crc32(header))
+
+    temp = str(filepath) + ".tmp"
+    with open(temp, "wb") as file:
+        file.write(header.ljust(CACHE_HEADER_SIZE, b"\0"))
+        file.write(time.data)
+        file.write(data.data)
+    os.replace(temp, filepath)
+
+    return True
+
+### Read and validate a cache header; returns a dict or None if the header is corrupt or from another version
+def read_binary_header(filepath):
+    with open(filepath, "rb") as file:
+        raw = file.read(CACHE_HEADER_SIZE)
+
+    if len(raw) < CACHE_HEADER_SIZE:
+        return None
+
+    magic, version, n, fs, size, mtime, selection, checksum, header_crc = CACHE_HEADER.unpack_from(raw)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    if zlib.crc32(CACHE_HEADER.pack(magic, version, n, fs, size, mtime, selection, checksum, 0)) != header_crc:
+        return None
+    if os.path.getsize(filepath) != CACHE_HEADER_SIZE + 16 * n:
+        return None
+
+    return {"samples": n, "fs": int(fs) if fs == int(fs) else fs, "source_size": size, "source_mtime": mtime, "selection": selection, "checksum": checksum}
+
+### Memory-map a binary cache; returns a Recording or None if the cache is invalid or stale
+def open_binary(filepath, source=None, verify=True, selection=None):
+    """
+    Open a binary cache; verify checks the array CRC32, which reads the whole file once, and verify=False only maps it;
+    with selection the cache must have been parsed with that selection_key
+    """
+    if not os.path.exists(filepath):
+        return None
+
+    header = read_binary_header(filepath)
+    if header is None:
+        return None
+
+    if source is not None and source_stamp(source) != (header["source_size"], header["source_mtime"]):
+        return None
+    if selection is not None and selection != header["selection"]:
+        return None
+
+    n = header["samples"]
+    if n == 0:
+        time, data = np.zeros(0), np.zeros(0)
+    else:
+        time = np.memmap(filepath, dtype="<f8", mode="r", offset=CACHE_HEADER_SIZE, shape=(n,))
+        data = np.memmap(filepath, dtype="<f8", mode="r", offset=CACHE_HEADER_SIZE + 8 * n, shape=(n,))
+
+    if verify and zlib.crc32(time, zlib.crc32(data)) != header["checksum"]:
+        return None
+
+    return Recording(data, time, header["fs"], filepath=filepath)
+
+### Open a text recording through its binary cache
+def open_recording(filepath, key_data=None, key_time=None, delimiter=None, cache=True, cache_file=None, verify=True):
+    """
+    Open a CSV or Neulog recording as a Recording; the first open parses the text and writes the cache,
+    later opens memory-map it until the source file or the column and delimiter selection changes
+    """
+    if cache_file is None:
+        cache_file = cache_path(filepath)
+    selection = selection_key(key_data, key_time, delimiter)
+
+    if cache:
+        recording = open_binary(cache_file, source=filepath, verify=verify, selection=selection)
+        if recording is not None:
+            return recording
+
+    if is_neulog(filepath):
+        data, fs, time = read_neulog(filepath, return_time=True)
+    else:
+        loaded = read_file_csv(filepath, key_data=key_data, key_time=key_time, delimiter=delimiter)
+        if loaded is None:
+            return None
+        data, time = loaded
+        fs = 0
+        if len(time) > 1:
+            fs = 1 / np.median(np.diff(time))
+            fs = int(round(fs)) if abs(fs - round(fs)) < 1e-6 else fs
+
+    if not cache:
+        return Recording(data, time, fs, filepath=filepath)
+
+    ### Fall back to the parsed arrays if the cache can't be written (read-only directory)
+    try:
+        write_binary(cache_file, data, time, fs, source=filepath, selection=selection)
+    except OSError:
+        return Recording(data, time, fs, filepath=filepath)
+
+    ### Just written from the parsed arrays, so the checksum is not read back
+    recording = open_binary(cache_file, source=filepath, verify=False)
+    if recording is None:
+        return Recording(data, time, fs, filepath=filepath)
+    return recording
+
+### Delta block codec ###
+### Integer recordings such as BIOZ_DATA stored as sample to sample deltas in blocks of int16 or int32, with int64 for blocks
+### that need it; a regular time column is stored as (t0, fs) instead of one float per sample
+### Layout: header, block index (payload offsets, first value and delta width of every block), raw time if irregular, payload
+### Deltas run across block boundaries, so a full decode is a single cumulative sum; the first value of each block makes
+### every block decodable on its own for random access
+
+DELTA_MAGIC = b"RRALGDLT"
+DELTA_VERSION = 1
+DELTA_HEADER = struct.Struct("<8sIIqqdd")
+DELTA_BLOCK = 4096
+DELTA_TIME_RAW = 1
+
+### Largest time deviation from the (t0, fs) grid for the time column to count as regular, in seconds
+TIME_TOLERANCE = 1e-6
+
+### Return (t0, fs) if time lies on a regular grid, otherwise None
+def regular_time(time):
+    time = np.asarray(time, dtype=np.float64)
+    if len(time) < 2:
+        return (float(time[0]) if len(time) else 0.0), 0.0
+
+    t0 = float(time[0])
+    step = (float(time[-1]) - t0) / (len(time) - 1)
+    if step <= 0:
+        return None
+
+    fs = 1 / step
+    if abs(fs - round(fs)) < 1e-6:
+        fs = float(round(fs))
+
+    grid = t0 + np.arange(len(time)) / fs
+    if np.max(np.abs(grid - time)) > TIME_TOLERANCE:
+        return None
+
+    return t0, fs
+
+### Smallest of int16 / int32 / int64 that holds every delta of a block
+def delta_width(deltas):
+    if len(deltas) == 0:
+        return 2
+    low, high = deltas.min(), deltas.max()
+    if low >= -2**15 and high < 2**15:
+        return 2
+    if low >= -2**31 and high < 2**31:
+        return 4
+    return 8
+
+DELTA_TYPES = {2: "<i2", 4: "<i4", 8: "<i8"}
+
+### Encode an integer valued recording; returns bytes or None if the data is not integer valued
+def encode_delta(data, time=None, fs=None, block_size=DELTA_BLOCK):
+    """
+    Delta encode data in blocks with a block index; time is stored as (t0, fs) when regular, raw otherwise
+    """
+    data = np.asarray(data)
+    values = np.rint(data).astype(np.int64)
+    if not np.array_equal(values, data):
+        print("Delta encoding needs integer valued data")
+        return None
+
+    n = len(values)
+    flags = 0
+    t0 = 0.0
+    time_raw = b""
+
+    if time is None:
+        fs = float(fs) if fs else 0.0
+    else:
+        grid = regular_time(time)
+        if grid is None:
+            flags |= DELTA_TIME_RAW
+            time_raw = np.ascontiguousarray(time, dtype="<f8").tobytes()
+            fs = float(fs) if fs else 0.0
+        else:
+            t0, fs = grid
+
+    deltas = np.zeros(n, dtype=np.int64)
+    deltas[1:] = np.diff(values)
+
+    starts = np.arange(0, n, block_size)
+    first = values[starts] if n else np.zeros(0, dtype=np.int64)
+    widths = np.zeros(len(starts), dtype=np.uint8)
+    offsets = np.zeros(len(starts) + 1, dtype=np.uint64)
+    blocks = []
+
+    for b, start in enumerate(starts):
+        block = deltas[start:start + block_size]
+        widths[b] = delta_width(block)
+        blocks.append(block.astype(DELTA_TYPES[int(widths[b])]).tobytes())
+        offsets[b + 1] = offsets[b] + len(blocks[-1])
+
+    header = DELTA_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, flags, n, block_size, t0, fs)
+    index = offsets.astype("<u8").tobytes() + first.astype("<i8").tobytes() + widths.tobytes()
+    index += b"\0" * (-len(index) % 8)
+
+    return b"".join([header, index, time_raw] + blocks)
+
+### Random access reader over an encoded buffer, memory-mapped file or bytes
+class DeltaReader:
+    """
+    Parses the header and block index once; read(start, stop) decodes only the blocks that overlap the range
+    """
+    def __init__(self, buffer):
+        self.buffer = np.frombuffer(buffer, dtype=np.uint8)
+
+        magic, version, self.flags, self.n, self.block_size, self.t0, fs = DELTA_HEADER.unpack_from(buffer)
+        if magic != DELTA_MAGIC or version != DELTA_VERSION:
+            raise ValueError("Not a delta encoded recording")
+        self.fs = int(fs) if fs == int(fs) else fs
+
+        blocks = -(-self.n // self.block_size)
+        position = DELTA_HEADER.size
+        self.offsets = self.buffer[position:position + 8 * (blocks + 1)].view("<u8").astype(np.int64)
+        position += 8 * (blocks + 1)
+        self.first = self.buffer[position:position + 8 * blocks].view("<i8")
+        position += 8 * blocks
+        self.widths = self.buffer[position:position + blocks]
+        position += blocks + (-blocks % 8)
+
+        self.time_raw = None
+        if self.flags & DELTA_TIME_RAW:
+            self.time_raw = self.buffer[position:position + 8 * self.n].view("<f8")
+            position += 8 * self.n
+
+        self.payload = position
+
+    def __len__(self):
+        return self.n
+
+    ### Deltas of blocks [b_start, b_stop) as one int64 array; runs of equal width are converted with one view each
+    def deltas(self, b_start, b_stop):
+        out = np.empty(min(b_stop * self.block_size, self.n) - b_start * self.block_size, dtype=np.int64)
+        widths = self.widths[b_start:b_stop]
+        changes = np.flatnonzero(np.diff(widths)) + 1
+        runs = np.concatenate(([0], changes, [len(widths)])) + b_start
+
+        position = 0
+        for r_start, r_stop in zip(runs[:-1], runs[1:]):
+            raw = self.buffer[self.payload + self.offsets[r_start]:self.payload + self.offsets[r_stop]]
+            values = raw.view(DELTA_TYPES[int(self.widths[r_start])])
+            out[position:position + len(values)] = values
+            position += len(values)
+
+        return out
+
+    ### Time stamps of samples [start, stop)
+    def time(self, start=0, stop=None):
+        stop = self.n if stop is None else min(stop, self.n)
+        if self.time_raw is not None:
+            return np.array(self.time_raw[start:stop])
+        if not self.fs:
+            return np.arange(start, stop, dtype=np.float64)
+        return self.t0 + np.arange(start, stop) / self.fs
+
+    ### Decode samples [start, stop)
+    def read(self, start=0, stop=None, dtype=np.float64):
+        stop = self.n if stop is None else min(stop, self.n)
+        start = max(start, 0)
+        if start >= stop:
+            return np.zeros(0, dtype=dtype)
+
+        b_start = start // self.block_size
+        b_stop = -(-stop // self.block_size)
+
+        deltas = self.deltas(b_start, b_stop)
+        deltas[0] = self.first[b_start]
+        values = np.cumsum(deltas)
+
+        offset = b_start * self.block_size
+        return values[start - offset:stop - offset].astype(dtype)
+
+### Decode a whole encoded buffer; returns (data, time, fs)
+def decode_delta(buffer, dtype=np.float64):
+    reader = DeltaReader(buffer)
+    return reader.read(dtype=dtype), reader.time(), reader.fs
+
+### Write a delta encoded recording file; returns False if the data can't be encoded
+def write_delta(filepath, data, time=None, fs=None, block_size=DELTA_BLOCK):
+    encoded = encode_delta(data, time=time, fs=fs, block_size=block_size)
+    if encoded is None:
+        return False
+
+    temp = str(filepath) + ".tmp"
+    with open(temp, "wb") as file:
+        file.write(encoded)
+    os.replace(temp, filepath)
+
+    return True
+
+### Open a delta encoded recording file for random access; the file is memory-mapped, so only decoded blocks are read
+def open_delta(filepath):
+    return DeltaReader(np.memmap(filepath, dtype=np.uint8, mode="r"))
+
+### Read a whole delta encoded recording file as a Recording
+def read_delta(filepath, dtype=np.float64):
+    reader = open_delta(filepath)
+    return Recording(reader.read(dtype=dtype), reader.time(), reader.fs, filepath=filepath)
+
+### Streaming readers ###
+### Generators that yield (start, data, time) chunks of exactly chunk_size samples (the last one may be shorter), where start
+### is the absolute index of the first sample and time holds absolute time stamps; memory use is bounded by the chunk size
+### and the read buffer, not the recording length
+
+STREAM_CHUNK = 4096
+STREAM_BUFFER = 1 << 20
+
+### Regroup (data, time) blocks of any size into fixed-size chunks
+def rechunk(blocks, chunk_size=STREAM_CHUNK):
+    pending_data, pending_time = [], []
+    pending = 0
+    start = 0
+
+    for data, time in blocks:
+        pending_data.append(data)
+        pending_time.append(time)
+        pending += len(data)
+        if pending < chunk_size:
+            continue
+
+        data, time = np.concatenate(pending_data), np.concatenate(pending_time)
+        cut = len(data) - len(data) % chunk_size
+        for i in range(0, cut, chunk_size):
+            yield start, data[i:i + chunk_size], time[i:i + chunk_size]
+            start += chunk_size
+
+        pending_data, pending_time = [data[cut:]], [time[cut:]]
+        pending = len(data) - cut
+
+    if pending > 0:
+        yield start, np.concatenate(pending_data), np.concatenate(pending_time)
+
+### CSV blocks of chunk_size rows
+def csv_blocks(filepath, key_data=None, key_time=None, delimiter=None, chunk_size=STREAM_CHUNK):
+    if key_data is None:
+        key_data = 1
+    if key_time is None:
+        key_time = 0
+
+    for data, time in read_csv_chunks(filepath, columns=[key_data, key_time], delimiter=delimiter, chunk_rows=chunk_size):
+        yield data, time
+
+### Neulog blocks read through a bounded buffer; tokens split across reads are carried over to the next read
+def neulog_blocks(filepath, buffer_size=STREAM_BUFFER):
+    table = bytes.maketrans(b":;\r", b",,\n")
+
+    with open(filepath, "rb") as file:
+        raw = file.read(buffer_size)
+        start = raw.find(b"\rTime\r")
+        while start == -1 and len(raw) < 1 << 16:
+            more = file.read(buffer_size)
+            if len(more) == 0:
+                break
+            raw += more
+            start = raw.find(b"\rTime\r")
+        if start == -1:
+            print("No Neulog data section found in " + str(filepath))
+            return
+
+        raw = raw[start + len(b"\rTime\r"):]
+
+        while True:
+            ### The data section ends at the blank token before the trailer; otherwise parse up to the last complete
+            ### token and keep its trailing '\r' with the remainder, so an end marker split across reads is still found
+            end = raw.find(b"\r\r")
+            if end != -1:
+                body, raw = raw[:end], b""
+            else:
+                cut = max(raw.rfind(b"\r"), 0)
+                body, raw = raw[:cut], raw[cut:]
+
+            body = body.strip(b"\r").translate(table, b"'")
+            if len(body) > 0:
+                values = np.loadtxt(io.BytesIO(body), delimiter=",", ndmin=2)
+                yield np.ascontiguousarray(values[:, 3]), np.abs(values[:, 0]) * 3600.0 + values[:, 1] * 60.0 + values[:, 2]
+
+            if end != -1:
+                return
+
+            more = file.read(buffer_size)
+            if len(more) == 0:
+                raw += b"\r\r"
+            raw += more
+
+### Binary cache blocks; the memory map is sliced and copied one block at a time
+def binary_blocks(filepath, chunk_size=STREAM_CHUNK):
+    recording = open_binary(filepath)
+    if recording is None:
+        print("Invalid binary recording " + str(filepath))
+        return
+
+    for i in range(0, len(recording), chunk_size):
+        data, time = recording.window(i, i + chunk_size)
+        yield np.array(data), np.array(time)
+
+### Delta encoded blocks; only the blocks covering each chunk are decoded
+def delta_blocks(filepath, chunk_size=STREAM_CHUNK):
+    reader = open_delta(filepath)
+
+    for i in range(0, len(reader), chunk_size):
+        yield reader.read(i, i + chunk_size), reader.time(i, i + chunk_size)
+
+### Detect the format of a recording file: "binary", "delta", "neulog" or "csv"
+def recording_format(filepath):
+    with open(filepath, "rb") as file:
+        magic = file.read(len(CACHE_MAGIC))
+
+    if magic == CACHE_MAGIC:
+        return "binary"
+    if magic == DELTA_MAGIC:
+        return "delta"
+    if is_neulog(filepath):
+        return "neulog"
+    return "csv"
+
+### Stream any supported recording in fixed-size chunks
+def stream_recording(filepath, chunk_size=STREAM_CHUNK, key_data=None, key_time=None, delimiter=None, buffer_size=STREAM_BUFFER):
+    """
+    Yield (start, data, time) chunks of chunk_size samples from a CSV, Neulog, binary cache or delta encoded file
+    """
+    format = recording_format(filepath)
+
+    if format == "binary":
+        blocks = binary_blocks(filepath, chunk_size)
+    elif format == "delta":
+        blocks = delta_blocks(filepath, chunk_size)
+    elif format == "neulog":
+        blocks = neulog_blocks(filepath, buffer_size)
+    else:
+        blocks = csv_blocks(filepath, key_data, key_time, delimiter, chunk_size)
+
+    return rechunk(blocks, chunk_size)
+
+### Feed chunks into a streaming object and yield (start, data, time, result) per chunk
+def feed(chunks, engine):
+    """
+    Drive a streaming object with chunks: update() for rralglib.SlidingRREstimator, push_many() for the
+    rralglib_realtime engines, or any callable taking a block of samples
+    """
+    if hasattr(engine, "update"):
+        process = engine.update
+    elif hasattr(engine, "push_many"):
+        process = engine.push_many
+    else:
+        process = engine
+
+    for start, data, time in chunks:
+        yield start, data, time, process(data)
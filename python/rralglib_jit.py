@@ -0,0 +1,180 @@
+import numpy as np
+import rralglib
+
+### Optional JIT-compiled kernels for the sample-recursive loops ###
+### Only active if numba is importable; the implementations in rralglib remain the reference and the fallback
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+### Kernels are compiled eagerly from explicit signatures when this module is imported and cached on disk
+### (next to this module, or in NUMBA_CACHE_DIR), so later worker processes load them instead of recompiling
+if numba is not None:
+
+    ### SRMAC EWMA cascade; same recursion as rralglib.srmac
+    @numba.njit("void(float64[:], float64, float64, float64, float64[:])", cache=True, nogil=True)
+    def srmac_ewma(data, coef_fast, coef_slow, coef_cross, out):
+        prevfast = data[0]
+        prevslow = data[0]
+        prevcross = 0.0
+        for i in range(len(data)):
+            curr = data[i]
+            prevfast = curr * coef_fast + prevfast * (1-coef_fast)
+            prevslow = curr * coef_slow + prevslow * (1-coef_slow)
+            prevcross = (prevfast-prevslow) * coef_cross + prevcross * (1-coef_cross)
+            out[i] = prevcross
+
+    ### Biquad recursion applied in place; same initial state as rralglib.sos_filt
+    @numba.njit("void(float64[:], float64[:, :])", cache=True, nogil=True)
+    def sos_filt_inplace(y, sos):
+        for s in range(sos.shape[0]):
+            b0, b1, b2 = sos[s, 0], sos[s, 1], sos[s, 2]
+            a1, a2 = sos[s, 4], sos[s, 5]
+            x1, x2 = y[0], y[0]
+            y1, y2 = 0.0, 0.0
+            for i in range(1, len(y)):
+                x0 = y[i]
+                y0 = b0*x0 + b1*x1 + b2*x2 - a1*y1 - a2*y2
+                y[i] = y0
+                x2, x1 = x1, x0
+                y2, y1 = y1, y0
+
+    ### TERMA ring buffer updates applied in place; same order of reads and writes as rralglib.terma
+    @numba.njit("void(float64[:], int64, int64, float64)", cache=True, nogil=True)
+    def terma_inplace(data_, w1, w2, b):
+        n = len(data_)
+        half1 = w1 // 2
+        half2 = w2 // 2
+        circbuf_event = np.zeros(w1)
+        circbuf_cycle = np.zeros(w2)
+        ev_sum = 0.0
+        cy_sum = 0.0
+
+        for i in range(w1):
+            if i >= half1:
+                circbuf_event[i] = data_[i-half1]
+                ev_sum += circbuf_event[i]
+
+        for i in range(w2):
+            if i >= half2:
+                circbuf_cycle[i] = data_[i-half2]
+                cy_sum += circbuf_cycle[i]
+
+        z = np.mean(data_)
+        wptr_ev = 0
+        wptr_cy = 0
+
+        for i in range(n):
+            event = ev_sum/w1
+            cycle = cy_sum/w2 + b * z
+            data_[i] = event - cycle
+
+            ev_oldest = circbuf_event[wptr_ev]
+            if i+half1 >= n:
+                circbuf_event[wptr_ev] = 0.0
+            else:
+                circbuf_event[wptr_ev] = data_[i+half1]
+            ev_newest = circbuf_event[wptr_ev]
+            wptr_ev = (wptr_ev + 1) % w1
+
+            cy_oldest = circbuf_cycle[wptr_cy]
+            if i+half2 >= n:
+                circbuf_cycle[wptr_cy] = 0.0
+            else:
+                circbuf_cycle[wptr_cy] = data_[i+half2]
+            cy_newest = circbuf_cycle[wptr_cy]
+            wptr_cy = (wptr_cy + 1) % w2
+
+            ev_sum = ev_sum - ev_oldest + ev_newest
+            cy_sum = cy_sum - cy_oldest + cy_newest
+
+def available():
+    return numba is not None
+
+### Touch every kernel once so the first real call does not pay for loading them from the cache
+def warmup():
+    if numba is None:
+        return False
+    x = np.zeros(8)
+    srmac_ewma(x, 0.5, 0.5, 0.5, np.zeros(8))
+    sos_filt_inplace(np.zeros(8), np.array([[1.0, 0.0, 0.0, 1.0, 0.0, 0.0]]))
+    terma_inplace(np.zeros(8), 2, 4, 0.5)
+    return True
+
+### Biquad filter using the JIT kernel
+def sos_filt(signal, sos):
+    signal = np.atleast_1d(signal)
+
+    if len(signal) < 3:
+        return signal
+
+    y = np.array(signal, dtype=np.float64)
+    sos_filt_inplace(y, np.ascontiguousarray(sos, dtype=np.float64).reshape(-1, 6))
+    return y
+
+### SRMAC using the JIT kernel
+def srmac(data, fs, window_size=None, coef_fast=None, coef_slow=None, coef_cross=None, threshold=None, width=None, margin=None, args=None):
+    """
+    SRMAC algorithm for peak detection using the JIT backend
+    """
+    data = np.atleast_1d(data)
+
+    if len(data) < 1:
+        return 0, []
+
+    if fs <= 0:
+        return 0, []
+
+    params = rralglib.srmac_params(fs, coef_fast=coef_fast, coef_slow=coef_slow, coef_cross=coef_cross, threshold=threshold, width=width, margin=margin, args=args)
+    if params is None:
+        return 0, []
+    coef_fast, coef_slow, coef_cross, th, width, margin = params
+
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    newdata = np.zeros(len(data))
+    srmac_ewma(data, coef_fast, coef_slow, coef_cross, newdata)
+
+    peak_count, peaks = rralglib.zero_crossing(newdata, rawdata=data, width=width, fs=fs, margin=margin, th=th)
+
+    return rralglib.find_rr_dist(peaks, fs), peaks
+
+### TERMA using the JIT kernel
+def terma(data, fs, window_size=None, window_event=None, window_cycle=None, b_coef=None, width=None, margin=None, args=None):
+    """
+    TERMA algorithm for peak detection using the JIT backend
+    """
+    data = np.atleast_1d(data)
+
+    if len(data) < 1:
+        return 0, []
+
+    if fs <= 0:
+        return 0, []
+
+    params = rralglib.terma_params(fs, window_event=window_event, window_cycle=window_cycle, b_coef=b_coef, width=width, margin=margin, args=args)
+    if params is None:
+        return 0, []
+    w1, w2, b, width, margin = params
+
+    if w2 > len(data) or w1 > len(data):
+        return 0, []
+
+    data_ = np.array(data, dtype=np.float64)
+    terma_inplace(data_, w1, w2, float(b))
+
+    peak_count, peaks = rralglib.zero_crossing(data=data_, rawdata=data, width=w1, fs=fs, margin=margin, th=0.0)
+
+    return rralglib.find_rr_dist(peaks, fs), peaks
+
+### Algorithms run_algorithm can dispatch to this backend
+algorithms = {
+    "srmac": srmac,
+    "terma": terma,
+}
+
+### Lower level kernels rralglib functions can dispatch to
+kernels = {
+    "sos_filt": sos_filt,
+}
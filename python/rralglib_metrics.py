@@ -0,0 +1,127 @@
+import os, math, bisect, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+### Metrics for rralglib.run_algorithm ###
+### Per algorithm call, sample, error and failure counters plus a latency histogram, exported in the Prometheus text format
+### Updates are plain increments of preallocated slots without a lock; under the GIL an observation costs about a microsecond
+
+### Latency histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+### Collection can be switched off entirely
+enabled = True
+
+### Counters and latency histogram of one algorithm
+class AlgorithmMetrics:
+    def __init__(self, buckets):
+        self.calls = 0
+        self.samples = 0
+        self.errors = 0
+        self.failures = 0
+        self.latency_sum = 0.0
+        ### One slot per bucket plus the +Inf bucket; counts are not cumulative until exported
+        self.latency_counts = [0] * (len(buckets) + 1)
+
+class MetricsRegistry:
+    """
+    Registry of per-algorithm counters and latency histograms
+    """
+    def __init__(self, buckets=None):
+        self.buckets = list(buckets) if buckets is not None else LATENCY_BUCKETS
+        self.algorithms = {}
+
+    def reset(self):
+        self.algorithms = {}
+
+    def algorithm(self, name):
+        metrics = self.algorithms.get(name)
+        if metrics is None:
+            metrics = self.algorithms.setdefault(name, AlgorithmMetrics(self.buckets))
+        return metrics
+
+    ### Record one call; failed calls are those that returned -1, []
+    def observe(self, algorithm, samples, elapsed, failed=False):
+        metrics = self.algorithm(algorithm)
+        metrics.calls += 1
+        if failed:
+            metrics.failures += 1
+        else:
+            metrics.samples += samples
+        metrics.latency_sum += elapsed
+        metrics.latency_counts[bisect.bisect_left(self.buckets, elapsed)] += 1
+
+    ### Record an exception raised by an algorithm
+    def error(self, algorithm):
+        self.algorithm(algorithm).errors += 1
+
+    ### Prometheus text exposition format
+    def prometheus(self):
+        lines = []
+        algorithms = sorted(self.algorithms.items())
+
+        counters = [
+            ("rralglib_calls_total", "run_algorithm calls", "calls"),
+            ("rralglib_samples_total", "Samples processed by successful calls", "samples"),
+            ("rralglib_errors_total", "Exceptions raised inside algorithms", "errors"),
+            ("rralglib_failures_total", "Calls that returned -1", "failures"),
+        ]
+        for name, help, attribute in counters:
+            lines.append("# HELP " + name + " " + help)
+            lines.append("# TYPE " + name + " counter")
+            for algorithm, metrics in algorithms:
+                lines.append(name + "{" + label(algorithm) + "} " + str(getattr(metrics, attribute)))
+
+        name = "rralglib_latency_seconds"
+        lines.append("# HELP " + name + " run_algorithm latency")
+        lines.append("# TYPE " + name + " histogram")
+        for algorithm, metrics in algorithms:
+            cumulative = 0
+            for bound, count in zip(self.buckets + [math.inf], metrics.latency_counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                lines.append(name + "_bucket{" + label(algorithm) + ",le=\"" + le + "\"} " + str(cumulative))
+            lines.append(name + "_sum{" + label(algorithm) + "} " + repr(metrics.latency_sum))
+            lines.append(name + "_count{" + label(algorithm) + "} " + str(cumulative))
+
+        return "\n".join(lines) + "\n"
+
+    ### Write the Prometheus text to a file, e.g. for the node exporter textfile collector; replaced atomically
+    def write(self, filepath):
+        temp = filepath + ".tmp"
+        with open(temp, "w") as file:
+            file.write(self.prometheus())
+        os.replace(temp, filepath)
+
+def label(algorithm):
+    value = str(algorithm).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "algorithm=\"" + value + "\""
+
+### Global registry updated by rralglib.run_algorithm
+registry = MetricsRegistry()
+
+### Serve the registry on http://host:port/metrics from a daemon thread; returns the server so it can be shut down
+def serve(port=9108, host="127.0.0.1", metrics=None):
+    if metrics is None:
+        metrics = registry
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
@@ -0,0 +1,493 @@
+import os, threading, warnings, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import shared_memory
+import numpy as np
+import rralglib
+
+### Parallel analysis for rralglib ###
+### RecordingAnalysis runs an algorithm on every hop position of a recording once, in a process pool, and keeps the results
+### in an index keyed by data_index, so scrubbing and playback only look results up; results fill in while the pool is running
+### SharedMemoryExecutor keeps the recording and the result arrays in shared memory, so tasks only carry window descriptors
+### ChannelPool runs many streaming channels on threads of one process; the numba kernels and most NumPy calls release the GIL
+
+### Windows per pool task
+ANALYSIS_BATCH = 64
+
+### Start method of analysis pools; they are created from the visualizer, whose threads must not be forked into a worker
+def pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+### Per-process state set by the pool initializer, so the recording is sent to each worker once instead of with every task
+worker_state = {}
+
+def init_worker(data, fs, algorithm, window_len, normalize, params):
+    worker_state["data"] = data
+    worker_state["window_len"] = window_len
+    worker_state["normalize"] = normalize
+    worker_state["plan"] = rralglib.make_plan(algorithm, fs, **params)
+
+### Analyze the windows starting at positions; module level so worker processes can unpickle it
+def analyze_positions(positions):
+    data = worker_state["data"]
+    window_len = worker_state["window_len"]
+    plan = worker_state["plan"]
+    results = []
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for position in positions:
+            window = data[position:position+window_len]
+            if worker_state["normalize"]:
+                window = rralglib.z_norm(window)
+            try:
+                rr, peaks = plan(window) if plan is not None else (-1, [])
+            except Exception:
+                rr, peaks = -1, []
+            results.append((rr, np.asarray(peaks, dtype=np.int64)))
+
+    return positions, results
+
+class RecordingAnalysis:
+    """
+    Background analysis of every hop position of a recording; lookup(data_index) returns the result of the nearest
+    analyzed position at or before data_index, or None while that position is still pending
+    """
+    def __init__(self, data, fs, algorithm="default", window_size=20, hop_size=0.25, workers=None, normalize=True, batch=ANALYSIS_BATCH, **params):
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        self.fs = fs
+        self.algorithm = algorithm
+        self.window_len = int(window_size * fs)
+        self.hop_len = max(1, int(hop_size * fs))
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.normalize = normalize
+        self.batch = batch
+        self.params = params
+
+        self.positions = np.arange(0, max(0, len(self.data) - self.window_len + 1), self.hop_len)
+        self.rr = np.full(len(self.positions), np.nan)
+        self.peaks = [None] * len(self.positions)
+        self.completed = 0
+        self.failed = 0
+
+        self.lock = threading.Lock()
+        self.executor = None
+        self.futures = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    ### Start the analysis; batches nearest to first are scheduled first; workers=0 runs everything in this thread
+    def start(self, first=0):
+        origin = min(max(0, first // self.hop_len), max(0, len(self.positions) - 1))
+        batches = [self.positions[i:i+self.batch] for i in range(0, len(self.positions), self.batch)]
+        batches.sort(key=lambda positions: abs(int(positions[0]) // self.hop_len + len(positions) // 2 - origin))
+
+        initargs = (self.data, self.fs, self.algorithm, self.window_len, self.normalize, self.params)
+
+        if self.workers == 0:
+            init_worker(*initargs)
+            for positions in batches:
+                self.store(*analyze_positions(positions))
+            return self
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=initargs, mp_context=pool_context())
+        for positions in batches:
+            future = self.executor.submit(analyze_positions, positions)
+            self.futures[future] = positions
+            future.add_done_callback(self.collect)
+
+        return self
+
+    ### A batch whose task failed, e.g. because its worker died, is stored as failed windows so done() is still reached
+    def collect(self, future):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            self.store(*future.result())
+            return
+
+        positions = self.futures[future]
+        print("Analysis of " + str(len(positions)) + " windows failed: " + str(error))
+        self.store(positions, [(-1, np.zeros(0, dtype=np.int64))] * len(positions), failed=True)
+
+    def store(self, positions, results, failed=False):
+        with self.lock:
+            for position, (rr, peaks) in zip(positions, results):
+                i = int(position) // self.hop_len
+                self.rr[i] = rr
+                self.peaks[i] = peaks
+            self.completed += len(positions)
+            if failed:
+                self.failed += len(positions)
+
+    ### Result of the analyzed position at or before data_index as (position, rr, peaks), or None if still pending
+    def lookup(self, data_index):
+        if len(self.positions) == 0:
+            return None
+
+        i = min(max(0, int(data_index) // self.hop_len), len(self.positions) - 1)
+        peaks = self.peaks[i]
+        if peaks is None:
+            return None
+
+        return int(self.positions[i]), self.rr[i], peaks
+
+    ### Fraction of positions analyzed
+    def progress(self):
+        if len(self.positions) == 0:
+            return 1.0
+        return self.completed / len(self.positions)
+
+    def done(self):
+        return self.completed >= len(self.positions)
+
+    ### Block until every submitted batch has finished
+    def wait(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+        return self
+
+    ### Stop scheduling new batches; batches already running finish in the background
+    def cancel(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+### Shared memory executor ###
+
+### Peaks stored per window in the shared result array; windows with more peaks are truncated
+MAX_WINDOW_PEAKS = 256
+
+### Windows per task for the shared memory executor
+SHARED_BATCH = 256
+
+### Create a shared memory block holding an array of shape and dtype; returns (block, array view)
+def create_shared(shape, dtype):
+    dtype = np.dtype(dtype)
+    size = max(1, int(np.prod(shape)) * dtype.itemsize)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+### Attach to a shared memory block created by the executor; only the creating process unlinks it. Pool workers share the
+### parent's resource tracker, which keeps one entry per name, so older Pythons without track=False need no extra handling
+def attach_shared(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+### Per-process attachments of the shared executor, keyed by block name
+shared_state = {}
+
+def init_shared_worker(data_name, data_len, fs, algorithm, normalize, params):
+    block = attach_shared(data_name)
+    shared_state["blocks"] = {data_name: block}
+    shared_state["data"] = np.ndarray((data_len,), dtype=np.float64, buffer=block.buf)
+    shared_state["normalize"] = normalize
+    shared_state["plan"] = rralglib.make_plan(algorithm, fs, **params)
+
+### Shared arrays of a result block with room for windows results; an executor reuses its block between runs and only
+### replaces it with a larger one, so a worker keeps one result block attached and closes the one it replaces
+def shared_results(name, windows, max_peaks):
+    blocks = shared_state["blocks"]
+    if name not in blocks:
+        for old in list(blocks.keys())[1:]:
+            blocks.pop(old).close()
+        blocks[name] = attach_shared(name)
+    buf = blocks[name].buf
+    rr = np.ndarray((windows,), dtype=np.float64, buffer=buf)
+    counts = np.ndarray((windows,), dtype=np.int32, buffer=buf, offset=8 * windows)
+    peaks = np.ndarray((windows, max_peaks), dtype=np.int32, buffer=buf, offset=12 * windows)
+    return rr, counts, peaks
+
+### Analyze the windows described by rows of (offset, length, slot) and write the results into the shared result block
+def analyze_shared(result_name, windows, max_peaks, descriptors):
+    data = shared_state["data"]
+    plan = shared_state["plan"]
+    rr, counts, peaks = shared_results(result_name, windows, max_peaks)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for offset, length, slot in descriptors:
+            ### A view into shared memory; nothing is copied unless the window is normalized
+            window = data[offset:offset+length]
+            if shared_state["normalize"]:
+                window = rralglib.z_norm(window)
+            try:
+                window_rr, window_peaks = plan(window) if plan is not None else (-1, [])
+            except Exception:
+                window_rr, window_peaks = -1, []
+
+            window_peaks = np.asarray(window_peaks, dtype=np.int32)[:max_peaks]
+            rr[slot] = window_rr
+            counts[slot] = len(window_peaks)
+            peaks[slot, :len(window_peaks)] = window_peaks
+
+    return len(descriptors)
+
+### Names of the shared memory blocks this process is attached to
+def shared_blocks():
+    return list(shared_state.get("blocks", {}).keys())
+
+class SharedMemoryExecutor:
+    """
+    Process pool over a recording placed in shared memory once; tasks carry only (offset, length, slot) descriptors
+    and workers write RR and peaks into a shared result block that is reused between runs
+    """
+    def __init__(self, data, fs, algorithm="default", workers=None, normalize=True, max_peaks=MAX_WINDOW_PEAKS, batch=SHARED_BATCH, **params):
+        self.fs = fs
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.max_peaks = max_peaks
+        self.batch = batch
+
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        self.data_block, self.data = create_shared(data.shape, np.float64)
+        self.data[:] = data
+
+        ### Result block and the number of windows it has room for
+        self.result_block = None
+        self.result_windows = 0
+
+        initargs = (self.data_block.name, len(data), fs, algorithm, normalize, params)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_shared_worker, initargs=initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    ### Analyze windows given as (offset, length) pairs; returns (rr, peaks) with one entry per window
+    def run(self, windows):
+        windows = np.asarray(windows, dtype=np.int64).reshape(-1, 2)
+        count = len(windows)
+        block, size = self.results(count)
+
+        descriptors = np.column_stack((windows, np.arange(count, dtype=np.int64)))
+        futures = [self.pool.submit(analyze_shared, block.name, size, self.max_peaks, descriptors[i:i+self.batch]) for i in range(0, count, self.batch)]
+        for future in futures:
+            future.result()
+
+        rr = np.ndarray((count,), dtype=np.float64, buffer=block.buf).copy()
+        counts = np.ndarray((count,), dtype=np.int32, buffer=block.buf, offset=8 * size)
+        table = np.ndarray((size, self.max_peaks), dtype=np.int32, buffer=block.buf, offset=12 * size)
+        peaks = [table[i, :counts[i]].copy() for i in range(count)]
+        del counts, table
+
+        return rr, peaks
+
+    ### Result block with room for at least count windows; returns (block, windows it has room for)
+    def results(self, count):
+        if self.result_block is None or count > self.result_windows:
+            self.release_results()
+            self.result_windows = max(count, 2 * self.result_windows, 1)
+            self.result_block, _ = create_shared((20 + 4 * self.max_peaks) * self.result_windows, np.uint8)
+        return self.result_block, self.result_windows
+
+    def release_results(self):
+        if self.result_block is not None:
+            self.result_block.close()
+            self.result_block.unlink()
+            self.result_block = None
+            self.result_windows = 0
+
+    ### Analyze every window of window_size seconds with a hop of hop_size seconds; returns (starts, rr, peaks)
+    def map_windows(self, window_size=20, hop_size=1):
+        window_len = int(window_size * self.fs)
+        hop_len = max(1, int(hop_size * self.fs))
+        starts = np.arange(0, max(0, len(self.data) - window_len + 1), hop_len)
+
+        rr, peaks = self.run(np.column_stack((starts, np.full(len(starts), window_len))))
+        return starts, rr, peaks
+
+    ### Shut the pool down and release the shared recording
+    def close(self):
+        if self.pool is None:
+            return
+        self.pool.shutdown(wait=True)
+        self.pool = None
+        self.release_results()
+        self.data = None
+        self.data_block.close()
+        self.data_block.unlink()
+
+### Thread pool for streaming channels ###
+
+### Blocks a worker processes from one channel before it goes back to its queue
+CHANNEL_BATCH = 8
+
+class Channel:
+    """
+    One stream of a ChannelPool: its engine, the blocks waiting for it and whether it sits in a worker queue
+    """
+    def __init__(self, key, engine, callback=None, home=0):
+        self.key = key
+        self.engine = engine
+        self.callback = callback
+        self.home = home
+
+        ### Same dispatch as rralglib_io.feed
+        if hasattr(engine, "update"):
+            self.process = engine.update
+        elif hasattr(engine, "push_many"):
+            self.process = engine.push_many
+        else:
+            self.process = engine
+
+        self.blocks = deque()
+        self.scheduled = False
+        self.lock = threading.Lock()
+
+class ChannelPool:
+    """
+    Thread pool for many concurrent channels; blocks of one channel run in order on one thread at a time, each worker
+    takes channels from its own queue first and steals from the others when it runs dry, and every thread keeps one
+    scratch arena for all the plans it runs; submit() returns a Future and the channel callback gets (key, result)
+    """
+    def __init__(self, workers=None, batch=CHANNEL_BATCH):
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.batch = batch
+        self.channels = {}
+        self.next_home = 0
+
+        self.queues = [deque() for _ in range(max(1, self.workers))]
+        self.ready = 0
+        self.closing = False
+        self.condition = threading.Condition()
+
+        self.threads = []
+        for worker in range(self.workers):
+            thread = threading.Thread(target=self.run, args=(worker,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.channels)
+
+    ### Add a channel driven by engine: an object with update() or push_many(), or a callable taking a block of samples
+    def add_channel(self, key, engine, callback=None):
+        if key in self.channels:
+            print("Channel " + str(key) + " already exists")
+            return None
+
+        ### Channels are spread over the worker queues round robin; stealing evens out the load from there
+        channel = Channel(key, engine, callback, self.next_home % len(self.queues))
+        self.next_home += 1
+        self.channels[key] = channel
+        return channel
+
+    ### Remove a channel; blocks already submitted still run
+    def remove_channel(self, key):
+        return self.channels.pop(key, None)
+
+    ### Queue a block of samples for a channel; returns a Future for the engine's result, or None for an unknown channel
+    def submit(self, key, samples):
+        channel = self.channels.get(key)
+        if channel is None:
+            print("Channel " + str(key) + " does not exist")
+            return None
+
+        future = Future()
+
+        if self.workers == 0:
+            self.execute(channel, samples, future)
+            return future
+
+        with channel.lock:
+            channel.blocks.append((samples, future))
+            if channel.scheduled:
+                return future
+            channel.scheduled = True
+
+        self.schedule(channel, channel.home)
+        return future
+
+    def schedule(self, channel, worker):
+        self.queues[worker].append(channel)
+        with self.condition:
+            self.ready += 1
+            self.condition.notify()
+
+    ### Next channel for a worker: the oldest one in its own queue, otherwise the newest one of another queue
+    def take(self, worker):
+        queues = self.queues
+        try:
+            channel = queues[worker].popleft()
+        except IndexError:
+            channel = None
+            for i in range(1, len(queues)):
+                try:
+                    channel = queues[(worker + i) % len(queues)].pop()
+                    break
+                except IndexError:
+                    pass
+
+        if channel is not None:
+            with self.condition:
+                self.ready -= 1
+        return channel
+
+    def run(self, worker):
+        rralglib.thread_scratch.buffers = {}
+
+        while True:
+            channel = self.take(worker)
+            if channel is None:
+                with self.condition:
+                    while self.ready <= 0 and not self.closing:
+                        self.condition.wait()
+                    if self.ready <= 0 and self.closing:
+                        return
+                continue
+
+            for _ in range(self.batch):
+                with channel.lock:
+                    if len(channel.blocks) == 0:
+                        channel.scheduled = False
+                        break
+                    samples, future = channel.blocks.popleft()
+                self.execute(channel, samples, future)
+            else:
+                ### Blocks are left: requeue the channel behind the others so a busy channel does not starve them
+                with channel.lock:
+                    if len(channel.blocks) == 0:
+                        channel.scheduled = False
+                        continue
+                self.schedule(channel, worker)
+
+    def execute(self, channel, samples, future):
+        if not future.set_running_or_notify_cancel():
+            return
+
+        ### warnings.catch_warnings is process wide, np.errstate is per thread
+        try:
+            with np.errstate(all="ignore"):
+                result = channel.process(samples)
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        future.set_result(result)
+        if channel.callback is not None:
+            try:
+                channel.callback(channel.key, result)
+            except Exception as e:
+                print("Callback of channel " + str(channel.key) + " failed: " + str(e))
+
+    ### Block until every submitted block has run and stop the workers
+    def close(self):
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
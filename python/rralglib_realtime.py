@@ -0,0 +1,576 @@
+import sys, os, time
+import numpy as np
+import rralglib
+
+### Per-sample realtime processing pipeline; Python port of the realtime section of the C rralglib library ###
+
+### Realtime configuration (same meaning and defaults as c/rralglib_config.h)
+SAMPLE_RATE = 64
+DATA_WINDOW = 20
+RRAL_DELTA_SAMPLES = SAMPLE_RATE
+
+### Maximum peak count
+MAX_PEAK_COUNT = 256
+
+### Biquad section count (filter order - 1)
+SOS_SECT = 2
+
+### Return values
+RRAL_OK = 0
+RRAL_ERR = -1
+RRAL_RDY = 1
+
+### Main buffer size is kept even, same as MAIN_BUF_SIZE in rralglib.h
+def main_buf_size(sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW):
+    size = sample_rate * data_window
+    if size % 2 != 0:
+        size += 1
+    return size
+
+### Realtime running mean maximum window size in samples
+def running_mean_n(sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW):
+    return data_window * sample_rate * 3
+
+### Peak detection block parameters (Params_peaks_t)
+class ParamsPeaks:
+    def __init__(self, coef_fast=0.0508, coef_slow=0.0103, coef_cross=0.91, width=0.5, lpfsos=None, hpfsos=None, sample_rate=SAMPLE_RATE):
+        self.coef_fast = coef_fast
+        self.coef_slow = coef_slow
+        self.coef_cross = coef_cross
+
+        ### Zero-crossing width in samples
+        self.srmac_width = int(width * sample_rate)
+
+        ### Filter coefficients in the scipy sos layout; None disables the filter
+        self.lpfsos = None if lpfsos is None else np.array(lpfsos, dtype=np.float64)
+        self.hpfsos = None if hpfsos is None else np.array(hpfsos, dtype=np.float64)
+
+### Peak detection block state (State_peaks_t); all buffers are preallocated
+class StatePeaks:
+    def __init__(self, sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW, delta_samples=RRAL_DELTA_SAMPLES, sections=SOS_SECT):
+        self.sample_rate = sample_rate
+        self.delta_samples = delta_samples
+        self.data = np.zeros(main_buf_size(sample_rate, data_window))
+        self.peaks = np.zeros(MAX_PEAK_COUNT, dtype=np.int64)
+        self.hpfx = np.zeros(3*sections)
+        self.hpfy = np.zeros(3*sections)
+        self.lpfx = np.zeros(3*sections)
+        self.lpfy = np.zeros(3*sections)
+        self.reset()
+
+    ### Zero-init the state (rral_state_peaks_init)
+    def reset(self):
+        self.data[:] = 0
+        self.peaks[:] = 0
+        self.peaks_n = 0
+        self.prev_fast = 0.0
+        self.prev_slow = 0.0
+        self.prev_cross = 0.0
+        self.hpfx[:] = 0
+        self.hpfy[:] = 0
+        self.lpfx[:] = 0
+        self.lpfy[:] = 0
+        self.delta_sample_count = 0
+
+### Joint running state (State_joint_t)
+class StateJoint:
+    def __init__(self, sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW, delta_samples=RRAL_DELTA_SAMPLES):
+        self.sample_rate = sample_rate
+        self.delta_samples = delta_samples
+        self.running_mean_n = running_mean_n(sample_rate, data_window)
+        self.reset()
+
+    ### Zero-init the state (rral_state_joint_init)
+    def reset(self):
+        self.delta_sample_count = 0
+        self.total_sample_count = 0
+        self.running_mean_sum = 0.0
+        self.running_mean = 0.0
+
+### Joint HR and RR results (Results_joint_t)
+class ResultsJoint:
+    def __init__(self, hr=0, rr=0, sqihr=0, sqirr=0, time=0):
+        self.hr = hr
+        self.rr = rr
+        self.sqihr = sqihr
+        self.sqirr = sqirr
+        self.time = time
+
+    def __repr__(self):
+        return "ResultsJoint(hr="+str(self.hr)+", rr="+str(self.rr)+", sqihr="+str(self.sqihr)+", sqirr="+str(self.sqirr)+", time="+str(self.time)+")"
+
+### Single parameter results (Results_single_t)
+class ResultsSingle:
+    def __init__(self, rate=0, sqi=0, time=0):
+        self.rate = rate
+        self.sqi = sqi
+        self.time = time
+
+    def __repr__(self):
+        return "ResultsSingle(rate="+str(self.rate)+", sqi="+str(self.sqi)+", time="+str(self.time)+")"
+
+### Biquad filter with persistent x/y state buffers, applied in place (rral_sosfilt)
+def sosfilt_state(data, sos, x, y):
+    if len(data) <= 0:
+        return RRAL_ERR
+    if sos is None or len(sos) <= 0:
+        return RRAL_ERR
+
+    for sec, (b0, b1, b2, a0, a1, a2) in enumerate(sos):
+        offset = sec * 3
+        x1, x2 = x[offset+1], x[offset+2]
+        y1, y2 = y[offset+1], y[offset+2]
+        for i in range(len(data)):
+            x0 = data[i]
+            y0 = b0*x0 + b1*x1 + b2*x2 - a1*y1 - a2*y2
+            data[i] = y0
+            x2, x1 = x1, x0
+            y2, y1 = y1, y0
+        x[offset], x[offset+1], x[offset+2] = x1, x1, x2
+        y[offset+1], y[offset+2] = y1, y2
+
+    return RRAL_OK
+
+### SRMAC filtering with state carried over between calls, applied in place (rral_srmac)
+def srmac_state(data, params, state):
+    if len(data) <= 0:
+        return RRAL_ERR
+
+    coef_fast, coef_slow, coef_cross = params.coef_fast, params.coef_slow, params.coef_cross
+    fast, slow, cross = state.prev_fast, state.prev_slow, state.prev_cross
+
+    for i in range(len(data)):
+        curr = data[i]
+        fast = curr * coef_fast + fast * (1-coef_fast)
+        slow = curr * coef_slow + slow * (1-coef_slow)
+        cross = (fast-slow) * coef_cross + cross * (1-coef_cross)
+        data[i] = cross
+
+    state.prev_fast, state.prev_slow, state.prev_cross = fast, slow, cross
+
+    return RRAL_OK
+
+### Realtime peak detection block - only filters the last delta samples of the buffer and detects peaks over the whole buffer
+def realtime_peaks(params, state):
+    if params is None or state is None:
+        return RRAL_ERR
+
+    ### Clear peak buffer
+    state.peaks[:] = 0
+
+    delta = state.data[len(state.data)-state.delta_samples:]
+
+    ### Bandpass filter
+    if params.hpfsos is not None:
+        sosfilt_state(delta, params.hpfsos, state.hpfx, state.hpfy)
+    if params.lpfsos is not None:
+        sosfilt_state(delta, params.lpfsos, state.lpfx, state.lpfy)
+
+    ### Find peaks using SRMAC
+    srmac_state(delta, params, state)
+
+    ### Zero-crossing detection over the whole buffer
+    peak_count, peaks = rralglib.zero_crossing(state.data, width=params.srmac_width, th=0, margin=0)
+    peak_count = min(peak_count, MAX_PEAK_COUNT)
+    state.peaks[:peak_count] = peaks[:peak_count]
+    state.peaks_n = peak_count
+
+    return RRAL_OK
+
+### Shift the algorithm data buffer back by delta samples
+def realtime_peaks_shift(state):
+    if state is None:
+        return RRAL_ERR
+
+    state.data[:-state.delta_samples] = state.data[state.delta_samples:]
+
+    return RRAL_OK
+
+### Subtract the running mean from a new sample and update the joint counters
+def running_mean_sample(sample, state_j):
+    if state_j.total_sample_count < state_j.running_mean_n:
+        state_j.running_mean_sum += sample
+        state_j.running_mean = state_j.running_mean_sum / (state_j.total_sample_count + 1)
+    else:
+        state_j.running_mean_sum -= state_j.running_mean
+        state_j.running_mean_sum += sample
+        state_j.running_mean = state_j.running_mean_sum / state_j.running_mean_n
+
+    return sample - state_j.running_mean
+
+### Rate and SQI over the current buffer window; the left-most peak is skipped when possible due to edge effects
+def window_rate(state):
+    count = state.peaks_n
+    peaks = state.peaks
+
+    if count > 2:
+        rate = (60 * state.sample_rate) / ((peaks[count-1] - peaks[1]) / (count - 2))
+    elif count > 1:
+        rate = (60 * state.sample_rate) / ((peaks[count-1] - peaks[0]) / (count - 1))
+    else:
+        return 0, 0
+
+    return rate, rralglib.sqi_full(peaks[:count], state.data)
+
+### Single parameter estimation (rral_single_param)
+def single_param(sample, params, state, state_j, out):
+    if params is None or state is None or state_j is None or out is None:
+        return RRAL_ERR
+
+    f_sample = running_mean_sample(sample, state_j)
+
+    ### Add the sample to the data buffer
+    state.data[(len(state.data) - state.delta_samples) + state_j.delta_sample_count] = f_sample
+    state_j.delta_sample_count += 1
+    state_j.total_sample_count += 1
+
+    if state_j.delta_sample_count == state_j.delta_samples:
+        state_j.delta_sample_count = 0
+
+        out.time = (state_j.total_sample_count - state_j.delta_samples) // state_j.sample_rate
+
+        if realtime_peaks(params, state) != RRAL_OK:
+            state.peaks_n = 0
+        out.rate, out.sqi = window_rate(state)
+
+        ### Perform post-estimate shift
+        realtime_peaks_shift(state)
+
+        return RRAL_RDY
+
+    return RRAL_OK
+
+### Joint HR and RR estimation (rral_joint_hr_rr)
+def joint_hr_rr(sample, params_hr, params_rr, state_hr, state_rr, state_j, out):
+    if params_hr is None or params_rr is None or state_hr is None or state_rr is None or state_j is None or out is None:
+        return RRAL_ERR
+
+    f_sample = running_mean_sample(sample, state_j)
+
+    ### Add the sample to the data buffers
+    state_hr.data[(len(state_hr.data) - state_hr.delta_samples) + state_j.delta_sample_count] = f_sample
+    state_rr.data[(len(state_rr.data) - state_rr.delta_samples) + state_j.delta_sample_count] = f_sample
+    state_j.delta_sample_count += 1
+    state_j.total_sample_count += 1
+
+    if state_j.delta_sample_count == state_j.delta_samples:
+        state_j.delta_sample_count = 0
+
+        out.time = (state_j.total_sample_count - state_j.delta_samples) // state_j.sample_rate
+
+        ### HR routine
+        if realtime_peaks(params_hr, state_hr) != RRAL_OK:
+            state_hr.peaks_n = 0
+        out.hr, out.sqihr = window_rate(state_hr)
+        realtime_peaks_shift(state_hr)
+
+        ### RR routine
+        if realtime_peaks(params_rr, state_rr) != RRAL_OK:
+            state_rr.peaks_n = 0
+        out.rr, out.sqirr = window_rate(state_rr)
+        realtime_peaks_shift(state_rr)
+
+        return RRAL_RDY
+
+    return RRAL_OK
+
+### Streaming engine wrapping joint_hr_rr with preallocated state
+class RealtimeJoint:
+    """
+    Per-sample joint HR and RR engine producing a ResultsJoint every delta samples
+    """
+    def __init__(self, params_hr, params_rr, sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW, delta_samples=RRAL_DELTA_SAMPLES):
+        self.params_hr = params_hr
+        self.params_rr = params_rr
+        self.state_hr = StatePeaks(sample_rate, data_window, delta_samples)
+        self.state_rr = StatePeaks(sample_rate, data_window, delta_samples)
+        self.state_j = StateJoint(sample_rate, data_window, delta_samples)
+
+    def reset(self):
+        self.state_hr.reset()
+        self.state_rr.reset()
+        self.state_j.reset()
+
+    ### Push one sample; returns a ResultsJoint when a new estimate is ready, otherwise None
+    def push(self, sample):
+        out = ResultsJoint()
+        if joint_hr_rr(sample, self.params_hr, self.params_rr, self.state_hr, self.state_rr, self.state_j, out) == RRAL_RDY:
+            return out
+        return None
+
+    ### Push a block of samples and return all estimates produced by it
+    def push_many(self, samples):
+        results = []
+        for sample in samples:
+            out = self.push(sample)
+            if out is not None:
+                results.append(out)
+        return results
+
+### Streaming engine wrapping single_param with preallocated state
+class RealtimeSingle:
+    """
+    Per-sample single parameter engine producing a ResultsSingle every delta samples
+    """
+    def __init__(self, params, sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW, delta_samples=RRAL_DELTA_SAMPLES):
+        self.params = params
+        self.state = StatePeaks(sample_rate, data_window, delta_samples)
+        self.state_j = StateJoint(sample_rate, data_window, delta_samples)
+
+    def reset(self):
+        self.state.reset()
+        self.state_j.reset()
+
+    ### Push one sample; returns a ResultsSingle when a new estimate is ready, otherwise None
+    def push(self, sample):
+        out = ResultsSingle()
+        if single_param(sample, self.params, self.state, self.state_j, out) == RRAL_RDY:
+            return out
+        return None
+
+    ### Push a block of samples and return all estimates produced by it
+    def push_many(self, samples):
+        results = []
+        for sample in samples:
+            out = self.push(sample)
+            if out is not None:
+                results.append(out)
+        return results
+
+### Multi-stream state bank ###
+
+### Initial stream capacity of a bank; capacity doubles whenever it runs out
+BANK_CAPACITY = 64
+
+class StreamBank:
+    """
+    Struct-of-arrays state of many SRMAC or TERMA streams; tick() advances every stream by one sample with vectorized
+    updates, where samples[k] belongs to stream ids[k], and returns the breaths found as (stream ids, sample indices)
+    """
+    def __init__(self, fs, algorithm="srmac", capacity=BANK_CAPACITY, args=None, **params):
+        self.fs = fs
+        self.algorithm = algorithm
+        self.valid = True
+
+        if algorithm == "srmac":
+            resolved = rralglib.srmac_params(fs, args=args, **params)
+            if resolved is not None:
+                self.coef_fast, self.coef_slow, self.coef_cross, self.th, self.width, _ = resolved
+            fields = ["prev_fast", "prev_slow", "prev_cross"]
+        elif algorithm == "terma":
+            resolved = rralglib.terma_params(fs, args=args, **params)
+            if resolved is not None:
+                self.w1, self.w2, self.b, _, _ = resolved
+                ### Same zero crossing as rralglib.terma: width of the event window, threshold 0
+                self.width, self.th = self.w1, 0.0
+
+                ### The centered moving averages are causal with a lag of lag samples; the ring holds every sample they need
+                half1, half2 = self.w1 - self.w1 // 2, self.w2 - self.w2 // 2
+                self.lag = max(half1, half2) - 1
+                self.ends = (half1 - 1 - self.lag, half2 - 1 - self.lag)
+                self.ring_len = self.lag + max(self.w1, self.w2) + 1
+            fields = ["ev_sum", "cy_sum", "z_sum"]
+        else:
+            print(str(algorithm) + " algorithm is not supported by StreamBank.")
+            resolved = None
+            fields = []
+
+        if resolved is None:
+            self.valid = False
+            self.width, self.th = 1, 0.0
+        self.width = max(1, self.width)
+
+        ### Per-stream arrays; slots [0, n) hold the active streams in the order of ids
+        self.fields = fields + ["maximum"]
+        self.int_fields = ["count", "positive", "delta"]
+        self.n = 0
+        self.capacity = max(1, capacity)
+        self.ids = np.zeros(self.capacity, dtype=np.int64)
+        for name in self.fields:
+            setattr(self, name, np.zeros(self.capacity))
+        for name in self.int_fields:
+            setattr(self, name, np.zeros(self.capacity, dtype=np.int64))
+        if algorithm == "terma" and self.valid:
+            self.ring = np.zeros((self.capacity, self.ring_len))
+
+        self.slots = {}
+        self.next_id = 0
+
+    def __len__(self):
+        return self.n
+
+    ### Stream ids in sample order
+    def stream_ids(self):
+        return self.ids[:self.n]
+
+    ### Slot of a stream, i.e. its position in the sample vector, or -1 for an unknown stream
+    def slot(self, stream_id):
+        return self.slots.get(stream_id, -1)
+
+    def grow(self):
+        self.capacity *= 2
+        for name in ["ids"] + self.fields + self.int_fields:
+            old = getattr(self, name)
+            new = np.zeros(self.capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        if hasattr(self, "ring"):
+            ring = np.zeros((self.capacity, self.ring_len))
+            ring[:len(self.ring)] = self.ring
+            self.ring = ring
+
+    ### Add a stream and return its id; its sample goes at the end of the sample vector
+    def add_stream(self):
+        if self.n == self.capacity:
+            self.grow()
+
+        slot = self.n
+        for name in self.fields + self.int_fields:
+            getattr(self, name)[slot] = 0
+        self.maximum[slot] = self.th
+        if hasattr(self, "ring"):
+            self.ring[slot] = 0
+
+        stream_id = self.next_id
+        self.next_id += 1
+        self.ids[slot] = stream_id
+        self.slots[stream_id] = slot
+        self.n += 1
+        return stream_id
+
+    ### Remove a stream; the last stream moves into its slot, so only that stream changes position
+    def remove_stream(self, stream_id):
+        slot = self.slots.pop(stream_id, None)
+        if slot is None:
+            print("Stream " + str(stream_id) + " does not exist")
+            return False
+
+        last = self.n - 1
+        if slot != last:
+            for name in ["ids"] + self.fields + self.int_fields:
+                array = getattr(self, name)
+                array[slot] = array[last]
+            if hasattr(self, "ring"):
+                self.ring[slot] = self.ring[last]
+            self.slots[int(self.ids[slot])] = slot
+
+        self.n -= 1
+        return True
+
+    ### Advance every stream by one sample; returns (stream ids, sample indices) of the breaths completed by this tick
+    def tick(self, samples):
+        n = self.n
+        samples = np.asarray(samples, dtype=np.float64)
+        if len(samples) != n:
+            print("Expected " + str(n) + " samples, got " + str(len(samples)))
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        if not self.valid or n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        count = self.count[:n]
+        if self.algorithm == "srmac":
+            y, raw, index, valid = self.tick_srmac(samples, count)
+        else:
+            y, raw, index, valid = self.tick_terma(samples, count)
+
+        breaths = self.crossing(y, raw, index, valid)
+        count += 1
+        return breaths
+
+    ### Same recurrences as rralglib.SlidingRREstimator.update_srmac; a new stream starts from its first sample
+    def tick_srmac(self, samples, count):
+        n = self.n
+        fast, slow, cross = self.prev_fast[:n], self.prev_slow[:n], self.prev_cross[:n]
+
+        first = count == 0
+        fast[first] = samples[first]
+        slow[first] = samples[first]
+
+        fast *= 1 - self.coef_fast
+        fast += samples * self.coef_fast
+        slow *= 1 - self.coef_slow
+        slow += samples * self.coef_slow
+        cross *= 1 - self.coef_cross
+        cross += (fast - slow) * self.coef_cross
+
+        return cross, samples, count, None
+
+    ### rralglib.terma_filter output for sample count - lag, with the running mean of the stream in place of the mean
+    ### of the whole recording; streams produce no output during their first lag samples
+    def tick_terma(self, samples, count):
+        n = self.n
+        ring, ring_len = self.ring, self.ring_len
+        rows = np.arange(n)
+
+        ring[rows, count % ring_len] = samples
+        self.z_sum[:n] += samples
+
+        for sums, end, w in [(self.ev_sum, self.ends[0], self.w1), (self.cy_sum, self.ends[1], self.w2)]:
+            last = count + end
+            sums[:n] += ring[rows, last % ring_len] - ring[rows, (last - w) % ring_len]
+
+        center = count - self.lag
+        z = self.z_sum[:n] / (count + 1)
+        y = self.ev_sum[:n] / self.w1 - (self.cy_sum[:n] / self.w2 + self.b * z)
+
+        return y, ring[rows, center % ring_len], center, center >= 0
+
+    ### One step of the rralglib.zero_crossing run logic for every stream; raw values pick the maxima
+    def crossing(self, y, raw, index, valid):
+        n = self.n
+        positive, delta, maximum = self.positive[:n], self.delta[:n], self.maximum[:n]
+
+        above = y > self.th
+        below = ~above
+        if valid is not None:
+            above &= valid
+            below &= valid
+
+        delta[above | below] += 1
+        peak = above & (raw > maximum)
+        maximum[peak] = raw[peak]
+        delta[peak] = 0
+
+        breath = below & (positive >= self.width)
+        ids, indices = self.ids[:n][breath], index[breath] - delta[breath]
+
+        positive[above] += 1
+        positive[below] = 0
+        delta[below] = 0
+        maximum[below] = self.th
+
+        return ids, indices
+
+    ### Run a (T, n) block of samples, one tick per row; returns the breaths of all ticks
+    def run(self, block):
+        block = np.asarray(block, dtype=np.float64).reshape(-1, self.n)
+        ids, indices = [], []
+        for samples in block:
+            tick_ids, tick_indices = self.tick(samples)
+            ids.append(tick_ids)
+            indices.append(tick_indices)
+
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(ids), np.concatenate(indices)
+
+### Measure engine throughput in samples per second on a single core
+def measure_throughput(engine, samples):
+    t0 = time.perf_counter()
+    for sample in samples:
+        engine.push(sample)
+    elapsed = time.perf_counter() - t0
+    if elapsed <= 0:
+        return 0
+    return len(samples) / elapsed
+
+### Replay a recording through the joint engine and report single core throughput
+if __name__ == "__main__":
+    filepath = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "321_square_Dec12_Gen2.csv")
+    samples = np.loadtxt(filepath, delimiter=",", skiprows=1, usecols=1)
+
+    engine = RealtimeJoint(ParamsPeaks(coef_fast=0.5, coef_slow=0.1, coef_cross=0.9, width=0.2), ParamsPeaks())
+    rate = measure_throughput(engine, samples)
+
+    print(str(len(samples))+" samples, "+str(round(rate))+" samples/s per core")
@@ -0,0 +1,171 @@
+import math, time
+import numpy as np
+
+### Plot rendering helpers for rralglib ###
+### A min/max pyramid of a signal answers window range queries in O(log n) and reduces any window to at most a few
+### min/max pairs per pixel column, so the amount of plotted data is bounded by the screen width instead of the window length
+### A playback clock advances data time by wall-clock time, so replay speed does not depend on how often frames are drawn
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max pyramid; level k holds the minimum and maximum of each aligned block of 2**k samples
+    """
+    def __init__(self, data):
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        self.mins = [self.data]
+        self.maxs = [self.data]
+
+        mins, maxs = self.data, self.data
+        while len(mins) > 1:
+            ### An odd trailing block is paired with itself
+            if len(mins) % 2 != 0:
+                mins = np.append(mins, mins[-1])
+                maxs = np.append(maxs, maxs[-1])
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            self.mins.append(mins)
+            self.maxs.append(maxs)
+
+    def __len__(self):
+        return len(self.data)
+
+    ### Minimum and maximum of data[start:stop] from at most two blocks per level
+    def range(self, start, stop):
+        start, stop = max(0, int(start)), min(len(self.data), int(stop))
+        if start >= stop:
+            return None, None
+
+        low, high = math.inf, -math.inf
+        level = 0
+        while start < stop:
+            if start & 1:
+                low = min(low, self.mins[level][start])
+                high = max(high, self.maxs[level][start])
+                start += 1
+            if stop & 1:
+                stop -= 1
+                low = min(low, self.mins[level][stop])
+                high = max(high, self.maxs[level][stop])
+            start >>= 1
+            stop >>= 1
+            level += 1
+
+        return float(low), float(high)
+
+    ### Pyramid level whose blocks are at most samples_per_column long
+    def level(self, samples_per_column):
+        if samples_per_column < 2:
+            return 0
+        return min(int(math.log2(samples_per_column)), len(self.mins) - 1)
+
+    ### Reduce data[start:stop] to min/max pairs for a plot that is columns pixels wide
+    def decimate(self, start, stop, columns, time=None):
+        """
+        Returns (x, y) with one min and one max point per block of the chosen level, at most 2 * columns blocks;
+        blocks are aligned to absolute sample indices, so the trace does not shimmer while the window slides,
+        and the two edge blocks may include a few samples just outside the window
+        """
+        start, stop = max(0, int(start)), min(len(self.data), int(stop))
+        if start >= stop:
+            return np.zeros(0), np.zeros(0)
+
+        level = self.level((stop - start) / max(int(columns), 1))
+        if level == 0:
+            x = np.arange(start, stop, dtype=np.float64) if time is None else time[start:stop]
+            return x, self.data[start:stop]
+
+        first = start >> level
+        last = ((stop - 1) >> level) + 1
+        mins = self.mins[level][first:last]
+        maxs = self.maxs[level][first:last]
+
+        ### Each block is drawn as a vertical segment at the time of its first sample inside the window
+        index = np.clip(np.arange(first, last) << level, start, stop - 1)
+        x = np.repeat(index.astype(np.float64) if time is None else time[index], 2)
+        y = np.empty(2 * len(mins))
+        y[0::2] = mins
+        y[1::2] = maxs
+
+        return x, y
+
+### Playback scheduling ###
+
+class PlaybackClock:
+    """
+    Maps wall-clock time to a sample position at a playback speed; tick() reports the current position, whether a frame
+    is due (at most max_fps per second) and whether an algorithm run is due (one per hop of data time, never queued up)
+    """
+    def __init__(self, fs, speed=1.0, max_fps=60, hop_size=1.0, length=None, clock=time.perf_counter):
+        self.fs = fs
+        self.speed = speed
+        self.max_fps = max_fps
+        self.hop_len = max(1, int(hop_size * fs))
+        self.length = length
+        self.clock = clock
+
+        self.running = False
+        self.anchor_position = 0.0
+        self.anchor_time = 0.0
+        self.next_frame = None
+        self.last_hop = None
+
+    ### Sample position at the current wall-clock time, clamped to [0, length]
+    def position(self):
+        position = self.anchor_position
+        if self.running:
+            position += (self.clock() - self.anchor_time) * self.speed * self.fs
+        if self.length is not None:
+            position = min(position, self.length)
+        return max(0.0, position)
+
+    def finished(self):
+        return self.length is not None and self.position() >= self.length
+
+    ### Start or resume playback, optionally from a new position
+    def start(self, position=None):
+        if position is not None:
+            self.anchor_position = float(position)
+        self.anchor_time = self.clock()
+        self.running = True
+        self.next_frame = None
+
+    def pause(self):
+        self.anchor_position = self.position()
+        self.running = False
+
+    ### Jump to a position; the next tick renders and analyzes it
+    def seek(self, position):
+        self.anchor_position = float(position)
+        self.anchor_time = self.clock()
+        self.next_frame = None
+        self.last_hop = None
+
+    ### Change the playback speed without a jump in position
+    def set_speed(self, speed):
+        self.anchor_position = self.position()
+        self.anchor_time = self.clock()
+        self.speed = speed
+
+    ### Returns (index, render, analyze) for the current wall-clock time
+    def tick(self):
+        now = self.clock()
+        index = int(self.position())
+
+        ### Frame deadlines advance by one period, so the average rate stays at max_fps while a quarter frame of slack
+        ### keeps timer jitter around the refresh interval from dropping every other frame
+        render = self.next_frame is None or self.max_fps <= 0
+        if not render:
+            period = 1.0 / self.max_fps
+            render = now >= self.next_frame - 0.25 * period
+            if render:
+                self.next_frame = self.next_frame + period if now - self.next_frame < period else now + period
+        elif self.max_fps > 0:
+            self.next_frame = now + 1.0 / self.max_fps
+
+        ### Hops skipped at high speed are not made up for; only the latest one runs
+        hop = index // self.hop_len
+        analyze = hop != self.last_hop
+        if analyze:
+            self.last_hop = hop
+
+        return index, render, analyze
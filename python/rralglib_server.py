@@ -0,0 +1,283 @@
+import sys, struct, argparse, asyncio, itertools, time
+import numpy as np
+import rralglib_io
+import rralglib_parallel
+from rralglib_realtime import RealtimeSingle, ParamsPeaks, SAMPLE_RATE, DATA_WINDOW, RRAL_DELTA_SAMPLES
+
+### Sample stream server for rralglib ###
+### Sensors connect over TCP or a Unix domain socket and stream samples; every connection gets its own realtime engine,
+### samples are batched to whole deltas and run on a ChannelPool, and each estimate is sent back on the same connection
+###
+### Framing: every frame is a little-endian header (kind: uint8, length: uint32) followed by length bytes of payload
+###   HELLO    client -> server  sample_rate, data_window, delta_samples as uint32; optional, before the first samples
+###   SAMPLES  client -> server  float64 samples
+###   END      both ways         the client has no more samples; the server answers END once every estimate is sent
+###   RESULT   server -> client  time: int64, rate: float64, sqi: float64
+###   ERROR    server -> client  UTF-8 message; the server closes the connection after it
+
+HOST = "127.0.0.1"
+PORT = 8764
+
+FRAME_HELLO = 1
+FRAME_SAMPLES = 2
+FRAME_END = 3
+FRAME_RESULT = 4
+FRAME_ERROR = 5
+
+FRAME_HEADER = struct.Struct("<BI")
+HELLO = struct.Struct("<III")
+RESULT = struct.Struct("<qdd")
+
+### Largest accepted frame payload in bytes
+MAX_FRAME = 1 << 20
+
+### Listen backlog; thousands of sensors may connect at once after a restart
+BACKLOG = 4096
+
+def pack_frame(kind, payload=b""):
+    return FRAME_HEADER.pack(kind, len(payload)) + payload
+
+### Read one frame; returns (kind, payload), or (None, None) at the end of the stream
+async def read_frame(reader):
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None, None
+
+    kind, length = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError("frame of " + str(length) + " bytes is larger than " + str(MAX_FRAME))
+
+    return kind, await reader.readexactly(length)
+
+### Default engine of a connection
+def realtime_engine(sample_rate, data_window, delta_samples):
+    return RealtimeSingle(ParamsPeaks(sample_rate=sample_rate), sample_rate, data_window, delta_samples)
+
+class RRServer:
+    """
+    asyncio server with one streaming engine per connection; engine_factory(sample_rate, data_window, delta_samples)
+    returns an object whose push_many() returns results with rate, sqi and time, like rralglib_realtime.RealtimeSingle
+    """
+    def __init__(self, host=HOST, port=PORT, path=None, workers=None, engine_factory=realtime_engine, sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW, delta_samples=RRAL_DELTA_SAMPLES):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers
+        self.engine_factory = engine_factory
+        self.defaults = (sample_rate, data_window, delta_samples)
+
+        self.server = None
+        self.pool = None
+        self.ids = itertools.count()
+        self.connections = 0
+        self.samples = 0
+        self.results = 0
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    ### Start listening; with port 0 the port picked by the system is stored in self.port
+    async def start(self):
+        self.pool = rralglib_parallel.ChannelPool(workers=self.workers)
+
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path=self.path, backlog=BACKLOG)
+        else:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port, backlog=BACKLOG)
+            self.port = self.server.sockets[0].getsockname()[1]
+
+        return self
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    async def handle(self, reader, writer):
+        key = next(self.ids)
+        config = None
+        delta = 0
+        pending = np.zeros(0)
+        self.connections += 1
+
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind is None:
+                    break
+
+                if kind == FRAME_HELLO:
+                    if config is not None or len(payload) != HELLO.size:
+                        raise ValueError("unexpected HELLO frame")
+                    config = HELLO.unpack(payload)
+                    if min(config) <= 0 or config[2] > config[0] * config[1]:
+                        raise ValueError("invalid configuration " + str(config))
+
+                elif kind == FRAME_SAMPLES:
+                    if len(payload) % 8 != 0:
+                        raise ValueError("SAMPLES payload is not a whole number of float64 samples")
+
+                    if delta == 0:
+                        if config is None:
+                            config = self.defaults
+                        delta = config[2]
+                        self.pool.add_channel(key, self.engine_factory(*config))
+
+                    pending = np.concatenate((pending, np.frombuffer(payload, dtype="<f8")))
+                    self.samples += len(payload) // 8
+
+                    ### Only whole deltas are sent to the pool, so every batch completes at least one estimate
+                    ready = len(pending) - len(pending) % delta
+                    if ready > 0:
+                        batch, pending = pending[:ready], pending[ready:]
+                        results = await asyncio.wrap_future(self.pool.submit(key, batch))
+                        for out in results:
+                            writer.write(pack_frame(FRAME_RESULT, RESULT.pack(int(out.time), float(out.rate), float(out.sqi))))
+                        self.results += len(results)
+                        await writer.drain()
+
+                elif kind == FRAME_END:
+                    writer.write(pack_frame(FRAME_END))
+                    await writer.drain()
+                    break
+
+                else:
+                    raise ValueError("unknown frame kind " + str(kind))
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            ### Protocol errors and engine failures end this connection only
+            writer.write(pack_frame(FRAME_ERROR, str(e).encode("utf-8")))
+        finally:
+            self.connections -= 1
+            if self.pool is not None:
+                self.pool.remove_channel(key)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+### Replay client ###
+
+async def replay(samples, host=HOST, port=PORT, path=None, sample_rate=SAMPLE_RATE, data_window=DATA_WINDOW, delta_samples=RRAL_DELTA_SAMPLES, speed=0, block=None):
+    """
+    Stream samples to a server as one sensor and return its estimates as a list of (time, rate, sqi);
+    speed is the replay speed relative to real time, 0 sends as fast as the connection allows
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+
+    results = []
+
+    async def receive():
+        while True:
+            kind, payload = await read_frame(reader)
+            if kind is None or kind == FRAME_END:
+                return
+            if kind == FRAME_RESULT:
+                results.append(RESULT.unpack(payload))
+            elif kind == FRAME_ERROR:
+                print("Server error: " + payload.decode("utf-8", "replace"))
+                return
+
+    receiver = asyncio.ensure_future(receive())
+
+    try:
+        writer.write(pack_frame(FRAME_HELLO, HELLO.pack(sample_rate, data_window, delta_samples)))
+
+        samples = np.ascontiguousarray(samples, dtype="<f8")
+        block = block or delta_samples
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+
+        for i in range(0, len(samples), block):
+            if receiver.done():
+                break
+            writer.write(pack_frame(FRAME_SAMPLES, samples[i:i+block].tobytes()))
+            await writer.drain()
+            if speed > 0:
+                await asyncio.sleep(max(0, t0 + (i + block) / (sample_rate * speed) - loop.time()))
+
+        if not receiver.done():
+            writer.write(pack_frame(FRAME_END))
+            await writer.drain()
+        await receiver
+    except ConnectionError:
+        receiver.cancel()
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    return results
+
+### Replay one recording as several concurrent sensors; returns the estimates of each stream
+async def replay_many(samples, streams=1, **kwargs):
+    return await asyncio.gather(*[replay(samples, **kwargs) for _ in range(streams)])
+
+async def serve(args):
+    async with RRServer(args.host, args.port, args.unix, args.workers, delta_samples=args.delta or RRAL_DELTA_SAMPLES) as server:
+        print("Listening on " + (args.unix if args.unix is not None else args.host + ":" + str(server.port)))
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream samples into rralglib realtime engines over TCP or a Unix socket")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name in ["serve", "replay"]:
+        command = commands.add_parser(name)
+        command.add_argument("--host", default=HOST, help="TCP host")
+        command.add_argument("--port", type=int, default=PORT, help="TCP port")
+        command.add_argument("--unix", help="Unix domain socket path instead of TCP")
+        command.add_argument("--delta", type=int, help="samples per estimate (default: one second of samples)")
+        if name == "serve":
+            command.add_argument("--workers", type=int, help="engine threads (default: one per core, 0 runs on the event loop)")
+        else:
+            command.add_argument("recording", help="recording to replay")
+            command.add_argument("--streams", type=int, default=1, help="concurrent connections replaying the recording")
+            command.add_argument("--speed", type=float, default=0, help="replay speed relative to real time, 0 for as fast as possible")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    samples, fs = rralglib_io.read_recording(args.recording)
+    if len(samples) == 0 or not fs:
+        print("Could not read " + args.recording)
+        return 1
+    sample_rate = int(round(fs))
+
+    t0 = time.perf_counter()
+    streams = asyncio.run(replay_many(samples, args.streams, host=args.host, port=args.port, path=args.unix, sample_rate=sample_rate, delta_samples=args.delta or sample_rate, speed=args.speed))
+    elapsed = time.perf_counter() - t0
+
+    estimates = sum(len(results) for results in streams)
+    print(str(args.streams) + " streams, " + str(estimates) + " estimates, " + str(round(args.streams * len(samples) / elapsed)) + " samples/s")
+    if len(streams[0]) > 0:
+        print("last estimate: time " + str(streams[0][-1][0]) + " s, rate " + str(round(streams[0][-1][1], 2)) + ", sqi " + str(round(streams[0][-1][2], 3)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
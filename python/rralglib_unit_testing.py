@@ -1,6 +1,18 @@
+import os, shutil, tempfile, threading, asyncio, concurrent.futures
 import numpy as np
 import unittest
 import rralglib
+import rralglib_realtime
+import rralglib_c
+import rralglib_jit
+import rralglib_benchmark
+import rralglib_metrics
+import rralglib_io
+import rralglib_render
+import rralglib_parallel
+import rralglib_conditioning
+import rralglib_batch
+import rralglib_server
 
 ### Unit tests for the Python rralglib module
 
@@ -539,6 +551,898 @@ class TestBitrev(unittest.TestCase): ### Examples given in https://en.wikipedia.
 
         self.assertListEqual([0,8,4,12,2,10,6,14,1,9,5,13,3,11,7,15],x.tolist())
 
+class TestSlidingRREstimator(unittest.TestCase):
+    def test_empty(self):
+        estimator = rralglib.SlidingRREstimator(fs=64, window_size=20)
+
+        rr, peaks = estimator.update([])
+
+        self.assertEqual(rr, 0)
+        self.assertEqual(peaks, [])
+
+    def test_srmac_matches_batch(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,40*np.pi,fs*80))
+
+        estimator = rralglib.SlidingRREstimator(fs=fs, window_size=80, algorithm="srmac")
+        for i in range(0, len(signal), fs):
+            rr, peaks = estimator.update(signal[i:i+fs])
+
+        rr_batch, peaks_batch = rralglib.srmac(data=signal, fs=fs)
+
+        self.assertEqual(peaks, peaks_batch)
+        self.assertAlmostEqual(rr, rr_batch)
+
+    def test_window_drop(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,40*np.pi,fs*80))
+
+        estimator = rralglib.SlidingRREstimator(fs=fs, window_size=20, algorithm="terma")
+        for i in range(0, len(signal), fs):
+            rr, peaks = estimator.update(signal[i:i+fs])
+
+        self.assertGreater(rr, 0)
+        self.assertGreaterEqual(min(peaks), 0)
+        self.assertLess(max(peaks), 20*fs)
+        self.assertAlmostEqual(rr, rralglib.find_rr_dist(peaks, fs))
+
+class TestRealtime(unittest.TestCase):
+    def test_buffer_sizes(self):
+        state = rralglib_realtime.StatePeaks(sample_rate=25, data_window=21, delta_samples=25)
+
+        self.assertEqual(len(state.data), 526)
+        self.assertEqual(len(state.peaks), rralglib_realtime.MAX_PEAK_COUNT)
+
+    def test_results_every_delta(self):
+        engine = rralglib_realtime.RealtimeSingle(rralglib_realtime.ParamsPeaks())
+
+        results = engine.push_many(np.zeros(64*5))
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual([r.time for r in results], [0,1,2,3,4])
+        self.assertEqual(results[-1].rate, 0)
+
+    def test_joint_sine(self):
+        fs = 64
+        signal = 100*np.sin(np.linspace(0,30*2*np.pi,fs*120))
+
+        params_hr = rralglib_realtime.ParamsPeaks(coef_fast=0.5, coef_slow=0.1, coef_cross=0.9, width=0.2)
+        params_rr = rralglib_realtime.ParamsPeaks()
+        engine = rralglib_realtime.RealtimeJoint(params_hr, params_rr)
+
+        results = engine.push_many(signal)
+
+        self.assertEqual(len(results), 120)
+        self.assertAlmostEqual(results[-1].rr, 15, delta=1)
+
+class TestStreamBank(unittest.TestCase):
+    def setUp(self):
+        self.fs = 64
+        rng = np.random.default_rng(11)
+        t = np.arange(self.fs * 60) / self.fs
+        self.data = np.array([100 * np.sin(2 * np.pi * (0.2 + 0.03 * k) * t) + rng.normal(size=len(t)) for k in range(4)])
+
+    def test_srmac_matches_estimator(self):
+        bank = rralglib_realtime.StreamBank(self.fs, "srmac", capacity=1)
+        streams = [bank.add_stream() for _ in range(3)]
+        found = {stream: [] for stream in range(4)}
+
+        ### Stream 3 joins later and stream 1 leaves halfway; breath indices count each stream's own samples
+        length = self.data.shape[1]
+        for i in range(length):
+            if i == 500:
+                streams.append(bank.add_stream())
+            if i == length // 2:
+                bank.remove_stream(1)
+                streams.remove(1)
+            samples = [self.data[stream, i - (500 if stream == 3 else 0)] for stream in bank.stream_ids()]
+            for stream, index in zip(*bank.tick(samples)):
+                found[int(stream)].append(int(index))
+
+        self.assertEqual(list(bank.stream_ids()), [0, 3, 2])
+        self.assertEqual(bank.slot(3), 1)
+        self.assertEqual(bank.capacity, 4)
+
+        for stream, samples in [(0, length), (1, length // 2), (2, length), (3, length - 500)]:
+            estimator = rralglib.SlidingRREstimator(self.fs, 10**6, "srmac")
+            estimator.update(self.data[stream, :samples])
+            self.assertEqual(found[stream], list(estimator.breaths))
+            self.assertGreater(len(found[stream]), 4)
+
+    def test_terma_matches_filter(self):
+        ### With b = 0 the running mean drops out and the output equals rralglib.terma_filter, up to the end effects
+        bank = rralglib_realtime.StreamBank(self.fs, "terma", b_coef=0)
+        for _ in range(4):
+            bank.add_stream()
+        ids, indices = bank.run(self.data.T)
+
+        w1, w2, b, width, margin = rralglib.terma_params(self.fs, b_coef=0)
+        for stream in range(4):
+            filtered = rralglib.terma_filter(self.data[stream].copy(), w1, w2, 0)
+            count, peaks = rralglib.zero_crossing(filtered, width=w1, th=0.0, rawdata=self.data[stream], margin=0)
+            found = list(indices[ids == stream])
+            self.assertGreater(len(found), len(peaks) - 2)
+            self.assertEqual(found, peaks[:len(found)])
+
+    def test_invalid(self):
+        bank = rralglib_realtime.StreamBank(self.fs, "cwt")
+        bank.add_stream()
+        self.assertFalse(bank.valid)
+        self.assertEqual(len(bank.tick([1.0])[0]), 0)
+        self.assertEqual(len(bank.tick([1.0, 2.0])[0]), 0)
+        self.assertFalse(bank.remove_stream(5))
+
+class TestBackend(unittest.TestCase):
+    def test_invalid_backend(self):
+        self.assertFalse(rralglib.set_backend("fortran"))
+        self.assertEqual(rralglib.backend, "python")
+
+    def test_fallback(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,4*np.pi,fs*4))
+
+        rr, peaks = rralglib.run_algorithm(signal, fs, algorithm="terma", args=[0.2,0.6,-1,0.1,0], backend="c")
+        rr_py, peaks_py = rralglib.terma(data=signal, fs=fs, args=[0.2,0.6,-1,0.1,0])
+
+        self.assertEqual(rr, rr_py)
+        self.assertEqual(peaks, peaks_py)
+
+class TestCBackend(unittest.TestCase):
+    def setUp(self):
+        if not rralglib_c.available():
+            self.skipTest("C library not built")
+
+    def test_srmac_sine(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,20*np.pi,fs*20))
+
+        rr, peaks = rralglib.run_algorithm(signal, fs, algorithm="srmac", args=[-1,-1,-1,0,0.1,0], backend="c")
+        rr_py, peaks_py = rralglib.srmac(data=signal, fs=fs, args=[-1,-1,-1,0,0.1,0])
+
+        self.assertEqual(peaks, peaks_py)
+        self.assertAlmostEqual(rr, rr_py)
+
+    def test_find_peaks_sine(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,20*np.pi,fs*20))
+
+        rr, peaks = rralglib.run_algorithm(signal, fs, algorithm="find_peaks_c", args=[-1,-1,-1,-1,-1,-1], backend="c")
+
+        self.assertGreater(rr, 0)
+        self.assertEqual(len(peaks), 10)
+
+    def test_find_peaks_recording(self):
+        ### The C detector picks different peaks on real data, so "default" and "find_peaks" stay on Python with backend="c"
+        data, fs = rralglib_io.read_recording(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "321_square_Dec12_Gen2.csv"))
+        for start in range(0, len(data) - 20 * fs + 1, 5 * fs):
+            window = rralglib.z_norm(data[start:start + 20 * fs])
+            for algorithm in ["default", "find_peaks"]:
+                rr, peaks = rralglib.run_algorithm(window, fs, algorithm=algorithm, backend="c")
+                rr_py, peaks_py = rralglib.run_algorithm(window, fs, algorithm=algorithm, backend="python")
+                self.assertEqual(list(peaks), list(peaks_py))
+                self.assertEqual(rr, rr_py)
+
+        self.assertIsNotNone(rralglib.make_plan("find_peaks_c", fs, backend="c"))
+
+    def test_zero_crossing_threshold(self):
+        signal = np.array([0,0.5,0,0.7,0,0.9,0,1.1,0])
+
+        count, peaks = rralglib_c.zero_crossing(signal, width=1, margin=0, th=0.8)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(peaks, [5,7])
+
+class TestJITBackend(unittest.TestCase):
+    def setUp(self):
+        if not rralglib_jit.available():
+            self.skipTest("numba not installed")
+
+    def test_srmac_sine(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,20*np.pi,fs*20))
+
+        rr, peaks = rralglib.run_algorithm(signal, fs, algorithm="srmac", args=[-1,-1,-1,0,0.1,0], backend="jit")
+        rr_py, peaks_py = rralglib.srmac(data=signal, fs=fs, args=[-1,-1,-1,0,0.1,0])
+
+        self.assertEqual(peaks, peaks_py)
+        self.assertAlmostEqual(rr, rr_py)
+
+    def test_terma_sine(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,20*np.pi,fs*20))
+
+        rr, peaks = rralglib.run_algorithm(signal, fs, algorithm="terma", args=[-1,-1,-1,-1,-1,-1], backend="jit")
+        rr_py, peaks_py = rralglib.terma(data=signal, fs=fs, args=[-1,-1,-1,-1,-1,-1])
+
+        self.assertEqual(peaks, peaks_py)
+        self.assertAlmostEqual(rr, rr_py)
+
+    def test_sos_filt(self):
+        fs = 64
+        signal = np.random.default_rng(0).normal(size=fs*60)
+        sos = [[0.03168934,0.06337869,0.03168934,1.,-0.41421356,0.],[1.,1.,0.,1.,-1.0448155,0.47759225]]
+
+        self.assertTrue(np.allclose(rralglib.sos_filt(signal, sos, backend="jit"), rralglib.sos_filt(signal, sos)))
+
+class TestAlgorithmPlan(unittest.TestCase):
+    def test_plans_match_functions(self):
+        fs = 32
+        signal = np.sin(np.linspace(0,20*np.pi,fs*20)) + 0.3*np.random.default_rng(0).normal(size=fs*20)
+
+        for algorithm in ["srmac", "terma", "find_peaks", "cwt", "cwt_oa"]:
+            plan = rralglib.make_plan(algorithm, fs)
+            rr, peaks = rralglib.algorithm_registry[algorithm]["function"](data=signal, fs=fs)
+
+            self.assertEqual(plan(signal), (rr, peaks))
+            self.assertEqual(plan(signal[:fs*15])[1], rralglib.algorithm_registry[algorithm]["function"](data=signal[:fs*15], fs=fs)[1])
+
+    def test_params_converted(self):
+        plan = rralglib.make_plan("terma", 64, window_event="2", b_coef=1)
+
+        self.assertEqual(plan.w1, 128)
+        self.assertEqual(plan.b, 1.0)
+
+    def test_invalid(self):
+        self.assertIsNone(rralglib.make_plan("srmac", 64, window_event=1))
+        self.assertIsNone(rralglib.make_plan("srmac", 64, coef_fast=2))
+        self.assertIsNone(rralglib.make_plan("srmac", 0))
+        self.assertIsNone(rralglib.make_plan("invalid", 64))
+        self.assertEqual(rralglib.run_algorithm([1,2,3], 64, algorithm="invalid"), (-1, []))
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        self.assertEqual(rralglib_benchmark.percentile([], 50), 0)
+        self.assertEqual(rralglib_benchmark.percentile([3,1,2,4], 50), 2)
+        self.assertEqual(rralglib_benchmark.percentile(list(range(1,101)), 99), 99)
+
+    def test_benchmark_algorithm(self):
+        fs = 32
+        signal = np.sin(np.linspace(0,60*np.pi,fs*60))
+
+        result = rralglib_benchmark.benchmark_algorithm(signal, fs, "srmac", max_windows=5)
+
+        self.assertEqual(result["windows"], 5)
+        self.assertEqual(result["failures"], 0)
+        self.assertEqual(result["empty_windows"], 0)
+        self.assertGreater(result["windows_per_s"], 0)
+        self.assertLessEqual(result["latency_p50_ms"], result["latency_p99_ms"])
+
+    def test_fit_exponent(self):
+        sizes = [100, 200, 400, 800]
+
+        self.assertAlmostEqual(rralglib_benchmark.fit_exponent(sizes, [n**2 * 1e-9 for n in sizes]), 2.0)
+        self.assertAlmostEqual(rralglib_benchmark.fit_exponent(sizes, [n * 1e-6 for n in sizes]), 1.0)
+        self.assertIsNone(rralglib_benchmark.fit_exponent(sizes[:2], [1e-3, 2e-3]))
+
+    def test_fit_sweep_flagged(self):
+        points = [{"samples": n, "time_s": n**2 * 1e-9} for n in [100, 200, 400]]
+
+        self.assertTrue(rralglib_benchmark.fit_sweep({"points": points}, 1)["flagged"])
+        self.assertFalse(rralglib_benchmark.fit_sweep({"points": points}, 2)["flagged"])
+
+    def test_measure_memory(self):
+        result = rralglib_benchmark.measure_memory(lambda: np.ones(100000).sum())
+
+        self.assertGreaterEqual(result["peak_bytes"], 800000)
+        self.assertLess(result["retained_bytes"], 800000)
+
+class TestStageProfiler(unittest.TestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(rralglib.profiler)
+        self.assertIsNone(rralglib.stage_start())
+
+    def test_context_manager(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,20*np.pi,fs*20))
+
+        with rralglib.StageProfiler() as profiler:
+            rralglib.srmac(data=signal, fs=fs)
+            rralglib.srmac(data=signal, fs=fs)
+        rralglib.srmac(data=signal, fs=fs)
+
+        self.assertIsNone(rralglib.profiler)
+        self.assertEqual(profiler.stats["srmac.ewma"]["count"], 2)
+        self.assertEqual(profiler.stats["srmac.ewma"]["size"], 2*len(signal))
+        self.assertEqual(sum(profiler.stats["srmac.zero_crossing"]["buckets"].values()), 2)
+        self.assertIn("srmac.ewma", profiler.dump())
+
+    def test_callback(self):
+        stages = []
+        profiler = rralglib.StageProfiler(callbacks=[lambda stage, elapsed, size: stages.append(stage)])
+
+        with profiler:
+            rralglib.find_peaks(data=np.sin(np.linspace(0,20*np.pi,640)), fs=32)
+
+        self.assertIn("find_peaks.prominence", stages)
+        self.assertLessEqual(profiler.summary()["find_peaks.prominence"]["p50_s"], profiler.summary()["find_peaks.prominence"]["max_s"])
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        rralglib_metrics.registry.reset()
+
+    def test_run_algorithm_counters(self):
+        fs = 64
+        signal = np.sin(np.linspace(0,20*np.pi,fs*20))
+
+        rralglib.run_algorithm(signal, fs, algorithm="srmac")
+        rralglib.run_algorithm(signal, fs, algorithm="srmac")
+        rralglib.run_algorithm(signal, 0, algorithm="srmac")
+        rralglib.run_algorithm(signal, fs, algorithm="cwt", args=[-1,-1,-1,-1,-1,"x"])
+
+        srmac = rralglib_metrics.registry.algorithms["srmac"]
+        self.assertEqual(srmac.calls, 3)
+        self.assertEqual(srmac.failures, 1)
+        self.assertEqual(srmac.samples, 2*len(signal))
+        self.assertEqual(sum(srmac.latency_counts), 3)
+        self.assertEqual(rralglib_metrics.registry.algorithms["cwt"].errors, 1)
+        self.assertEqual(rralglib_metrics.registry.algorithms["cwt"].failures, 1)
+
+    def test_prometheus(self):
+        registry = rralglib_metrics.MetricsRegistry(buckets=[0.001, 0.01])
+        registry.observe("srmac", 100, 0.0005)
+        registry.observe("srmac", 100, 0.005)
+        registry.observe("srmac", 100, 1.0, failed=True)
+
+        text = registry.prometheus()
+
+        self.assertIn('rralglib_calls_total{algorithm="srmac"} 3', text)
+        self.assertIn('rralglib_samples_total{algorithm="srmac"} 200', text)
+        self.assertIn('rralglib_failures_total{algorithm="srmac"} 1', text)
+        self.assertIn('rralglib_latency_seconds_bucket{algorithm="srmac",le="0.01"} 2', text)
+        self.assertIn('rralglib_latency_seconds_bucket{algorithm="srmac",le="+Inf"} 3', text)
+        self.assertIn('rralglib_latency_seconds_count{algorithm="srmac"} 3', text)
+
+    def test_disabled(self):
+        rralglib_metrics.enabled = False
+        try:
+            rralglib.run_algorithm([1,2,3], 64, algorithm="srmac")
+            rralglib.run_algorithm(np.sin(np.arange(1280) / 10), 64, algorithm="cwt", args=[-1,-1,-1,-1,-1,"x"])
+        finally:
+            rralglib_metrics.enabled = True
+
+        self.assertEqual(rralglib_metrics.registry.algorithms, {})
+
+class TestIO(unittest.TestCase):
+    def write(self, text):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "recording.csv")
+        with open(path, "w", newline="") as file:
+            file.write(text)
+        return path
+
+    def test_header_names(self):
+        path = self.write("Time,BIOZ_DATA\n0.0,-208\n0.015625,-214\n0.03125,-207\n")
+
+        data, time = rralglib_io.read_file_csv(path)
+        bioz, = rralglib_io.read_csv(path, columns=["BIOZ_DATA"])
+
+        self.assertEqual(list(data), [-208, -214, -207])
+        self.assertEqual(list(time), [0.0, 0.015625, 0.03125])
+        self.assertEqual(list(bioz), list(data))
+        self.assertIsNone(rralglib_io.read_csv(path, columns=["missing"]))
+
+    def test_no_header_delimiter(self):
+        path = self.write("1;10;100\n2;20;200\n")
+
+        columns = rralglib_io.read_csv(path, columns=[2, 0], delimiter=";")
+
+        self.assertEqual(list(columns[0]), [100, 200])
+        self.assertEqual(list(columns[1]), [1, 2])
+
+    def test_malformed_rows_dropped(self):
+        path = self.write("Time,BIOZ_DATA\n0.0,1\n0.1,\n0.2,3\n")
+
+        data, time = rralglib_io.read_file_csv(path)
+
+        self.assertEqual(list(data), [1, 3])
+        self.assertEqual(list(time), [0.0, 0.2])
+
+    def test_neulog(self):
+        path = self.write(",Experiment name:,Test\rDuration:,5 0\rRate:,20 per second\rSensors:,Respiration (ID 1  Exp 1)\rRange:,Arb\rUnits:,Arb\rTime\r'-0:0:0.0;1790\r'0:0:0.05;1840\r'0:1:0.1;1891\r\rsys info:[1~2\r\rAttention!\r")
+
+        data, fs, time = rralglib_io.read_neulog(path, return_time=True)
+        header = rralglib_io.read_neulog_header(path)
+
+        self.assertTrue(rralglib_io.is_neulog(path))
+        self.assertEqual(fs, 20)
+        self.assertEqual(list(data), [1790, 1840, 1891])
+        self.assertTrue(np.allclose(time, [0, 0.05, 60.1]))
+        self.assertEqual(header["sensor"], "Respiration (ID 1  Exp 1)")
+        self.assertEqual(rralglib_io.read_recording(path)[1], 20)
+
+    def test_read_recording_csv(self):
+        path = self.write("Time,BIOZ_DATA\n" + "".join(str(i/64)+","+str(i%7)+"\n" for i in range(100)))
+
+        data, fs = rralglib_io.read_recording(path)
+
+        self.assertFalse(rralglib_io.is_neulog(path))
+        self.assertEqual(fs, 64)
+        self.assertEqual(len(data), 100)
+
+    def test_binary_cache(self):
+        path = self.write("Time,BIOZ_DATA\n" + "".join(str(i/64)+","+str(i%7-3)+"\n" for i in range(200)))
+
+        first = rralglib_io.open_recording(path)
+        second = rralglib_io.open_recording(path)
+        data, time = rralglib_io.read_file_csv(path)
+
+        self.assertTrue(os.path.exists(rralglib_io.cache_path(path)))
+        self.assertIsInstance(second.data, np.memmap)
+        self.assertEqual(second.fs, 64)
+        self.assertTrue(np.array_equal(second.data, data))
+        self.assertTrue(np.array_equal(second.time, time))
+        self.assertEqual(list(second.window(10, 13)[0]), list(data[10:13]))
+        self.assertEqual(list(second.window_time(1.0, 1.05)[1]), [1.0, 1.015625, 1.03125, 1.046875])
+        self.assertIsNotNone(rralglib_io.open_binary(rralglib_io.cache_path(path), verify=True))
+        del first, second
+
+    def test_binary_cache_invalidation(self):
+        path = self.write("Time,BIOZ_DATA\n0.0,1\n0.5,2\n")
+        cache = rralglib_io.cache_path(path)
+        rralglib_io.open_recording(path)
+
+        ### Stale: the source changed after the cache was written
+        with open(path, "a") as file:
+            file.write("1.0,3\n")
+        os.utime(path, ns=(0, os.stat(cache).st_mtime_ns + 10**9))
+        self.assertIsNone(rralglib_io.open_binary(cache, source=path))
+        self.assertEqual(list(rralglib_io.open_recording(path).data), [1, 2, 3])
+
+        ### Stale: another column or delimiter was selected
+        self.assertEqual(list(rralglib_io.open_recording(path, key_data=0, key_time=1).data), [0.0, 0.5, 1.0])
+        self.assertEqual(list(rralglib_io.open_recording(path, key_data=1, key_time=0).data), [1, 2, 3])
+        self.assertIsNone(rralglib_io.open_binary(cache, selection=rralglib_io.selection_key(0, 1)))
+
+        ### Corrupt: a flipped byte in the arrays fails the checksum, a flipped header byte fails the header check
+        with open(cache, "r+b") as file:
+            file.seek(rralglib_io.CACHE_HEADER_SIZE + 30)
+            file.write(b"\xff")
+        self.assertIsNone(rralglib_io.open_binary(cache))
+        self.assertIsNotNone(rralglib_io.open_binary(cache, verify=False))
+
+        ### The checksum is verified by default, so a corrupt cache is rebuilt from the source
+        self.assertEqual(list(rralglib_io.open_recording(path, key_data=1, key_time=0).data), [1, 2, 3])
+        self.assertIsNotNone(rralglib_io.open_binary(cache))
+        with open(cache, "r+b") as file:
+            file.seek(16)
+            file.write(b"\xff")
+        self.assertIsNone(rralglib_io.open_binary(cache))
+
+    def test_delta_codec(self):
+        data = np.array([-208, -214, -207, 40000, -40000, 5, 5, 2**40, 0, -1], dtype=np.float64)
+        time = 2.5 + np.arange(len(data)) / 64
+
+        encoded = rralglib_io.encode_delta(data, time, block_size=4)
+        decoded, decoded_time, fs = rralglib_io.decode_delta(encoded)
+        reader = rralglib_io.DeltaReader(encoded)
+
+        self.assertTrue(np.array_equal(decoded, data))
+        self.assertTrue(np.allclose(decoded_time, time))
+        self.assertEqual(fs, 64)
+        self.assertEqual(list(reader.widths), [4, 8, 8])
+        for start, stop in [(0, 10), (3, 5), (4, 8), (7, 9), (9, 20), (5, 5)]:
+            self.assertTrue(np.array_equal(reader.read(start, stop), data[start:stop]))
+        self.assertIsNone(rralglib_io.encode_delta([0.5, 1.0]))
+
+    def test_delta_irregular_time_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "recording.rrd")
+        data = np.arange(5000) % 13 - 6
+        time = np.cumsum(np.full(5000, 0.05))
+        time[100] += 0.01
+
+        self.assertTrue(rralglib_io.write_delta(path, data, time))
+        recording = rralglib_io.read_delta(path)
+
+        self.assertTrue(np.array_equal(recording.data, data))
+        self.assertTrue(np.array_equal(recording.time, time))
+        self.assertLess(os.path.getsize(path), 8 * len(data) + 2 * len(data) + 512)
+
+    def test_stream_formats(self):
+        data = np.arange(1000) % 37 - 18
+        time = np.arange(1000) / 20
+        csv = self.write("Time,BIOZ_DATA\n" + "".join(str(t)+","+str(d)+"\n" for t, d in zip(time, data)))
+        neulog = self.write(",Experiment name:,Test\rRate:,20 per second\rTime\r" + "".join("'0:" + str(int(t // 60)) + ":" + str(t % 60) + ";" + str(d) + "\r" for t, d in zip(time, data)) + "\rsys info:[1~2\r")
+        binary = csv + ".bin"
+        delta = csv + ".rrd"
+        rralglib_io.write_binary(binary, data, time, 20)
+        rralglib_io.write_delta(delta, data, time)
+
+        for path, format in [(csv, "csv"), (neulog, "neulog"), (binary, "binary"), (delta, "delta")]:
+            self.assertEqual(rralglib_io.recording_format(path), format)
+            chunks = list(rralglib_io.stream_recording(path, chunk_size=96, buffer_size=50))
+
+            self.assertEqual([start for start, _, _ in chunks], list(range(0, 1000, 96)))
+            self.assertEqual([len(d) for _, d, _ in chunks[:-1]], [96] * 10)
+            self.assertTrue(np.array_equal(np.concatenate([d for _, d, _ in chunks]), data))
+            self.assertTrue(np.allclose(np.concatenate([t for _, _, t in chunks]), time))
+
+    def test_feed(self):
+        data = 100 * np.sin(2 * np.pi * 0.25 * np.arange(64 * 60) / 64)
+        path = self.write("Time,BIOZ_DATA\n" + "".join(str(i/64)+","+str(v)+"\n" for i, v in enumerate(data)))
+
+        streamed = rralglib.SlidingRREstimator(64, 20)
+        direct = rralglib.SlidingRREstimator(64, 20)
+        results = [result for _, _, _, result in rralglib_io.feed(rralglib_io.stream_recording(path, chunk_size=64), streamed)]
+        for i in range(0, len(data), 64):
+            expected = direct.update(data[i:i + 64])
+
+        self.assertEqual(len(results), 60)
+        self.assertEqual(results[-1], expected)
+        self.assertAlmostEqual(results[-1][0], 15, delta=1)
+
+    def test_chunks(self):
+        path = self.write("Time,BIOZ_DATA\n" + "".join(str(i/64)+","+str(i%7)+"\n" for i in range(1000)))
+
+        chunks = list(rralglib_io.read_csv_chunks(path, columns=["BIOZ_DATA", "Time"], chunk_rows=300))
+        data, time = rralglib_io.read_file_csv(path)
+
+        self.assertEqual([len(chunk[0]) for chunk in chunks], [300, 300, 300, 100])
+        self.assertTrue(np.array_equal(np.concatenate([chunk[0] for chunk in chunks]), data))
+        self.assertTrue(np.array_equal(np.concatenate([chunk[1] for chunk in chunks]), time))
+
+class TestMinMaxPyramid(unittest.TestCase):
+    def test_range(self):
+        rng = np.random.default_rng(1)
+        for n in [1, 2, 3, 7, 64, 1000]:
+            data = rng.normal(size=n)
+            pyramid = rralglib_render.MinMaxPyramid(data)
+            for start, stop in [(0, n), (0, 1), (n - 1, n), (n // 3, n - n // 4)]:
+                if start < stop:
+                    self.assertEqual(pyramid.range(start, stop), (data[start:stop].min(), data[start:stop].max()))
+        self.assertEqual(pyramid.range(10, 10), (None, None))
+
+    def test_decimate(self):
+        data = np.sin(np.arange(100000) / 50) + np.random.default_rng(2).normal(size=100000)
+        time = np.arange(100000) / 64
+        pyramid = rralglib_render.MinMaxPyramid(data)
+
+        x, y = pyramid.decimate(1234, 81234, 800, time)
+
+        self.assertEqual(len(x), len(y))
+        self.assertLessEqual(len(y), 4 * 800)
+        self.assertTrue(np.all(np.diff(x) >= 0))
+        self.assertEqual(x[0], time[1234])
+        self.assertLessEqual(y.min(), data[1234:81234].min())
+        self.assertGreaterEqual(y.max(), data[1234:81234].max())
+
+        ### The edge blocks are aligned to the level, so the trace covers exactly the block-aligned range
+        level = pyramid.level(80000 / 800)
+        first, last = (1234 >> level) << level, ((81233 >> level) + 1) << level
+        self.assertEqual(y.min(), data[first:last].min())
+        self.assertEqual(y.max(), data[first:last].max())
+
+        ### Short windows are plotted as they are
+        x, y = pyramid.decimate(10, 500, 800, time)
+        self.assertTrue(np.array_equal(y, data[10:500]))
+        self.assertTrue(np.array_equal(x, time[10:500]))
+
+class TestRecordingAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.fs = 64
+        self.data = 100 * np.sin(2 * np.pi * 0.25 * np.arange(64 * 60) / 64) + np.random.default_rng(3).normal(size=64 * 60)
+
+    def test_lookup(self):
+        analysis = rralglib_parallel.RecordingAnalysis(self.data, self.fs, "srmac", window_size=20, hop_size=0.5, workers=0)
+        self.assertIsNone(analysis.lookup(100))
+        self.assertEqual(analysis.progress(), 0)
+
+        analysis.start(first=1000)
+        position, rr, peaks = analysis.lookup(1000)
+        expected_rr, expected_peaks = rralglib.make_plan("srmac", self.fs)(rralglib.z_norm(self.data[position:position + 1280]))
+
+        self.assertTrue(analysis.done())
+        self.assertEqual(len(analysis), (len(self.data) - 1280) // 32 + 1)
+        self.assertEqual(position, 992)
+        self.assertEqual(rr, expected_rr)
+        self.assertEqual(list(peaks), list(expected_peaks))
+        self.assertEqual(analysis.lookup(10**9)[0], analysis.positions[-1])
+
+    def test_process_pool(self):
+        inline = rralglib_parallel.RecordingAnalysis(self.data, self.fs, "terma", hop_size=2, workers=0, batch=4).start()
+        pooled = rralglib_parallel.RecordingAnalysis(self.data, self.fs, "terma", hop_size=2, workers=2, batch=4).start(first=2000).wait()
+
+        self.assertTrue(pooled.done())
+        self.assertTrue(np.array_equal(inline.rr, pooled.rr))
+        self.assertTrue(all(np.array_equal(a, b) for a, b in zip(inline.peaks, pooled.peaks)))
+
+    def test_failed_batch(self):
+        ### Pools are never forked from the visualizer's threads
+        self.assertIn(rralglib_parallel.pool_context().get_start_method(), ["forkserver", "spawn"])
+
+        analysis = rralglib_parallel.RecordingAnalysis(self.data, self.fs, "srmac", hop_size=10, workers=0)
+        future = concurrent.futures.Future()
+        analysis.futures[future] = analysis.positions
+        future.set_exception(RuntimeError("worker died"))
+        analysis.collect(future)
+
+        self.assertTrue(analysis.done())
+        self.assertEqual(analysis.failed, len(analysis))
+        self.assertEqual(analysis.lookup(0)[1], -1)
+
+    def test_shared_memory_executor(self):
+        inline = rralglib_parallel.RecordingAnalysis(self.data, self.fs, "srmac", hop_size=1, workers=0).start()
+
+        with rralglib_parallel.SharedMemoryExecutor(self.data, self.fs, "srmac", workers=2, batch=8) as executor:
+            starts, rr, peaks = executor.map_windows(20, 1)
+            single_rr, single_peaks = executor.run([(640, 1280)])
+            name = executor.data_block.name
+
+            ### Runs reuse one result block, so workers stay attached to the recording and at most one result block
+            for hop_size in [5, 0.5, 2, 0.25]:
+                executor.map_windows(20, hop_size)
+            attached = executor.pool.submit(rralglib_parallel.shared_blocks).result()
+            self.assertEqual(attached[0], name)
+            self.assertLessEqual(len(attached), 2)
+
+        self.assertTrue(np.array_equal(starts, inline.positions))
+        self.assertTrue(np.array_equal(rr, inline.rr))
+        self.assertTrue(all(np.array_equal(a, b) for a, b in zip(peaks, inline.peaks)))
+        self.assertEqual(single_rr[0], inline.rr[10])
+        self.assertTrue(np.array_equal(single_peaks[0], inline.peaks[10]))
+
+        ### The shared recording is released on close
+        with self.assertRaises(FileNotFoundError):
+            rralglib_parallel.attach_shared(name)
+
+    def test_channel_pool(self):
+        blocks = [self.data[i:i + 64] for i in range(0, len(self.data), 64)]
+        expected = []
+        for channel in range(6):
+            engine = rralglib.SlidingRREstimator(self.fs, 20, "terma" if channel % 2 else "srmac")
+            expected.append([engine.update(block * (channel + 1))[0] for block in blocks])
+
+        received = {}
+        with rralglib_parallel.ChannelPool(workers=3, batch=2) as pool:
+            for channel in range(6):
+                engine = rralglib.SlidingRREstimator(self.fs, 20, "terma" if channel % 2 else "srmac")
+                pool.add_channel(channel, engine, callback=lambda key, result: received.setdefault(key, []).append(result[0]))
+            futures = [[pool.submit(channel, block * (channel + 1)) for block in blocks] for channel in range(6)]
+
+        ### Blocks of each channel run in order, whichever thread ran them
+        for channel in range(6):
+            self.assertEqual([future.result()[0] for future in futures[channel]], expected[channel])
+            self.assertEqual(received[channel], expected[channel])
+
+    def test_channel_pool_inline_and_errors(self):
+        pool = rralglib_parallel.ChannelPool(workers=0)
+        pool.add_channel("sum", np.sum)
+        pool.add_channel("bad", lambda samples: 1 / 0)
+
+        self.assertEqual(pool.submit("sum", [1, 2, 3]).result(), 6)
+        self.assertIsInstance(pool.submit("bad", [1]).exception(), ZeroDivisionError)
+        self.assertIsNone(pool.submit("missing", [1]))
+        self.assertIsNone(pool.add_channel("sum", np.sum))
+        pool.close()
+
+    def test_thread_scratch(self):
+        plan = rralglib.make_plan("terma", self.fs, backend="python")
+        expected = plan(self.data[:1280])
+        plan.buffers = {}
+
+        results = []
+        def run():
+            rralglib.thread_scratch.buffers = {}
+            results.append(plan(self.data[:1280]))
+            results.append(sorted(rralglib.thread_scratch.buffers.keys()))
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(results[0][0], expected[0])
+        self.assertEqual(results[1], ["terma"])
+        self.assertEqual(plan.buffers, {})
+
+class TestConditioning(unittest.TestCase):
+    def setUp(self):
+        self.fs = 64
+        rng = np.random.default_rng(4)
+        self.raw = 500 + 100 * np.sin(2 * np.pi * 0.25 * np.arange(64 * 300) / 64) + 20 * rng.normal(size=64 * 300)
+        self.sos = rralglib_conditioning.design_filter("butter", 3, 0.8, 0.05, self.fs)
+        self.expected = rralglib.sos_filt(self.raw - np.mean(self.raw), self.sos, backend="python")
+
+    def test_fill_matches_sos_filt(self):
+        signal = rralglib_conditioning.ConditionedSignal(self.raw, self.sos, self.fs, 0.05)
+        while signal.fill_step(block=1000):
+            pass
+
+        self.assertTrue(signal.done())
+        self.assertTrue(np.allclose(signal.data, self.expected, atol=1e-8))
+
+    def test_preview(self):
+        signal = rralglib_conditioning.ConditionedSignal(self.raw, self.sos, self.fs, 0.05)
+        signal.ensure(10000, 11280)
+
+        self.assertTrue(np.allclose(signal.data[10000:11280], self.expected[10000:11280], atol=1e-3))
+        self.assertFalse(signal.done())
+
+        ### Exact values replace the preview
+        signal.fill()
+        self.assertTrue(np.allclose(signal.data, self.expected, atol=1e-8))
+
+    def test_cache_lru(self):
+        cache = rralglib_conditioning.ConditioningCache(budget=2 * self.raw.nbytes)
+
+        first = cache.get(self.raw, self.fs)
+        second = cache.get(self.raw, self.fs, lpf=1.0)
+        self.assertIs(cache.get(self.raw, self.fs), first)
+        cache.get(self.raw, self.fs, hpf=0.1)
+        cache.wait()
+
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.nbytes, cache.budget)
+        self.assertIs(cache.get(self.raw, self.fs), first)
+        self.assertNotIn(("butter", 3, 1.0, 0.05, self.fs), cache.entries)
+        self.assertTrue(first.done())
+        self.assertTrue(np.allclose(first.data, self.expected, atol=1e-8))
+        self.assertIsNone(cache.get(self.raw, self.fs, filter_type="unknown"))
+        del second
+
+class TestPlaybackClock(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.clock = rralglib_render.PlaybackClock(64, speed=50, max_fps=60, hop_size=1, length=64 * 300, clock=lambda: self.now)
+
+    def test_wall_clock_position(self):
+        self.clock.start(100)
+        self.now = 0.5
+        self.assertEqual(self.clock.tick()[0], 100 + 0.5 * 50 * 64)
+
+        self.clock.pause()
+        self.now = 10
+        self.assertEqual(self.clock.position(), 100 + 0.5 * 50 * 64)
+
+        self.clock.set_speed(1)
+        self.clock.start()
+        self.now = 11
+        self.assertEqual(self.clock.position(), 100 + 0.5 * 50 * 64 + 64)
+
+        self.now = 1000
+        self.assertTrue(self.clock.finished())
+        self.assertEqual(self.clock.position(), 64 * 300)
+
+    def test_frame_and_hop_pacing(self):
+        self.clock.start(0)
+        frames, runs = 0, 0
+
+        ### One second of ticks at 1 kHz: 50 s of data, 60 frames and one run per data second
+        for i in range(1000):
+            self.now = i / 1000
+            index, render, analyze = self.clock.tick()
+            frames += render
+            runs += analyze
+
+        self.assertTrue(59 <= frames <= 61)
+        self.assertEqual(runs, 50)
+        self.assertEqual(index, int(0.999 * 50 * 64))
+
+        ### A seek renders and analyzes on the next tick
+        self.clock.seek(5)
+        self.assertEqual(self.clock.tick()[1:], (True, True))
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.data = 100 * np.sin(2 * np.pi * 0.25 * np.arange(64 * 60) / 64)
+        for name in ["a.csv", "b.csv"]:
+            with open(os.path.join(self.directory, name), "w") as file:
+                file.write("Time,BIOZ_DATA\n" + "".join(str(i/64)+","+str(v)+"\n" for i, v in enumerate(self.data)))
+        with open(os.path.join(self.directory, "broken.csv"), "w") as file:
+            file.write("Time,BIOZ_DATA\n")
+
+    def test_stream_windows(self):
+        chunks = [(i, self.data[i:i+100], np.arange(i, min(i+100, len(self.data))) / 64) for i in range(0, len(self.data), 100)]
+        windows = list(rralglib_batch.stream_windows(chunks, 1280, 64))
+
+        self.assertEqual([start for start, _, _ in windows], list(range(0, len(self.data) - 1280 + 1, 64)))
+        for start, time, window in windows:
+            self.assertEqual(time, start / 64)
+            self.assertTrue(np.array_equal(window, self.data[start:start+1280]))
+
+    def test_run_and_resume(self):
+        output = os.path.join(self.directory, "out")
+        recordings = rralglib_batch.find_recordings([self.directory])
+
+        summaries = rralglib_batch.run_batch(recordings, output, "srmac", hop_size=2, workers=0, verbose=False)
+        errors = [summary for summary in summaries if summary["error"] is not None]
+        rows = np.loadtxt(rralglib_batch.output_path(recordings[0], output, "srmac"), delimiter=",", skiprows=1, ndmin=2)
+
+        self.assertEqual(len(recordings), 3)
+        self.assertEqual([os.path.basename(summary["recording"]) for summary in errors], ["broken.csv"])
+        self.assertEqual(len(rows), 21)
+        self.assertEqual(list(rows[:3, 0]), [0, 128, 256])
+        self.assertAlmostEqual(np.median(rows[:, 2]), 15, delta=1)
+
+        ### Finished recordings are skipped, the broken one is retried
+        summaries = rralglib_batch.run_batch(recordings, output, "srmac", hop_size=2, workers=0, verbose=False)
+        self.assertEqual([os.path.basename(summary["recording"]) for summary in summaries], ["broken.csv"])
+        self.assertFalse(any(name.endswith(".part") for name in os.listdir(output)))
+
+    def test_binary_cache_skipped(self):
+        ### Opening a recording writes a cache next to it; only the cache of a missing source is a recording of its own
+        rralglib_io.open_recording(os.path.join(self.directory, "a.csv"))
+        os.rename(os.path.join(self.directory, "b.csv"), os.path.join(self.directory, "c.csv"))
+        rralglib_io.write_binary(os.path.join(self.directory, "b.csv.rrbin"), self.data, np.arange(len(self.data)) / 64, 64)
+
+        recordings = [os.path.basename(path) for path in rralglib_batch.find_recordings([self.directory])]
+        self.assertEqual(recordings, ["a.csv", "b.csv.rrbin", "broken.csv", "c.csv"])
+
+    def test_settings_and_paths(self):
+        ### Recordings with the same name in different directories get separate outputs
+        for name in ["x", "y"]:
+            os.makedirs(os.path.join(self.directory, name))
+            os.link(os.path.join(self.directory, "a.csv"), os.path.join(self.directory, name, "rec.csv"))
+        recordings = rralglib_batch.find_recordings([os.path.join(self.directory, "*", "rec.csv")])
+        summaries = rralglib_batch.run_batch(recordings, os.path.join(self.directory, "out"), "srmac", hop_size=5, workers=2, verbose=False)
+        self.assertEqual([summary["error"] for summary in summaries], [None, None])
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "out", "x", "rec.csv.srmac.csv")))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "out", "y", "rec.csv.srmac.csv")))
+
+        ### Outputs written next to the recordings are not picked up as recordings on the next run
+        recordings = rralglib_batch.find_recordings([self.directory], output=self.directory, algorithm="srmac")
+        rralglib_batch.run_batch(recordings, self.directory, "srmac", hop_size=5, workers=0, verbose=False)
+        self.assertEqual(rralglib_batch.find_recordings([self.directory], output=self.directory, algorithm="srmac"), recordings)
+        self.assertEqual(rralglib_batch.find_recordings([self.directory]), recordings)
+
+        ### Changed settings reprocess, same settings skip
+        summaries = rralglib_batch.run_batch(recordings, self.directory, "srmac", {"coef_fast": "0.5"}, hop_size=5, workers=0, verbose=False)
+        self.assertEqual(len(summaries), 3)
+        self.assertEqual(rralglib_batch.read_settings(os.path.join(self.directory, "a.csv.srmac.csv"))["params"], {"coef_fast": "0.5"})
+        summaries = rralglib_batch.run_batch(recordings, self.directory, "srmac", {"coef_fast": "0.5"}, hop_size=5, workers=0, verbose=False)
+        self.assertEqual([os.path.basename(summary["recording"]) for summary in summaries], ["broken.csv"])
+
+        summary = rralglib_batch.process_recording(recordings[0], os.path.join(self.directory, "short.csv"), "srmac", window_size=0.001)
+        self.assertEqual(summary["error"], "window is shorter than one sample")
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.samples = 100 * np.sin(2 * np.pi * 0.25 * np.arange(64 * 40) / 64) + np.random.default_rng(5).normal(size=64 * 40)
+        engine = rralglib_realtime.RealtimeSingle(rralglib_realtime.ParamsPeaks())
+        self.expected = [(out.time, out.rate, out.sqi) for out in engine.push_many(self.samples)]
+
+    def test_replay(self):
+        async def run():
+            async with rralglib_server.RRServer(port=0, workers=2) as server:
+                ### Blocks that are not whole deltas are buffered until a delta is complete
+                streams = await rralglib_server.replay_many(self.samples, 3, port=server.port, block=100)
+                return streams, server.samples, server.results, server.connections
+
+        streams, samples, results, connections = asyncio.run(run())
+
+        self.assertEqual(len(self.expected), 40)
+        for stream in streams:
+            self.assertEqual(stream, self.expected)
+        self.assertEqual(samples, 3 * len(self.samples))
+        self.assertEqual(results, 3 * len(self.expected))
+        self.assertEqual(connections, 0)
+
+    def test_unix_socket(self):
+        async def run(path):
+            async with rralglib_server.RRServer(path=path, workers=0):
+                return await rralglib_server.replay(self.samples[:640], path=path)
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(asyncio.run(run(os.path.join(directory, "rr.sock"))), self.expected[:10])
+
+    def test_protocol_error(self):
+        async def run():
+            async with rralglib_server.RRServer(port=0, workers=0) as server:
+                reader, writer = await asyncio.open_connection(rralglib_server.HOST, server.port)
+                writer.write(rralglib_server.pack_frame(rralglib_server.FRAME_SAMPLES, b"abc"))
+                frame = await rralglib_server.read_frame(reader)
+                end = await rralglib_server.read_frame(reader)
+                writer.close()
+                return frame, end
+
+        (kind, message), end = asyncio.run(run())
+        self.assertEqual(kind, rralglib_server.FRAME_ERROR)
+        self.assertIn(b"float64", message)
+        self.assertEqual(end, (None, None))
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -1,12 +1,15 @@
-import sys, os, time
-from PyQt6.QtCore import Qt, QRect, QTimer, pyqtSignal
+import sys, os, time, threading
+from PyQt6.QtCore import Qt, QRect, QTimer, QThread, pyqtSignal
 from PyQt6.QtGui import QAction, QKeyEvent, QDoubleValidator, QIntValidator, QRegularExpressionValidator
 from PyQt6.QtWidgets import QApplication, QHBoxLayout, QLabel, QSlider, QVBoxLayout, QWidget, QLineEdit, QPushButton, QComboBox, QCheckBox, QMessageBox, QToolBar, QMenuBar, QFileDialog, QDialog, QTextEdit, QMenu, QGridLayout, QFrame
 import pyqtgraph as pg
 import numpy as np
 import pandas as pd
-from scipy.signal import butter, ellip, cheby1, bessel
-from rralglib import srmac, cwt_peaks, terma, sos_filt, sqi_full, z_norm, find_peaks, cwt_peaks_oa
+from rralglib import srmac, cwt_peaks, terma, sos_filt, sqi_full, z_norm, find_peaks, cwt_peaks_oa, make_plan
+from rralglib_io import open_recording, is_neulog
+from rralglib_render import MinMaxPyramid, PlaybackClock
+from rralglib_parallel import RecordingAnalysis
+from rralglib_conditioning import ConditioningCache
 
 ### Most important default data parameters
 sample_rate = 64
@@ -334,7 +337,22 @@ class ReadFileDialog(QDialog):
             delimiter = ","
 
         try:
-            self.ydata, self.xdata = read_file_csv_like_native(self.selected_file, key_data=key_data, key_time=key_time, delimiter=delimiter)
+            try:
+                ### Parsed once, then memory-mapped from the binary cache next to the file
+                recording = open_recording(self.selected_file, key_data=key_data, key_time=key_time, delimiter=delimiter)
+                loaded = None
+                if recording is not None:
+                    loaded = recording.data, recording.time
+                    if is_neulog(self.selected_file) and recording.fs and len(self.input_samplerate.text()) == 0:
+                        self.sample_rate = int(recording.fs)
+            except Exception:
+                loaded = None
+
+            ### Fall back to the line by line reader for files the bulk reader can't parse
+            if loaded is None or len(loaded[0]) == 0:
+                loaded = read_file_csv_like_native(self.selected_file, key_data=key_data, key_time=key_time, delimiter=delimiter)
+
+            self.ydata, self.xdata = loaded
             self.filename = self.selected_file
 
             if len(self.input_samplerate.text()) > 0:
@@ -351,6 +369,62 @@ class ReadFileDialog(QDialog):
             self.reject()
             self.close()
 
+### One algorithm run on a data window; filled in by the worker
+class AlgorithmRequest:
+    def __init__(self, request_id, data_index, plan_key, plan, time, data):
+        self.request_id = request_id
+        self.data_index = data_index
+        self.plan_key = plan_key
+        self.plan = plan
+        self.time = time
+        self.data = data
+        self.rr = 0
+        self.peaks = []
+
+### Runs respiratory rate algorithms off the GUI thread
+class AlgorithmWorker(QThread):
+    """
+    Worker thread with a single request slot: a new request replaces any request that has not started yet,
+    so the worker always moves on to the latest window; results are delivered through result_ready
+    """
+    result_ready = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super(AlgorithmWorker, self).__init__(parent)
+        self.condition = threading.Condition()
+        self.request = None
+        self.stopped = False
+
+    ### Queue a request, dropping the pending one if there is one
+    def submit(self, request):
+        with self.condition:
+            self.request = request
+            self.condition.notify()
+
+    ### Stop the thread after the current request
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.request is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                request, self.request = self.request, None
+
+            try:
+                request.rr, request.peaks = request.plan(z_norm(request.data))
+            except Exception as e:
+                print("Error: algorithm failed ["+str(e)+"]")
+                request.rr, request.peaks = 0, []
+
+            self.result_ready.emit(request)
+
 ### The main program window
 class MainWindow(QWidget):
     def __init__(self, parent=None):
@@ -363,17 +437,22 @@ class MainWindow(QWidget):
         self.file_loaded = False
         self.running = False
         self.analyze = False
-        self.tick = 0
 
         ### Framerate stuff
-        self.framerate = 240  ### Approximate framerate at which to run the main application loop ### Set to zero to update as fast as possible
+        self.framerate = 60 ### Maximum frames per second, replaced by the display refresh rate when it is known
+        screen = QApplication.primaryScreen()
+        if screen is not None and screen.refreshRate() > 0:
+            self.framerate = int(round(screen.refreshRate()))
         self.seconds_per_second = 5 ### The seconds of data to process per second of playback
-        self.samples_per_second = 512 ### The amount of samples per second to increment in the live plot ### Make this a slider
-        self.algorithm_delta_ticks = 1
+        self.algorithm_hop = 1 ### The seconds of data between algorithm runs during playback
+
+        ### Playback position follows wall-clock time; frames and algorithm runs are scheduled from it
+        self.clock = PlaybackClock(sample_rate, speed=self.seconds_per_second, max_fps=self.framerate, hop_size=self.algorithm_hop)
 
         ### Raw data storage
         self.data_raw = []
         self.time_raw = []
+        self.pyramid = None
         self.sample_rate = sample_rate
 
         ### Data window variables
@@ -387,10 +466,33 @@ class MainWindow(QWidget):
         self.algorithm = self.algorithms[0]
         self.coef_resolution = 10000
 
-        ### Default filter cutoffs
+        ### Parameter plan of the selected algorithm, rebuilt whenever its parameters change
+        self.plan = None
+        self.plan_key = None
+
+        ### Algorithm worker thread; results for windows more than result_max_lag seconds of playback away from the current one
+        ### are dropped, see result_tolerance
+        self.request_id = 0
+        self.applied_id = 0
+        self.result_max_lag = 1
+        self.worker = AlgorithmWorker()
+        self.worker.result_ready.connect(self.algorithm_result)
+        self.worker.start()
+
+        ### Whole-recording analysis; looked up instead of running the algorithm once it covers the current window
+        self.analysis = None
+        self.analysis_key = None
+
+        ### Default filter design and cutoffs
+        self.filter_type = "butter"
+        self.filter_order = 3
         self.lpf_cutoff = 0.8
         self.hpf_cutoff = 0.05
 
+        ### Filtered versions of the loaded recording per filter setting
+        self.conditioning = ConditioningCache()
+        self.signal = None
+
         ### GUI
         #region
 
@@ -435,6 +537,11 @@ class MainWindow(QWidget):
         self.action_reset.triggered.connect(self.reset_button_pressed)
         self.menu_edit.addAction(self.action_reset)
 
+        self.action_analyze_recording = QAction("Analyze whole recording (A)")
+        self.action_analyze_recording.setStatusTip("Analyze whole recording (A)")
+        self.action_analyze_recording.triggered.connect(self.analyze_recording)
+        self.menu_edit.addAction(self.action_analyze_recording)
+
         ### View menu actions
         self.action_show_algs = QAction("Show algorithm bar")
         self.action_show_algs.setStatusTip("Show algorithm bar")
@@ -750,21 +857,11 @@ class MainWindow(QWidget):
 
         #endregion
 
-        ### Main loop timer
+        ### Main loop timer at the display refresh rate; playback speed does not depend on it
         self.loop_timer = QTimer()
+        self.loop_timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.loop_timer.timeout.connect(self.main_loop)
-        if self.framerate == 0:
-            self.loop_timer.start(0)
-        else:
-            self.loop_timer.start(int(1000/self.framerate))
-
-        ### Sliding data timer
-        self.data_timer = QTimer()
-        self.data_timer.timeout.connect(self.increment_index)
-        if self.samples_per_second == 0:
-            self.data_timer.start(0)
-        else:
-            self.data_timer.start(int(1000/self.samples_per_second))
+        self.loop_timer.start(max(1, int(1000/self.framerate)))
 
         ### Disable all widgets which require data to be loaded
         self.button_play.setEnabled(False)
@@ -786,37 +883,30 @@ class MainWindow(QWidget):
 
     ### Reset data from the raw arrays and update anything that changes based on data parameters
     def reset_data(self):
-        ### Make copies of the raw arrays
-        self.time = np.array(self.time_raw)
-        self.data = np.array(self.data_raw)
-
-        ### Apply a bandpass filter to the data
-        lpf = butter(3, self.lpf_cutoff / (self.sample_rate * 0.5), analog=False, btype="low", output="sos")
-        hpf = butter(3, self.hpf_cutoff / (self.sample_rate * 0.5), analog=False, btype="high", output="sos")
-        # lpf = ellip(3, 0.1, 20, self.lpf_cutoff / (self.sample_rate * 0.5), analog=False, btype="low", output="sos")
-        # hpf = ellip(3, 0.1, 20, self.hpf_cutoff / (self.sample_rate * 0.5), analog=False, btype="high", output="sos")
-        # lpf = cheby1(3, 0.1, self.lpf_cutoff / (self.sample_rate * 0.5), analog=False, btype="low", output="sos")
-        # hpf = cheby1(3, 0.1, self.hpf_cutoff / (self.sample_rate * 0.5), analog=False, btype="high", output="sos")
-        self.data -= np.mean(self.data) # try to mitigate the initial filter transient
-        self.data = sos_filt(self.data, hpf)
-        self.data = sos_filt(self.data, lpf)
-
-        ### Apply cutoff
-        self.data = self.data[self.data_cutoff:]
-        self.time = self.time[self.data_cutoff:]
+        ### Precomputed results belong to the old data
+        self.cancel_analysis()
+
+        ### Band-passed signal from the conditioning cache; a new filter setting only filters the visible region
+        ### before the first frame and fills in the rest in the background
+        self.signal = self.conditioning.get(self.data_raw, self.sample_rate, self.filter_type, self.filter_order, self.lpf_cutoff, self.hpf_cutoff)
+
+        ### Apply cutoff; both are views, so the filtered values show up as the signal fills in
+        self.data = self.signal.data[self.data_cutoff:]
+        self.time = np.asarray(self.time_raw)[self.data_cutoff:]
+
+        ### Min/max pyramid of the filtered signal for plot decimation and Y range queries, built once it is complete
+        self.pyramid = MinMaxPyramid(self.data) if self.signal.done() else None
 
         ### Update the progress bar range
         self.max_data_index = len(self.data)-self.data_window_size*self.sample_rate
         self.progress_bar.setRange(0, self.max_data_index)
 
-        ### Update the data timer interval
-        self.data_timer.stop()
-        self.samples_per_second = int(self.sample_rate * self.seconds_per_second)
-        self.algorithm_delta_ticks = self.sample_rate
-        if self.samples_per_second == 0:
-            self.data_timer.start(0)
-        else:
-            self.data_timer.start(int(1000/self.samples_per_second))
+        ### Playback clock for the new sample rate and length
+        self.data_index = min(self.data_index, max(0, self.max_data_index))
+        self.clock = PlaybackClock(self.sample_rate, speed=self.seconds_per_second, max_fps=self.framerate, hop_size=self.algorithm_hop, length=self.max_data_index)
+        self.clock.seek(self.data_index)
+        if self.running:
+            self.clock.start()
 
         ### Update the plot once
         self.update_plot()
@@ -1009,52 +1099,145 @@ class MainWindow(QWidget):
                 self.params_cwtoa_th = 0
                 self.cwtoa_th_line_edit.setStyleSheet(self.stylesheet_lineedit_invalid)
 
-    ### Wrapper function for calling respiratory rate algorithms
-    def run_algorithm(self, data):
+    ### Parameters of the selected algorithm as keyword arguments
+    def algorithm_params(self):
         if self.algorithm == "srmac":
-            rr, peaks = srmac(data, self.sample_rate, len(data), coef_fast=self.params_srmac_coef_fast, coef_slow=self.params_srmac_coef_slow, coef_cross=self.params_srmac_coef_cross, width=self.params_srmac_width, threshold=self.params_srmac_th)
+            return {"coef_fast": self.params_srmac_coef_fast, "coef_slow": self.params_srmac_coef_slow, "coef_cross": self.params_srmac_coef_cross, "width": self.params_srmac_width, "threshold": self.params_srmac_th}
         elif self.algorithm == "terma":
-            rr, peaks = terma(data, self.sample_rate, len(data), window_event=self.params_terma_w1, window_cycle=self.params_terma_w2, b_coef=self.params_terma_b, width=self.params_terma_width)
+            return {"window_event": self.params_terma_w1, "window_cycle": self.params_terma_w2, "b_coef": self.params_terma_b, "width": self.params_terma_width}
         elif self.algorithm == "find_peaks":
-            rr, peaks = find_peaks(data, self.sample_rate, len(data), prominence=self.params_findpeaks_prominence, heval_ratio=self.params_findpeaks_heval, width=self.params_findpeaks_width, proximity=self.params_findpeaks_proximity)
+            return {"prominence": self.params_findpeaks_prominence, "heval_ratio": self.params_findpeaks_heval, "width": self.params_findpeaks_width, "proximity": self.params_findpeaks_proximity}
         elif self.algorithm == "cwt":
-            rr, peaks = cwt_peaks(data, self.sample_rate, len(data), min_freq=self.params_cwtoa_f_min, max_freq=self.params_cwtoa_f_max, resolution=self.params_cwtoa_scales, width=self.params_cwtoa_width, threshold=self.params_cwtoa_th)
-        else:
-            rr, peaks = 0, []
+            return {"min_freq": self.params_cwtoa_f_min, "max_freq": self.params_cwtoa_f_max, "resolution": self.params_cwtoa_scales, "width": self.params_cwtoa_width, "threshold": self.params_cwtoa_th}
+        return None
+
+    ### Parameter plan of the selected algorithm; only rebuilt when the algorithm, sample rate or parameters change
+    def algorithm_plan(self):
+        params = self.algorithm_params()
+        if params is None:
+            return None
 
-        return rr, peaks
+        key = (self.algorithm, self.sample_rate, tuple(sorted(params.items())))
+        if key != self.plan_key:
+            self.plan = make_plan(self.algorithm, self.sample_rate, **params)
+            self.plan_key = key
+
+        return self.plan
+
+    ### Run the selected respiratory rate algorithm synchronously
+    def run_algorithm(self, data):
+        plan = self.algorithm_plan()
+        if plan is None:
+            return 0, []
+
+        return plan(data)
+
+    ### Analyze every hop position of the loaded recording in the background with the current algorithm and parameters
+    def analyze_recording(self):
+        if not self.file_loaded:
+            return
+
+        params = self.algorithm_params()
+        if params is None or self.algorithm_plan() is None:
+            ErrorDialog(self, "Error: invalid algorithm parameters.").exec()
+            return
+
+        if self.analysis is not None:
+            self.analysis.cancel()
+
+        ### The analysis needs the exact filtered signal
+        self.signal.fill()
+
+        self.analysis = RecordingAnalysis(self.data, self.sample_rate, self.algorithm, window_size=self.data_window_size, **params)
+        self.analysis_key = self.plan_key
+        self.analysis.start(first=self.data_index)
+
+    ### Drop the whole-recording analysis, e.g. when the data changes
+    def cancel_analysis(self):
+        if self.analysis is not None:
+            self.analysis.cancel()
+        self.analysis = None
+        self.analysis_key = None
+
+    ### Show peaks of a window
+    def show_peaks(self, time_window, data_window, peaks):
+        if self.action_show_peaks.isChecked():
+            self.peak_scatter.setData(time_window[peaks], data_window[peaks])
 
     def algorithm_wrapper(self):
-        ### If analyze is true, run the selected respiratory rate algorithm on this data window
+        ### If analyze is true, queue the selected respiratory rate algorithm on this data window
         if self.analyze:
             time_window = self.time[self.data_index:self.data_index+self.data_window_size*self.sample_rate]
             data_window = self.data[self.data_index:self.data_index+self.data_window_size*self.sample_rate]
 
-            rr, peaks = self.run_algorithm(z_norm(data_window))
+            plan = self.algorithm_plan()
+            if plan is None:
+                return
 
-            ### Show peaks
-            if self.action_show_peaks.isChecked():
-                self.peak_scatter.setData(time_window[peaks], data_window[peaks])
+            ### Use the precomputed result of the nearest analyzed position if there is one
+            if self.analysis is not None and self.analysis_key == self.plan_key:
+                result = self.analysis.lookup(self.data_index)
+                if result is not None:
+                    position, rr, peaks = result
+                    self.applied_id = self.request_id
+                    self.show_peaks(self.time[position:position+self.analysis.window_len], self.data[position:position+self.analysis.window_len], peaks)
+                    return
 
-            ### Show respiratory rate
-            #...
+            self.request_id += 1
+            self.worker.submit(AlgorithmRequest(self.request_id, self.data_index, self.plan_key, plan, time_window, data_window))
         else:
-            ### Clear peak plot
+            ### Clear peak plot and drop any results still in flight
+            self.applied_id = self.request_id
             self.peak_scatter.setData([],[])
 
+    ### Receive a result from the worker thread; results for other parameters or an old data window are dropped
+    ### Largest distance in samples between a result's window and the current one; during playback the data advances
+    ### seconds_per_second times faster than wall-clock time while a window is analyzed, plus one hop between requests
+    def result_tolerance(self):
+        if not self.running:
+            return self.result_max_lag * self.sample_rate
+        return (self.result_max_lag * self.seconds_per_second + self.algorithm_hop) * self.sample_rate
+
+    def algorithm_result(self, request):
+        if not self.analyze or request.request_id <= self.applied_id:
+            return
+        if request.plan_key != self.plan_key:
+            return
+        if abs(request.data_index - self.data_index) > self.result_tolerance():
+            return
+
+        self.applied_id = request.request_id
+
+        self.show_peaks(request.time, request.data, request.peaks)
+
+        ### Show respiratory rate
+        #...
+
     ### Update the plot and related items
     def update_plot(self):
-        ### Plot data
-        time_window = self.time[self.data_index:self.data_index+self.data_window_size*self.sample_rate]
-        data_window = self.data[self.data_index:self.data_index+self.data_window_size*self.sample_rate]
-        self.plot_signal.setData(time_window, data_window)
+        start = self.data_index
+        stop = min(self.data_index+self.data_window_size*self.sample_rate, len(self.data))
+
+        ### Make sure the visible region is filtered while the conditioned signal is still filling in
+        if self.pyramid is None:
+            self.signal.ensure(self.data_cutoff+start, self.data_cutoff+stop)
+            if self.signal.done():
+                self.pyramid = MinMaxPyramid(self.data)
+
+        ### Plot data, reduced to min/max pairs per pixel column of the plot
+        if self.pyramid is not None:
+            self.plot_signal.setData(*self.pyramid.decimate(start, stop, self.plot_main.width(), self.time))
+            low, high = self.pyramid.range(start, stop)
+        else:
+            self.plot_signal.setData(self.time[start:stop], self.data[start:stop])
+            low, high = np.min(self.data[start:stop]), np.max(self.data[start:stop])
 
         ### Set plot range
-        self.plot_main.setYRange(min(data_window)-abs(min(data_window))/2, max(data_window)+abs(max(data_window))/2)
-        self.plot_main.setXRange(min(time_window), max(time_window))
+        self.plot_main.setYRange(low-abs(low)/2, high+abs(high)/2)
+        self.plot_main.setXRange(self.time[start], self.time[stop-1])
 
         ### Update the midline position
-        self.midline.setX(time_window[len(time_window)//2])
+        self.midline.setX(self.time[start+(stop-start)//2])
 
         ### Update the progress bar value
         self.progress_bar.setValue(self.data_index)
@@ -1062,6 +1245,10 @@ class MainWindow(QWidget):
         ### Update the sample time indicator
         # self.time_indicator_samples.setText(str(round(self.data_index/self.sample_rate, 2))+" / "+str(round(self.max_data_index/self.sample_rate, 2)))
         self.time_indicator_samples.setText(str(self.data_index)+" / "+str(self.max_data_index))
+        if self.analysis is not None and not self.analysis.done():
+            self.time_indicator_samples.setText(self.time_indicator_samples.text()+" (analyzed "+str(int(100*self.analysis.progress()))+"%)")
+        elif self.analysis is not None and self.analysis.failed > 0:
+            self.time_indicator_samples.setText(self.time_indicator_samples.text()+" ("+str(self.analysis.failed)+" windows failed)")
     
     ### When data is loaded for the first time, enable all features that start disabled
     def enable_widgets(self):
@@ -1076,13 +1263,25 @@ class MainWindow(QWidget):
         if self.file_loaded:
             if self.running == True:
                 self.running = False
+                self.clock.pause()
             else:
+                ### Start over when playback has reached the end
+                if self.data_index >= self.max_data_index:
+                    self.data_index = 0
                 self.running = True
+                self.clock.start(self.data_index)
+
+    ### Change the playback speed in seconds of data per second
+    def set_playback_speed(self, speed):
+        self.seconds_per_second = min(max(speed, 0.125), 1024)
+        self.clock.set_speed(self.seconds_per_second)
 
     ### Reset data index and stop plotting
     def reset_button_pressed(self):
         self.running = False
         self.data_index = 0
+        self.clock.pause()
+        self.clock.seek(0)
         self.update_plot()
 
     def default_button_pressed(self):
@@ -1123,6 +1322,7 @@ class MainWindow(QWidget):
     def dragging_progress_bar(self):
         ### Update the data index
         self.data_index = self.progress_bar.value()
+        self.clock.seek(self.data_index)
 
         ### Update the plot once, but only if playback is stopped
         if not self.running:
@@ -1220,24 +1420,12 @@ class MainWindow(QWidget):
                     self.file_loaded = True
                     self.enable_widgets()
 
-                ### Update data
+                ### Update data; filtered versions of the previous recording are no longer needed
+                self.conditioning.clear()
                 self.reset_data()
                 return
         return
 
-    ### Increment the data_index
-    def increment_index(self):
-        if self.running and self.file_loaded:
-            try:
-                if self.data_index < self.max_data_index:
-                    self.data_index += 1
-                else:
-                    self.running = False
-                    self.update_plot()
-            except:
-                self.running = False
-                self.update_plot()
-
     ### Process keypresses
     def keyPressEvent(self, event):
         if type(event) == QKeyEvent:
@@ -1249,20 +1437,33 @@ class MainWindow(QWidget):
                     self.reset_button_pressed()
             elif event.key() == Qt.Key.Key_O:
                 self.button_open_new_file()
+            elif event.key() == Qt.Key.Key_A:
+                if self.file_loaded:
+                    self.analyze_recording()
+            elif event.key() == Qt.Key.Key_Plus:
+                self.set_playback_speed(self.seconds_per_second * 2)
+            elif event.key() == Qt.Key.Key_Minus:
+                self.set_playback_speed(self.seconds_per_second / 2)
 
     ### Main application loop
     def main_loop(self):
-        ### Increment the tick counter
-        self.tick += 1
-
         ### Update plots, process data etc.
         if self.running and self.file_loaded:
             try:
-                ### Update plot
-                self.update_plot()
+                ### Advance the data index by the wall-clock time since the last tick
+                index, render, analyze = self.clock.tick()
+                self.data_index = min(index, self.max_data_index)
+                if self.clock.finished():
+                    self.running = False
+                    self.clock.pause()
+                    render = True
+
+                ### Update plot, at most once per display frame
+                if render:
+                    self.update_plot()
 
-                ### Analyze data to find peaks
-                if self.tick % self.algorithm_delta_ticks == 0:
+                ### Analyze data to find peaks once per hop of data time
+                if analyze:
                     self.algorithm_wrapper()
 
                 ### Update play button text
@@ -1274,22 +1475,21 @@ class MainWindow(QWidget):
             ### Update play button text
             self.button_play.setText("Start (Q)")
 
-        ### Do these need to be here?
-        QApplication.processEvents()
-        self.show()
-
     ### Override the closeEvent method to add a confirmation dialog
     def closeEvent(self, event):
         self.running = False
         if QMessageBox.question(self, "", "Are you sure you want to quit?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
             event.ignore()
+            self.worker.stop()
+            self.cancel_analysis()
             self.close()
             sys.exit()
         else:
             event.ignore()
 
-### Launch application
-app = QApplication(sys.argv)
-window = MainWindow()
-window.showNormal()
-sys.exit(app.exec())
+### Launch application; guarded so analysis worker processes can import this module without opening a window
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.showNormal()
+    sys.exit(app.exec())